@@ -0,0 +1,31 @@
+"""keyset pagination indexes
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Tables may already carry these when created by Base.metadata.create_all
+    op.create_index('ix_proposals_status_id', 'proposals', ['status', 'id'], if_not_exists=True)
+    op.create_index('ix_proposals_organization_id_id', 'proposals', ['organization_id', 'id'], if_not_exists=True)
+    op.create_index('ix_knowledge_base_is_approved_id', 'knowledge_base', ['is_approved', 'id'], if_not_exists=True)
+    op.create_index('ix_activities_proposal_id_id', 'activities', ['proposal_id', 'id'], if_not_exists=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_activities_proposal_id_id', table_name='activities')
+    op.drop_index('ix_knowledge_base_is_approved_id', table_name='knowledge_base')
+    op.drop_index('ix_proposals_organization_id_id', table_name='proposals')
+    op.drop_index('ix_proposals_status_id', table_name='proposals')
@@ -0,0 +1,41 @@
+"""knowledge base full-text search vector
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # tsvector/GIN only exist on PostgreSQL; other dialects keep ILIKE search
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute(
+        "ALTER TABLE knowledge_base ADD COLUMN IF NOT EXISTS search_vector tsvector "
+        "GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(tags, '')), 'B') || "
+        "setweight(to_tsvector('english', coalesce(content, '')), 'C')"
+        ") STORED"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_knowledge_base_search_vector "
+        "ON knowledge_base USING gin (search_vector)"
+    )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute("DROP INDEX IF EXISTS ix_knowledge_base_search_vector")
+    op.execute("ALTER TABLE knowledge_base DROP COLUMN IF EXISTS search_vector")
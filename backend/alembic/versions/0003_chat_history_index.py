@@ -0,0 +1,24 @@
+"""chat history index
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_proposal_chats_proposal_id_id', 'proposal_chats', ['proposal_id', 'id'], if_not_exists=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_proposal_chats_proposal_id_id', table_name='proposal_chats')
@@ -0,0 +1,50 @@
+"""proposal stats rollup
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # The table may already exist when created by Base.metadata.create_all
+    if not sa.inspect(op.get_bind()).has_table('proposal_stats'):
+        op.create_table(
+            'proposal_stats',
+            sa.Column('organization_id', sa.Integer(), autoincrement=False, nullable=False),
+            sa.Column('status', sa.String(length=20), nullable=False),
+            sa.Column('proposal_count', sa.Integer(), nullable=False),
+            sa.Column('total_value', sa.Float(), nullable=False),
+            sa.PrimaryKeyConstraint('organization_id', 'status'),
+        )
+
+    # Backfill; proposals.status holds enum names, the rollup holds values
+    op.execute("DELETE FROM proposal_stats")
+    op.execute("""
+        INSERT INTO proposal_stats (organization_id, status, proposal_count, total_value)
+        SELECT 0, lower(CAST(status AS VARCHAR)), count(*), coalesce(sum(estimated_value), 0)
+        FROM proposals
+        WHERE status IS NOT NULL
+        GROUP BY lower(CAST(status AS VARCHAR))
+    """)
+    op.execute("""
+        INSERT INTO proposal_stats (organization_id, status, proposal_count, total_value)
+        SELECT organization_id, lower(CAST(status AS VARCHAR)), count(*), coalesce(sum(estimated_value), 0)
+        FROM proposals
+        WHERE status IS NOT NULL AND organization_id IS NOT NULL
+        GROUP BY organization_id, lower(CAST(status AS VARCHAR))
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('proposal_stats')
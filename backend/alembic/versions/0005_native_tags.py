@@ -0,0 +1,112 @@
+"""native tag columns and tag indexes
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+TAGGED_TABLES = (
+    # (table, tag table, id column)
+    ('proposals', 'proposal_tags', 'proposal_id'),
+    ('knowledge_base', 'knowledge_tags', 'knowledge_id'),
+)
+
+OLD_SEARCH_VECTOR = (
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(tags, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(content, '')), 'C')"
+)
+NEW_SEARCH_VECTOR = (
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(tags, '[]'::jsonb)), 'B') || "
+    "setweight(to_tsvector('english', coalesce(content, '')), 'C')"
+)
+
+
+def _drop_search_vector() -> None:
+    # A generated column pins the type of the columns it reads
+    op.execute("DROP INDEX IF EXISTS ix_knowledge_base_search_vector")
+    op.execute("ALTER TABLE knowledge_base DROP COLUMN IF EXISTS search_vector")
+
+
+def _add_search_vector(expression: str) -> None:
+    op.execute(
+        "ALTER TABLE knowledge_base ADD COLUMN search_vector tsvector "
+        f"GENERATED ALWAYS AS ({expression}) STORED"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_knowledge_base_search_vector "
+        "ON knowledge_base USING gin (search_vector)"
+    )
+
+
+def _create_tag_tables() -> None:
+    inspector = sa.inspect(op.get_bind())
+    for table, tag_table, id_column in TAGGED_TABLES:
+        if not inspector.has_table(tag_table):
+            op.create_table(
+                tag_table,
+                sa.Column(id_column, sa.Integer(), sa.ForeignKey(f'{table}.id', ondelete='CASCADE'), nullable=False),
+                sa.Column('tag', sa.String(), nullable=False),
+                sa.PrimaryKeyConstraint(id_column, 'tag'),
+            )
+        op.create_index(f'ix_{tag_table}_tag_{id_column}', tag_table, ['tag', id_column], if_not_exists=True)
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    _create_tag_tables()
+
+    if bind.dialect.name == 'postgresql':
+        columns = {
+            table: {c['name']: c['type'] for c in sa.inspect(bind).get_columns(table)}
+            for table, _, _ in TAGGED_TABLES
+        }
+        _drop_search_vector()
+        for table, _, _ in TAGGED_TABLES:
+            if not isinstance(columns[table]['tags'], postgresql.JSONB):
+                op.execute(
+                    f"ALTER TABLE {table} ALTER COLUMN tags TYPE jsonb USING "
+                    "CASE WHEN tags IS NULL OR btrim(tags) = '' THEN '[]'::jsonb ELSE tags::jsonb END"
+                )
+            op.create_index(f'ix_{table}_tags', table, ['tags'], postgresql_using='gin', if_not_exists=True)
+        _add_search_vector(NEW_SEARCH_VECTOR)
+        return
+
+    # JSON is stored as text elsewhere: normalize blanks, then fill the tag tables
+    for table, tag_table, id_column in TAGGED_TABLES:
+        op.execute(f"UPDATE {table} SET tags = '[]' WHERE tags IS NULL OR trim(tags) = ''")
+        op.execute(f"DELETE FROM {tag_table}")
+        rows = [
+            {id_column: item_id, 'tag': tag}
+            for item_id, tags in bind.execute(sa.text(f"SELECT id, tags FROM {table}"))
+            for tag in sorted(set(json.loads(tags) or []))
+        ]
+        if rows:
+            bind.execute(sa.text(f"INSERT INTO {tag_table} ({id_column}, tag) VALUES (:{id_column}, :tag)"), rows)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        _drop_search_vector()
+        for table, _, _ in TAGGED_TABLES:
+            op.drop_index(f'ix_{table}_tags', table_name=table, if_exists=True)
+            op.execute(f"ALTER TABLE {table} ALTER COLUMN tags TYPE text USING tags::text")
+        _add_search_vector(OLD_SEARCH_VECTOR)
+
+    for _, tag_table, _ in TAGGED_TABLES:
+        op.drop_table(tag_table)
@@ -0,0 +1,36 @@
+"""organization version and section order index for the response cache
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # The column may already exist when created by Base.metadata.create_all
+    columns = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('organizations')}
+    if 'version' not in columns:
+        op.add_column('organizations', sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+    op.create_index(
+        'ix_proposal_sections_proposal_id_order', 'proposal_sections', ['proposal_id', 'order'], if_not_exists=True
+    )
+
+    # Writes increment these in SQL; NULL + 1 would stay NULL
+    op.execute("UPDATE proposals SET current_version = 1 WHERE current_version IS NULL")
+    op.execute("UPDATE proposal_sections SET version = 1 WHERE version IS NULL")
+
+
+def downgrade() -> None:
+    op.drop_index('ix_proposal_sections_proposal_id_order', table_name='proposal_sections')
+    with op.batch_alter_table('organizations') as batch_op:
+        batch_op.drop_column('version')
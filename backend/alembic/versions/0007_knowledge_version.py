@@ -0,0 +1,28 @@
+"""knowledge base version column for ETags
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # The column may already exist when created by Base.metadata.create_all
+    columns = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('knowledge_base')}
+    if 'version' not in columns:
+        op.add_column('knowledge_base', sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('knowledge_base') as batch_op:
+        batch_op.drop_column('version')
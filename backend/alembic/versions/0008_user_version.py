@@ -0,0 +1,28 @@
+"""user version column for cache keys and ETags of responses embedding users
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # The column may already exist when created by Base.metadata.create_all
+    columns = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('users')}
+    if 'version' not in columns:
+        op.add_column('users', sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('version')
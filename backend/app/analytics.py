@@ -0,0 +1,372 @@
+"""Columnar proposal snapshot for win-rate and pipeline reports.
+
+``ProposalColumns`` holds one NumPy array per attribute, built from
+``Proposal``, ``Organization`` and the last ``status_updated`` activity of
+each proposal. Industry, organization size, priority, status and
+organization are dictionary encoded into small integer codes; tags are
+kept both as a row list per tag (for grouping) and as packed bitmaps for
+the common tags (for filtering). A report is a handful of vectorised
+masks and one ``bincount`` per metric, so it never touches the database.
+
+``analytics`` builds the snapshot on the first report and from then on
+refreshes it every ``settings.analytics_refresh_interval_seconds``;
+reports are as fresh as the last refresh. Workers that never serve a
+report never load it.
+"""
+import asyncio
+import logging
+import threading
+from array import array
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .database import session_scope
+from .models import Activity, Organization, Proposal, ProposalStatus
+
+logger = logging.getLogger(__name__)
+
+DIMENSIONS = ("industry", "size", "priority", "status", "organization", "tag")
+DATE_FIELDS = ("created", "deadline", "closed")
+
+# Epoch seconds stand-in for a missing timestamp
+MISSING = np.iinfo(np.int64).min
+
+_STATUS_CODES = {status.value: code for code, status in enumerate(ProposalStatus)}
+WON = _STATUS_CODES[ProposalStatus.WON.value]
+LOST = _STATUS_CODES[ProposalStatus.LOST.value]
+
+# Group keys are mixed-radix codes; dense bincount up to this many groups
+_DENSE_GROUPS = 1 << 20
+
+
+def _epoch(value: Optional[datetime]) -> int:
+    if value is None:
+        return MISSING
+    if value.tzinfo is None:
+        # SQLite hands back naive datetimes; they are stored as UTC
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
+
+
+def _enum_value(value) -> Optional[str]:
+    return getattr(value, "value", value)
+
+
+class _Dictionary:
+    """Value <-> dense integer code mapping for one categorical column."""
+
+    def __init__(self, values: Sequence = ()):
+        self.values: List[Any] = []
+        self.codes: Dict[Any, int] = {}
+        for value in values:
+            self.encode(value)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def encode(self, value) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def lookup(self, values: Iterable) -> np.ndarray:
+        # Unknown values simply match nothing
+        return np.array([self.codes[v] for v in values if v in self.codes], dtype=np.int64)
+
+
+class ProposalColumns:
+    """Immutable column snapshot of non-template proposals.
+
+    ``load`` reads it from the database; the constructor accepts any
+    iterable of rows in the same column order, which benchmarks use.
+    """
+
+    # Tags on more than 1/32 of the rows get a packed bitmap, which is then
+    # smaller than their int32 row list
+    BITMAP_DENSITY = 1 / 32
+
+    def __init__(self, rows: Iterable[Tuple], built_at: Optional[datetime] = None):
+        self.built_at = built_at or datetime.now(timezone.utc)
+        self.dictionaries = {
+            "industry": _Dictionary(),
+            "size": _Dictionary(),
+            "priority": _Dictionary(),
+            "status": _Dictionary(status.value for status in ProposalStatus),
+            "organization": _Dictionary(),
+        }
+        self.tags = _Dictionary()
+        self.organization_names: Dict[int, str] = {}
+
+        ids, values = array("q"), array("d")
+        created, deadline, closed = array("q"), array("q"), array("q")
+        codes = {name: array("i") for name in self.dictionaries}
+        tag_rows: List[array] = []
+        for row_number, row in enumerate(rows):
+            (proposal_id, organization_id, organization_name, industry, size,
+             status, priority, value, created_at, deadline_at, closed_at, tags) = row
+            ids.append(proposal_id)
+            values.append(value or 0.0)
+            created.append(_epoch(created_at))
+            deadline.append(_epoch(deadline_at))
+            closed.append(_epoch(closed_at))
+            if organization_id is not None and organization_name is not None:
+                self.organization_names[organization_id] = organization_name
+            for name, raw in (
+                ("industry", industry), ("size", size), ("priority", _enum_value(priority)),
+                ("status", _enum_value(status)), ("organization", organization_id),
+            ):
+                codes[name].append(self.dictionaries[name].encode(raw))
+            for tag in set(tags or ()):
+                code = self.tags.encode(tag)
+                if code == len(tag_rows):
+                    tag_rows.append(array("i"))
+                tag_rows[code].append(row_number)
+
+        self.size = len(ids)
+        self.ids = np.frombuffer(ids, dtype=np.int64)
+        self.value = np.frombuffer(values, dtype=np.float64)
+        self.codes = {name: np.frombuffer(column, dtype=np.int32) for name, column in codes.items()}
+        status = self.codes["status"]
+        decided = (status == WON) | (status == LOST)
+        self.dates = {
+            "created": np.frombuffer(created, dtype=np.int64),
+            "deadline": np.frombuffer(deadline, dtype=np.int64),
+            # Only won/lost proposals have a close date
+            "closed": np.where(decided, np.frombuffer(closed, dtype=np.int64), MISSING),
+        }
+
+        # Tag -> rows as CSR: tag_rows[tag_offsets[t]:tag_offsets[t + 1]]
+        lengths = np.array([len(rows) for rows in tag_rows], dtype=np.int64)
+        self.tag_offsets = np.zeros(len(tag_rows) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=self.tag_offsets[1:])
+        self.tag_rows = (
+            np.concatenate([np.frombuffer(rows, dtype=np.int32) for rows in tag_rows])
+            if tag_rows else np.zeros(0, dtype=np.int32)
+        )
+        self.tag_row_codes = np.repeat(np.arange(len(tag_rows), dtype=np.int32), lengths)
+        self.tag_bitmaps: Dict[int, np.ndarray] = {}
+        for code, length in enumerate(lengths):
+            if length > self.size * self.BITMAP_DENSITY:
+                mask = np.zeros(self.size, dtype=np.bool_)
+                mask[self._tag_row_slice(code)] = True
+                self.tag_bitmaps[code] = np.packbits(mask)
+
+        # Time to close only counts closed proposals with both timestamps
+        has_close_time = (self.dates["closed"] != MISSING) & (self.dates["created"] != MISSING)
+        elapsed = np.subtract(self.dates["closed"], self.dates["created"], where=has_close_time,
+                              out=np.zeros(self.size, dtype=np.int64))
+        self._days_to_close = elapsed / 86400.0
+        # status * 2 + has_close_time: one bincount over this per group yields
+        # the count, won, lost and timed-close figures together
+        self._outcome = (status * 2 + has_close_time).astype(np.int64)
+
+    @classmethod
+    def load(cls, session: Session, batch_size: int = 10000) -> "ProposalColumns":
+        built_at = datetime.now(timezone.utc)
+        closed_at = (
+            session.query(Activity.proposal_id, func.max(Activity.timestamp).label("closed_at"))
+            .filter(Activity.action == "status_updated")
+            .group_by(Activity.proposal_id)
+            .subquery()
+        )
+        rows = (
+            session.query(
+                Proposal.id, Proposal.organization_id, Organization.name, Organization.industry,
+                Organization.size, Proposal.status, Proposal.priority, Proposal.estimated_value,
+                Proposal.created_at, Proposal.deadline,
+                func.coalesce(closed_at.c.closed_at, Proposal.updated_at), Proposal.tags,
+            )
+            .outerjoin(Organization, Proposal.organization_id == Organization.id)
+            .outerjoin(closed_at, closed_at.c.proposal_id == Proposal.id)
+            .filter(or_(Proposal.is_template.is_(None), Proposal.is_template.is_(False)))
+            .yield_per(batch_size)
+        )
+        return cls(rows, built_at)
+
+    def _tag_row_slice(self, code: int) -> np.ndarray:
+        return self.tag_rows[self.tag_offsets[code]:self.tag_offsets[code + 1]]
+
+    def tag_mask(self, tag: str) -> np.ndarray:
+        code = self.tags.codes.get(tag)
+        if code is None:
+            return np.zeros(self.size, dtype=np.bool_)
+        bitmap = self.tag_bitmaps.get(code)
+        if bitmap is not None:
+            return np.unpackbits(bitmap, count=self.size).view(np.bool_)
+        mask = np.zeros(self.size, dtype=np.bool_)
+        mask[self._tag_row_slice(code)] = True
+        return mask
+
+    def filter(
+        self,
+        filters: Optional[Dict[str, Sequence]] = None,
+        tags_any: Optional[Sequence[str]] = None,
+        tags_all: Optional[Sequence[str]] = None,
+        date_field: str = "created",
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        min_value: Optional[float] = None,
+        max_value: Optional[float] = None,
+    ) -> np.ndarray:
+        """Boolean row mask. ``filters`` maps a categorical dimension to
+        the values it may take; ``start`` is inclusive, ``end`` exclusive."""
+        mask = np.ones(self.size, dtype=np.bool_)
+        for name, values in (filters or {}).items():
+            if values:
+                mask &= np.isin(self.codes[name], self.dictionaries[name].lookup(values))
+        if tags_any:
+            any_mask = np.zeros(self.size, dtype=np.bool_)
+            for tag in tags_any:
+                any_mask |= self.tag_mask(tag)
+            mask &= any_mask
+        for tag in tags_all or ():
+            mask &= self.tag_mask(tag)
+        if start is not None or end is not None:
+            dates = self.dates[date_field]
+            mask &= dates != MISSING
+            if start is not None:
+                mask &= dates >= _epoch(start)
+            if end is not None:
+                mask &= dates < _epoch(end)
+        if min_value is not None:
+            mask &= self.value >= min_value
+        if max_value is not None:
+            mask &= self.value <= max_value
+        return mask
+
+    def _labels(self, name: str) -> List[Any]:
+        if name == "tag":
+            return self.tags.values
+        return self.dictionaries[name].values
+
+    def group(self, mask: np.ndarray, group_by: Sequence[str] = ()) -> List[Dict[str, Any]]:
+        """Aggregate the masked rows per combination of ``group_by`` values.
+
+        Grouping by tag counts a proposal once under each of its tags.
+        """
+        if "tag" in group_by:
+            rows = self.tag_rows
+            tag_codes = self.tag_row_codes
+            if not mask.all():
+                selected = mask[rows]
+                rows, tag_codes = rows[selected], tag_codes[selected]
+        else:
+            rows = slice(None) if mask.all() else np.flatnonzero(mask)
+            tag_codes = None
+
+        outcome = self._outcome[rows]
+        radices = [max(len(self._labels(name)), 1) for name in group_by]
+        keys = np.zeros(len(outcome), dtype=np.int64)
+        for name, radix in zip(group_by, radices):
+            keys *= radix
+            keys += tag_codes if name == "tag" else self.codes[name][rows]
+        groups = int(np.prod(radices, dtype=np.int64))
+        present = None
+        if groups > _DENSE_GROUPS:
+            # Sparse combination space: compact the keys before counting
+            present, keys = np.unique(keys, return_inverse=True)
+            groups = len(present)
+
+        outcomes = len(self.dictionaries["status"]) * 2
+        keys = keys * outcomes + outcome
+        size = groups * outcomes
+        counts = np.bincount(keys, minlength=size).reshape(groups, outcomes)
+        values = np.bincount(keys, weights=self.value[rows], minlength=size).reshape(groups, outcomes)
+        days_to_close = np.bincount(keys, weights=self._days_to_close[rows], minlength=size)
+        days_to_close = days_to_close.reshape(groups, outcomes).sum(axis=1)
+
+        count = counts.sum(axis=1)
+        won_count = counts[:, 2 * WON:2 * WON + 2].sum(axis=1)
+        lost_count = counts[:, 2 * LOST:2 * LOST + 2].sum(axis=1)
+        closed_count = counts[:, 2 * WON + 1] + counts[:, 2 * LOST + 1]
+        total_value = values.sum(axis=1)
+        won_value = values[:, 2 * WON:2 * WON + 2].sum(axis=1)
+
+        result = []
+        for slot in np.flatnonzero(count):
+            key = int(slot if present is None else present[slot])
+            labels = {}
+            for name, radix in zip(reversed(group_by), reversed(radices)):
+                key, code = divmod(key, radix)
+                labels[name] = self._labels(name)[code]
+            decided = won_count[slot] + lost_count[slot]
+            result.append({
+                "key": {name: labels[name] for name in group_by},
+                "count": int(count[slot]),
+                "won": int(won_count[slot]),
+                "lost": int(lost_count[slot]),
+                "win_rate": float(won_count[slot] / decided) if decided else None,
+                "total_value": float(total_value[slot]),
+                "won_value": float(won_value[slot]),
+                "average_value": float(total_value[slot] / count[slot]),
+                "average_days_to_close": (
+                    float(days_to_close[slot] / closed_count[slot]) if closed_count[slot] else None
+                ),
+            })
+        result.sort(key=lambda group: group["count"], reverse=True)
+        return result
+
+
+class ProposalAnalytics:
+    """Holds the current snapshot and refreshes it in the background.
+
+    A refresh builds a complete new ``ProposalColumns`` and swaps the
+    reference, so reports never see a half-built snapshot and never wait
+    for one unless no snapshot exists yet.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.snapshot: Optional[ProposalColumns] = None
+        self.refreshes = 0
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def refresh(self, session: Session) -> ProposalColumns:
+        with self._lock:
+            snapshot = ProposalColumns.load(session)
+            self.snapshot = snapshot
+            self.refreshes += 1
+        return snapshot
+
+    def ensure_built(self, session: Session) -> ProposalColumns:
+        if self.snapshot is None:
+            with self._lock:
+                if self.snapshot is None:
+                    self.snapshot = ProposalColumns.load(session)
+                    self.refreshes += 1
+        return self.snapshot
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            if self.snapshot is None:
+                continue
+            try:
+                async with session_scope() as db:
+                    await db.run(self.refresh)
+            except Exception:
+                logger.exception("Refreshing the analytics snapshot failed; keeping the previous one")
+
+    def start(self) -> None:
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+analytics = ProposalAnalytics(settings.analytics_refresh_interval_seconds)
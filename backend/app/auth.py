@@ -2,12 +2,15 @@ from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from .database import get_db
+from sqlalchemy.orm import Session, joinedload
+from .database import Database, get_database
 from .models import User
 from .config import settings
+from .permissions import Permission
+from .token_cache import UserPrincipal, token_cache
+from .hashing import password_hash_pool
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
@@ -18,6 +21,12 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await password_hash_pool.run(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    return await password_hash_pool.run(get_password_hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -28,15 +37,32 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
     return encoded_jwt
 
-def authenticate_user(db: Session, email: str, password: str):
-    user = db.query(User).filter(User.email == email).first()
+def get_user_by_email(db: Session, email: str) -> Optional[User]:
+    return db.query(User).filter(User.email == email).first()
+
+def get_principal_by_email(db: Session, email: str) -> Optional[UserPrincipal]:
+    # The profile comes in the same SELECT; permissions compile from it
+    user = db.query(User).options(joinedload(User.profile)).filter(User.email == email).first()
+    return UserPrincipal.from_user(user) if user is not None else None
+
+async def authenticate_user(db: Database, email: str, password: str):
+    user = await db.run(get_user_by_email, email)
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    if not await verify_password_async(password, user.hashed_password):
         return False
     return user
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(
+    request: Request, token: str = Depends(oauth2_scheme), db: Database = Depends(get_database)
+) -> UserPrincipal:
+    # Repeat requests with the same token skip the JWT verify and user lookup
+    cached = token_cache.get(token)
+    if cached is not None:
+        # For middleware that acts on who made the request; see replicas
+        request.state.principal = cached[1]
+        return cached[1]
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -50,12 +76,33 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     except JWTError:
         raise credentials_exception
     
-    user = db.query(User).filter(User.email == email).first()
-    if user is None:
+    invalidations = token_cache.invalidations
+    principal = await db.run(get_principal_by_email, email)
+    if principal is None:
         raise credentials_exception
-    return user
 
-async def get_current_active_user(current_user: User = Depends(get_current_user)):
+    token_cache.set(token, payload, principal, invalidations)
+    request.state.principal = principal
+    return principal
+
+async def get_current_active_user(current_user: UserPrincipal = Depends(get_current_user)):
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
+
+def require(*permissions: str):
+    """Dependency that admits active users holding every named permission.
+
+    Names are checked when the route is declared, and the request-time
+    check only reads the cached principal:
+
+        current_user: UserPrincipal = Depends(require("approve"))
+    """
+    needed = Permission.parse(permissions)
+
+    async def check_permissions(current_user: UserPrincipal = Depends(get_current_active_user)) -> UserPrincipal:
+        if not current_user.has(needed):
+            raise HTTPException(status_code=403, detail="Insufficient permissions")
+        return current_user
+
+    return check_permissions
@@ -0,0 +1,219 @@
+"""Response cache for hot read endpoints, keyed by row versions.
+
+A cache key names a resource and the versions of every row its response
+is built from (``proposal:7:v12:o3``). A write bumps a version, so later
+reads look up a key that has never been stored and render afresh; entries
+for old versions are never served again and simply age out. Nothing has
+to be purged, and workers cannot disagree about what is current.
+
+Lookups try the worker's in-process LRU first, then the optional shared
+backend, so one worker's render serves every other worker. Entries are
+immutable, which is what makes a per-worker LRU in front of a shared store
+safe. A failing shared backend only costs the hit rate.
+"""
+import asyncio
+import hashlib
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from fastapi import Request, Response
+from sqlalchemy import select
+
+from .config import settings
+from .etags import if_none_match, make_etag, not_modified, set_etag
+from .metrics import RESPONSE_CACHE_LOOKUPS
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(resource: str, *versions) -> str:
+    """``resource:part:part``; ``versions`` must change whenever the response does."""
+    return ":".join([resource, *map(str, versions)])
+
+
+def versions_digest(rows: Iterable[Tuple[int, Optional[int]]]) -> str:
+    """Short digest of ``(id, version)`` pairs, for keys over a list of rows."""
+    text = ",".join(f"{row_id}.{version}" for row_id, version in rows)
+    return hashlib.blake2b(text.encode(), digest_size=12).hexdigest()
+
+
+def users_digest(users: Iterable) -> str:
+    """``versions_digest`` of the distinct users a response embeds.
+
+    Takes ``User`` objects or ``(id, version)`` rows; None entries (an
+    unset creator, say) are skipped.
+    """
+    return versions_digest(sorted({(user.id, user.version) for user in users if user is not None}))
+
+
+def user_version(user_id):
+    """Correlated ``users.version`` for a user id column, for list ETags."""
+    return select(User.version).where(User.id == user_id).scalar_subquery()
+
+
+class LocalCache:
+    """Thread-safe LRU of rendered responses."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class SharedCache(ABC):
+    """A cache every worker can read; values expire after ``ttl`` seconds."""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[bytes]:
+        """The value stored under ``key``, or None when missing or expired."""
+
+    @abstractmethod
+    async def set(self, key: str, value: bytes, ttl: int) -> None:
+        """Store ``value`` under ``key`` for ``ttl`` seconds."""
+
+    async def close(self) -> None:
+        pass
+
+
+class InMemorySharedCache(SharedCache):
+    """Single-process stand-in for tests and local development."""
+
+    def __init__(self):
+        self.entries: Dict[str, Tuple[bytes, float]] = {}
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self.entries.get(key)
+        if entry is None or entry[1] < asyncio.get_running_loop().time():
+            return None
+        return entry[0]
+
+    async def set(self, key: str, value: bytes, ttl: int) -> None:
+        self.entries[key] = (value, asyncio.get_running_loop().time() + ttl)
+
+
+class RedisSharedCache(SharedCache):
+    """Redis, shared by every worker and host."""
+
+    def __init__(self, url: str):
+        import redis.asyncio
+
+        self.client = redis.asyncio.Redis.from_url(url)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.client.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: int) -> None:
+        await self.client.set(key, value, ex=ttl)
+
+    async def close(self) -> None:
+        await self.client.close()
+
+
+class ResponseCache:
+    def __init__(self, local: LocalCache, shared: Optional[SharedCache], ttl: int):
+        self.local = local
+        self.shared = shared
+        self.ttl = ttl
+
+    @property
+    def enabled(self) -> bool:
+        return self.local.max_entries > 0 or self.shared is not None
+
+    async def _shared_get(self, key: str) -> Optional[bytes]:
+        try:
+            return await self.shared.get(key)
+        except Exception:
+            logger.warning("Shared response cache read failed", exc_info=True)
+            return None
+
+    async def _shared_set(self, key: str, value: bytes) -> None:
+        try:
+            await self.shared.set(key, value, self.ttl)
+        except Exception:
+            logger.warning("Shared response cache write failed", exc_info=True)
+
+    async def get(self, resource: str, key: str) -> Optional[bytes]:
+        value = self.local.get(key)
+        if value is not None:
+            RESPONSE_CACHE_LOOKUPS.labels(resource, "local").inc()
+            return value
+        if self.shared is not None:
+            value = await self._shared_get(key)
+            if value is not None:
+                RESPONSE_CACHE_LOOKUPS.labels(resource, "shared").inc()
+                self.local.set(key, value)
+                return value
+        RESPONSE_CACHE_LOOKUPS.labels(resource, "miss").inc()
+        return None
+
+    async def set(self, key: str, value: bytes) -> None:
+        self.local.set(key, value)
+        if self.shared is not None:
+            await self._shared_set(key, value)
+
+    async def respond(
+        self,
+        request: Request,
+        resource: str,
+        probe: Callable[[], Awaitable[str]],
+        render: Callable[[], Awaitable[Tuple[str, bytes]]],
+    ) -> Response:
+        """JSON response for the key ``probe`` returns, rendered on a miss.
+
+        The key doubles as the ETag, so a client that already has this
+        version gets a 304 before the cache is even consulted. ``render``
+        returns the key together with the body, both taken from the same
+        rows, so a write landing between probe and render can only store
+        newer content under a newer key.
+        """
+        key = await probe()
+        etag = make_etag(key)
+        if if_none_match(request, etag):
+            RESPONSE_CACHE_LOOKUPS.labels(resource, "not_modified").inc()
+            return not_modified(etag)
+        body = await self.get(resource, key) if self.enabled else None
+        if body is None:
+            key, body = await render()
+            if self.enabled:
+                await self.set(key, body)
+        response = Response(body, media_type="application/json")
+        set_etag(response, make_etag(key))
+        return response
+
+    async def close(self) -> None:
+        if self.shared is not None:
+            await self.shared.close()
+
+
+def create_shared_cache() -> Optional[SharedCache]:
+    backend = settings.response_cache_backend
+    if backend == "redis":
+        return RedisSharedCache(settings.response_cache_redis_url)
+    if backend == "memory":
+        return InMemorySharedCache()
+    return None
+
+
+response_cache = ResponseCache(
+    LocalCache(settings.response_cache_size), create_shared_cache(), settings.response_cache_ttl_seconds
+)
@@ -0,0 +1,117 @@
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .database import session_scope
+from .models import ProposalChat
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class ChatWriter:
+    """Group-commits chat messages from every socket in this worker.
+
+    ``submit`` queues a row and waits for its ``(id, timestamp)``. A single
+    writer task collects whatever arrives within ``window`` seconds (up to
+    ``max_batch`` rows) and stores it with one multi-row
+    ``INSERT ... RETURNING`` and one commit. If a batch fails, its rows are
+    retried one by one so a single bad message only fails its own sender.
+    ``stop`` drains everything already queued before returning.
+    """
+
+    def __init__(self, max_batch: int, window: float):
+        self.max_batch = max_batch
+        self.window = window
+        self.batches = 0
+        self.rows_written = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, proposal_id: int, sender_id: int, message: str) -> Tuple[int, Any]:
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        row = {"proposal_id": proposal_id, "sender_id": sender_id, "message": message}
+        self._queue.put_nowait((row, future))
+        return await future
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        # Detach first: a message submitted while this one drains starts a
+        # fresh writer instead of landing in a queue nobody reads
+        queue, task = self._queue, self._task
+        self._queue, self._task = None, None
+        queue.put_nowait(_STOP)
+        await task
+
+    async def _run(self) -> None:
+        queue = self._queue
+        stopping = False
+        while not stopping:
+            item = await queue.get()
+            if item is _STOP:
+                break
+            # Let the window fill unless a full batch is already waiting
+            if queue.qsize() < self.max_batch - 1:
+                await asyncio.sleep(self.window)
+            batch = [item]
+            while len(batch) < self.max_batch and not queue.empty():
+                item = queue.get_nowait()
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._write(batch)
+        # Anything queued behind the stop marker still gets written
+        pending = []
+        while not queue.empty():
+            item = queue.get_nowait()
+            if item is not _STOP:
+                pending.append(item)
+        for start in range(0, len(pending), self.max_batch):
+            await self._write(pending[start:start + self.max_batch])
+
+    @staticmethod
+    def _insert(session: Session, rows: List[Dict[str, Any]]):
+        statement = insert(ProposalChat).returning(
+            ProposalChat.id, ProposalChat.timestamp, sort_by_parameter_order=True
+        )
+        records = session.execute(statement, rows).all()
+        session.commit()
+        return records
+
+    async def _write(self, batch) -> None:
+        try:
+            async with session_scope() as db:
+                records = await db.run(self._insert, [row for row, _ in batch])
+        except Exception as exc:
+            if len(batch) > 1:
+                logger.warning("Chat batch of %d failed, retrying rows individually", len(batch))
+                for item in batch:
+                    await self._write([item])
+                return
+            logger.exception("Storing chat message failed")
+            future = batch[0][1]
+            if not future.done():
+                future.set_exception(exc)
+            return
+
+        self.batches += 1
+        self.rows_written += len(records)
+        for (_, future), record in zip(batch, records):
+            if not future.done():
+                future.set_result((record.id, record.timestamp))
+
+
+chat_writer = ChatWriter(settings.chat_write_batch_size, settings.chat_write_window_seconds)
@@ -1,11 +1,94 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import List, Optional
 
 class Settings(BaseSettings):
     database_url: str
     secret_key: str
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
+
+    # Connection pool, per engine and per worker process: N uvicorn workers
+    # can hold up to N * (db_pool_size + db_max_overflow) connections
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    # Seconds a request waits for a free connection before failing
+    db_pool_timeout: float = 30.0
+    # Replace connections older than this many seconds (-1: never)
+    db_pool_recycle: int = -1
+    # Test each connection on checkout; survives database restarts/failovers
+    db_pool_pre_ping: bool = True
+    # Reuse the most recent connection first so idle extras can time out
+    db_pool_use_lifo: bool = False
+
+    # Read replicas for GET handlers, as a JSON list of URLs; each gets its
+    # own pool with the settings above. A replica that fails is skipped for
+    # db_replica_eject_seconds, and a user who wrote reads from the
+    # primary for db_replica_stick_seconds afterwards
+    database_replica_urls: List[str] = []
+    db_replica_eject_seconds: float = 30.0
+    db_replica_stick_seconds: float = 10.0
+
+    # Async engine (asyncpg/aiosqlite); derived from database_url when unset
+    use_async_db: bool = False
+    async_database_url: Optional[str] = None
+
+    # Knowledge search backend: "auto" (postgres full-text on PostgreSQL,
+    # ILIKE elsewhere), "postgres", "bm25" (in-process index) or "ilike"
+    knowledge_search_backend: str = "auto"
+
+    # "Related knowledge" embeddings: hashed n-gram vectors in a memory-mapped
+    # matrix; brute force below vector_ivf_min_docs, IVF above it
+    vector_dim: int = 256
+    vector_store_dir: Optional[str] = None
+    vector_ivf_min_docs: int = 100000
+    vector_ivf_nprobe: int = 8
+    # How often each worker applies knowledge changed by other workers to
+    # its BM25 index and vectors (0 disables)
+    search_refresh_interval_seconds: float = 30.0
+
+    # Verified-token cache in front of get_current_user
+    token_cache_size: int = 10000
+    token_cache_ttl_seconds: int = 300
+
+    # Bounded worker pool for bcrypt hashing/verification
+    password_hash_workers: int = 4
+    password_hash_max_pending: int = 32
+
+    # Chat fan-out between workers: "auto" (postgres LISTEN/NOTIFY on
+    # PostgreSQL, in-memory elsewhere), "postgres" or "memory"
+    chat_pubsub_backend: str = "auto"
+    # Frames queued per chat socket before it is closed as a slow consumer
+    chat_send_queue_size: int = 256
+    # Chat messages are stored in group commits: one INSERT per window/batch
+    chat_write_window_seconds: float = 0.01
+    chat_write_batch_size: int = 500
+
+    # Knowledge usage counts are aggregated in memory and written this often
+    usage_flush_interval_seconds: float = 5.0
+
+    # Development only: record every request's SQL with call sites, flag
+    # statements repeated this many times as N+1 and keep the last
+    # sql_profiler_history reports under /debug/requests
+    sql_profiler: bool = False
+    sql_profiler_n_plus_one: int = 3
+    sql_profiler_history: int = 200
+
+    # GET /debug/profile (admins): longest run allowed, and the share of one
+    # CPU stack sampling may use; the sample rate drops to stay under it
+    sampling_profiler_max_seconds: float = 60.0
+    sampling_profiler_max_overhead: float = 0.01
+
+    # Versioned response cache for proposal, section and organization reads:
+    # entries per worker (0 disables it), plus an optional shared backend,
+    # "none", "memory" (in-process stand-in) or "redis"
+    response_cache_size: int = 10000
+    response_cache_backend: str = "none"
+    response_cache_redis_url: str = "redis://localhost:6379/0"
+    response_cache_ttl_seconds: int = 3600
+
+    # Columnar snapshot behind /reports; rebuilt this often (0 disables the
+    # background refresh, leaving only the first-request build)
+    analytics_refresh_interval_seconds: float = 300.0
     
     class Config:
         env_file = ".env"
@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import threading
+from typing import Dict, Optional
+
+from sqlalchemy import bindparam, func, update
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .database import session_scope
+from .models import KnowledgeBase
+
+logger = logging.getLogger(__name__)
+
+
+class UsageCounter:
+    """Write-behind aggregator for ``knowledge_base.usage_count``.
+
+    Increments are summed in memory per knowledge id and written out every
+    ``interval`` seconds as one executemany of relative updates
+    (``usage_count = usage_count + :delta``), so a burst of clicks on a
+    popular item costs a single row update and concurrent workers never
+    overwrite each other's counts. Deltas from a failed flush are merged
+    back and retried on the next tick; ``stop`` waits for a flush that is
+    in flight and then flushes whatever is left.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.flushes = 0
+        self.rows_written = 0
+        self._pending: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._writing: Optional[asyncio.Task] = None
+
+    def record(self, knowledge_id: int, delta: int = 1) -> None:
+        with self._lock:
+            self._pending[knowledge_id] = self._pending.get(knowledge_id, 0) + delta
+
+    def pending(self, knowledge_id: int) -> int:
+        with self._lock:
+            return self._pending.get(knowledge_id, 0)
+
+    def _take(self) -> Dict[int, int]:
+        with self._lock:
+            deltas, self._pending = self._pending, {}
+        return deltas
+
+    def _restore(self, deltas: Dict[int, int]) -> None:
+        with self._lock:
+            for knowledge_id, delta in deltas.items():
+                self._pending[knowledge_id] = self._pending.get(knowledge_id, 0) + delta
+
+    @staticmethod
+    def _write(session: Session, deltas: Dict[int, int]) -> None:
+        table = KnowledgeBase.__table__
+        statement = (
+            update(table)
+            .where(table.c.id == bindparam("knowledge_id"))
+            .values(usage_count=func.coalesce(table.c.usage_count, 0) + bindparam("delta"))
+        )
+        session.connection().execute(
+            statement,
+            [{"knowledge_id": knowledge_id, "delta": delta} for knowledge_id, delta in sorted(deltas.items())],
+        )
+        session.commit()
+
+    async def flush(self) -> int:
+        deltas = self._take()
+        if not deltas:
+            return 0
+        # Shielded: cancelling the caller must not abandon deltas already
+        # taken, and a sync write may commit in its thread regardless
+        self._writing = asyncio.ensure_future(self._flush(deltas))
+        return await asyncio.shield(self._writing)
+
+    async def _flush(self, deltas: Dict[int, int]) -> int:
+        try:
+            async with session_scope() as db:
+                await db.run(self._write, deltas)
+        except BaseException:
+            self._restore(deltas)
+            raise
+        self.flushes += 1
+        self.rows_written += len(deltas)
+        return len(deltas)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Flushing knowledge usage counts failed; retrying next interval")
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._writing is not None:
+            try:
+                await self._writing
+            except Exception:
+                # Its deltas were restored; the final flush retries them
+                pass
+            self._writing = None
+        await self.flush()
+
+
+usage_counter = UsageCounter(settings.usage_flush_interval_seconds)
@@ -1,13 +1,58 @@
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, TypeVar
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from starlette.concurrency import run_in_threadpool
 from .config import settings
+from .metrics import instrumented_pool, watch_engine
 
-engine = create_engine(settings.database_url)
+T = TypeVar("T")
+
+def pool_options(url: str, name: str, asyncio: bool = False) -> Dict[str, Any]:
+    """Engine keyword arguments for the configured, instrumented pool."""
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:"):
+        # In-memory SQLite lives in one connection; keep SQLAlchemy's pool
+        return {}
+    return {
+        "poolclass": instrumented_pool(name, AsyncAdaptedQueuePool if asyncio else QueuePool),
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+        "pool_use_lifo": settings.db_pool_use_lifo,
+    }
+
+engine = create_engine(settings.database_url, **pool_options(settings.database_url, "primary"))
+watch_engine("primary", engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+def get_async_database_url(url: str) -> str:
+    # Map the sync driver URL onto its asyncio counterpart
+    if url.startswith("postgresql+psycopg2://"):
+        return "postgresql+asyncpg://" + url[len("postgresql+psycopg2://"):]
+    if url.startswith("postgresql://"):
+        return "postgresql+asyncpg://" + url[len("postgresql://"):]
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url[len("sqlite://"):]
+    return url
+
+async_engine = None
+AsyncSessionLocal = None
+if settings.use_async_db:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    async_url = settings.async_database_url or get_async_database_url(settings.database_url)
+    async_engine = create_async_engine(async_url, **pool_options(async_url, "primary_async", asyncio=True))
+    watch_engine("primary_async", async_engine)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 def get_db():
     db = SessionLocal()
     try:
@@ -15,3 +60,53 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+class Database:
+    """Runs unit-of-work functions against a blocking Session.
+
+    Handlers pass a plain ``fn(session, ...)`` to ``run``; with the sync
+    engine it executes in the threadpool, exactly like a ``def`` endpoint.
+    """
+
+    def __init__(self, session):
+        self.session = session
+
+    async def run(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        return await run_in_threadpool(fn, self.session, *args, **kwargs)
+
+    async def close(self) -> None:
+        await run_in_threadpool(self.session.close)
+
+class AsyncDatabase(Database):
+    """Runs the same unit-of-work functions on an AsyncSession.
+
+    ``run_sync`` drives the ORM inside a greenlet on the event loop, so
+    slow queries wait on asyncio I/O instead of holding a worker thread.
+    """
+
+    async def run(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        return await self.session.run_sync(fn, *args, **kwargs)
+
+    async def close(self) -> None:
+        await self.session.close()
+
+def open_database() -> Database:
+    """A Database on a new primary session; the caller closes it."""
+    if AsyncSessionLocal is not None:
+        return AsyncDatabase(AsyncSessionLocal())
+    return Database(SessionLocal())
+
+@asynccontextmanager
+async def session_scope():
+    db = open_database()
+    try:
+        yield db
+    finally:
+        await db.close()
+
+async def get_database():
+    async with session_scope() as db:
+        yield db
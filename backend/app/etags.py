@@ -0,0 +1,41 @@
+"""Strong ETags and ``If-None-Match`` handling.
+
+ETags are digests of the versions a response is built from - the response
+cache key for single resources, or an aggregate over the rows of a list
+page - so they can be computed, and a ``304 Not Modified`` returned,
+before anything is loaded or serialized.
+"""
+import hashlib
+
+from fastapi import Request, Response
+
+# Authenticated data: let browsers keep it but revalidate every time
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts) -> str:
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest()
+    return f'"{digest}"'
+
+
+def if_none_match(request: Request, etag: str) -> bool:
+    """Whether the client already holds the representation tagged ``etag``."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison: ignore W/ prefixes
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag in candidates
+
+
+def set_etag(response: Response, etag: str) -> None:
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+
+
+def not_modified(etag: str) -> Response:
+    response = Response(status_code=304)
+    set_etag(response, etag)
+    return response
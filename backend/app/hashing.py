@@ -0,0 +1,49 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, TypeVar
+
+from fastapi import HTTPException, status
+
+from .config import settings
+
+T = TypeVar("T")
+
+
+class PasswordHashPool:
+    """Dedicated, size-limited executor for bcrypt work.
+
+    bcrypt releases the GIL while hashing, so a small thread pool keeps the
+    CPU cost off the event loop and out of FastAPI's shared threadpool.
+    Callers beyond ``max_pending`` (running + queued) are rejected with a
+    503 straight away instead of piling up behind a login storm.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.rejected = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+
+    async def run(self, fn: Callable[..., T], *args) -> T:
+        # Only touched from the event loop, so a plain counter is enough
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Authentication service is busy, please retry",
+                headers={"Retry-After": "1"},
+            )
+        self.pending += 1
+        loop = asyncio.get_running_loop()
+        job = self._executor.submit(fn, *args)
+        # Release the slot when the job finishes, not when the caller stops
+        # waiting: a cancelled request leaves the hash running in the pool
+        job.add_done_callback(lambda _: loop.call_soon_threadsafe(self._release))
+        return await asyncio.wrap_future(job)
+
+    def _release(self) -> None:
+        self.pending -= 1
+
+
+password_hash_pool = PasswordHashPool(settings.password_hash_workers, settings.password_hash_max_pending)
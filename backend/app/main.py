@@ -1,16 +1,49 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from .database import engine
+from .config import settings
+from .database import async_engine, engine
 from .models import Base
-from .routers import auth, organizations, proposals, knowledge,chat
+from .analytics import analytics
+from .cache import response_cache
+from .chat_writer import chat_writer
+from .counters import usage_counter
+from .metrics import PrometheusMiddleware, metrics_endpoint
+from .profiling import SQLProfilerMiddleware
+from .replicas import PrimaryAfterWriteMiddleware, recent_writers, replicas
+from .search import bm25_index, vector_store
+from .routers import auth, organizations, proposals, knowledge, chat, reports, debug, profiler
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    usage_counter.start()
+    analytics.start()
+    bm25_index.start()
+    vector_store.start()
+    yield
+    await analytics.stop()
+    await bm25_index.stop()
+    await vector_store.stop()
+    # Don't lose clicks recorded since the last periodic flush
+    await usage_counter.stop()
+    # Store queued chat messages before the listener goes away
+    await chat_writer.stop()
+    await chat.manager.pubsub.close()
+    await response_cache.close()
+    # Pooled async connections keep the process alive past exit (aiosqlite
+    # runs a thread per connection) unless they are closed
+    await replicas.dispose()
+    if async_engine is not None:
+        await async_engine.dispose()
+
 app = FastAPI(
     title="ProposalForge API",
     description="Enterprise Proposal Generation Platform API",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -20,14 +53,31 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor", "X-Request-ID", "X-SQL-Profile"],
 )
 
+# Keep a user's reads on the primary right after they write
+if replicas:
+    app.add_middleware(PrimaryAfterWriteMiddleware, writers=recent_writers)
+
+# Development: per-request SQL reports and N+1 warnings
+if settings.sql_profiler:
+    app.add_middleware(SQLProfilerMiddleware, n_plus_one=settings.sql_profiler_n_plus_one)
+    app.include_router(debug.router)
+
+# Outermost, so latency includes the other middleware
+app.add_middleware(PrometheusMiddleware)
+
 # Include routers
 app.include_router(auth.router)
 app.include_router(organizations.router)
 app.include_router(proposals.router)
 app.include_router(knowledge.router)
 app.include_router(chat.router)
+app.include_router(reports.router)
+app.include_router(profiler.router)
+app.add_api_route("/metrics", metrics_endpoint, include_in_schema=False)
+
 @app.get("/")
 def read_root():
     return {"message": "ProposalForge API is running"}
@@ -0,0 +1,261 @@
+"""Prometheus metrics and the ``/metrics`` endpoint.
+
+Each worker process keeps its own registry; scrape every worker (or put
+them behind a per-worker target) rather than a load balancer.
+
+``PrometheusMiddleware`` records per-request latency by method, route
+template and status, requests in flight, and how many SQL statements each
+request ran and how long they took; statements are attributed through a
+context variable that engine events update, which follows the request into
+the threadpool and into ``run_sync`` greenlets.
+
+Connection pools are instrumented by swapping in a ``QueuePool`` subclass
+that times ``_do_get`` - the wait for a free connection, including opening
+a new one - and counts timeouts and overflow connections. In-use, idle and
+overflow gauges, like the chat socket gauges, are read from the live
+objects at scrape time, so they cost nothing between scrapes.
+"""
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple, Type
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+from starlette.requests import Request
+from starlette.responses import Response
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0),
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "HTTP requests being served", ["method"]
+)
+REQUEST_DB_STATEMENTS = Histogram(
+    "http_request_db_statements",
+    "SQL statements executed per HTTP request",
+    ["method", "route"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250),
+)
+REQUEST_DB_SECONDS = Histogram(
+    "http_request_db_seconds",
+    "Time per HTTP request spent executing SQL statements",
+    ["method", "route"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+
+POOL_CHECKOUT_SECONDS = Histogram(
+    "db_pool_checkout_seconds",
+    "Time spent waiting for a pooled database connection",
+    ["pool"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+POOL_TIMEOUTS = Counter(
+    "db_pool_timeouts", "Checkouts that gave up after pool_timeout", ["pool"]
+)
+POOL_OVERFLOW_OPENED = Counter(
+    "db_pool_overflow_connections", "Connections opened beyond pool_size", ["pool"]
+)
+POOL_CONNECTS = Counter(
+    "db_pool_connects", "New DBAPI connections opened", ["pool"]
+)
+POOL_INVALIDATIONS = Counter(
+    "db_pool_invalidations", "Connections discarded as broken or stale", ["pool"]
+)
+RESPONSE_CACHE_LOOKUPS = Counter(
+    "response_cache_lookups", "Response cache lookups by where they were answered", ["resource", "result"]
+)
+REPLICA_EJECTIONS = Counter(
+    "db_replica_ejections", "Times a read replica was taken out of rotation", ["pool"]
+)
+
+
+class _InstrumentedPool:
+    metrics_name = "default"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            POOL_TIMEOUTS.labels(self.metrics_name).inc()
+            raise
+        finally:
+            POOL_CHECKOUT_SECONDS.labels(self.metrics_name).observe(time.perf_counter() - start)
+
+    def _inc_overflow(self) -> bool:
+        opened = super()._inc_overflow()
+        if opened and self._overflow > 0:
+            POOL_OVERFLOW_OPENED.labels(self.metrics_name).inc()
+        return opened
+
+
+_pool_classes: Dict[Tuple[str, type], Type[QueuePool]] = {}
+
+
+def instrumented_pool(name: str, base: Type[QueuePool] = QueuePool) -> Type[QueuePool]:
+    """``base`` subclass reporting under ``pool=name``; pass as ``poolclass``."""
+    key = (name, base)
+    if key not in _pool_classes:
+        _pool_classes[key] = type(
+            f"Instrumented{base.__name__}", (_InstrumentedPool, base), {"metrics_name": name}
+        )
+    return _pool_classes[key]
+
+
+class _PoolCollector:
+    """Reads size/in-use/idle/overflow from registered engines per scrape."""
+
+    def __init__(self):
+        self.engines = {}
+
+    def collect(self):
+        families = {
+            "size": GaugeMetricFamily("db_pool_size", "Configured pool_size", labels=["pool"]),
+            "checkedout": GaugeMetricFamily("db_pool_in_use", "Connections checked out", labels=["pool"]),
+            "checkedin": GaugeMetricFamily("db_pool_idle", "Idle connections in the pool", labels=["pool"]),
+            "overflow": GaugeMetricFamily(
+                "db_pool_overflow", "Connections open beyond pool_size", labels=["pool"]
+            ),
+        }
+        for name, engine in self.engines.items():
+            pool = engine.pool
+            if not isinstance(pool, QueuePool):
+                continue
+            for attribute, family in families.items():
+                value = getattr(pool, attribute)()
+                # QueuePool counts overflow from -pool_size up
+                family.add_metric([name], max(value, 0))
+        return list(families.values())
+
+
+pool_collector = _PoolCollector()
+REGISTRY.register(pool_collector)
+
+
+def watch_engine(name: str, engine) -> None:
+    """Report ``engine``'s pool gauges and connect/invalidate counts."""
+    engine = getattr(engine, "sync_engine", engine)
+    pool_collector.engines[name] = engine
+    event.listen(engine, "connect", lambda *args: POOL_CONNECTS.labels(name).inc())
+    event.listen(engine, "invalidate", lambda *args: POOL_INVALIDATIONS.labels(name).inc())
+    event.listen(engine, "soft_invalidate", lambda *args: POOL_INVALIDATIONS.labels(name).inc())
+
+
+class RequestStats:
+    __slots__ = ("statements", "db_seconds")
+
+    def __init__(self):
+        self.statements = 0
+        self.db_seconds = 0.0
+
+
+# Set for the duration of each HTTP request; None outside one
+request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _statement_started(conn, cursor, statement, parameters, context, executemany):
+    if request_stats.get() is not None:
+        context._metrics_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _statement_finished(conn, cursor, statement, parameters, context, executemany):
+    stats = request_stats.get()
+    started = getattr(context, "_metrics_started", None)
+    if stats is not None and started is not None:
+        stats.statements += 1
+        stats.db_seconds += time.perf_counter() - started
+
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+class PrometheusMiddleware:
+    """Per-request latency and SQL metrics, labelled by route template.
+
+    Paths that match no route share one label so scanners cannot blow up
+    the number of series.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        stats = RequestStats()
+        token = request_stats.set(stats)
+        in_progress = REQUESTS_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            in_progress.dec()
+            request_stats.reset(token)
+            # The router stores the matched route in the scope it was given
+            route = scope.get("route")
+            template = getattr(route, "path", UNMATCHED_ROUTE)
+            REQUEST_SECONDS.labels(method, template, str(status)).observe(elapsed)
+            REQUEST_DB_STATEMENTS.labels(method, template).observe(stats.statements)
+            REQUEST_DB_SECONDS.labels(method, template).observe(stats.db_seconds)
+
+
+class _ChatCollector:
+    """Open chat sockets per room, read from the connection manager."""
+
+    def __init__(self):
+        self.manager = None
+
+    def collect(self):
+        if self.manager is None:
+            return []
+        sockets = GaugeMetricFamily(
+            "chat_websocket_connections", "Open chat WebSockets on this worker", labels=["room"]
+        )
+        for proposal_id, room in list(self.manager.active_connections.items()):
+            sockets.add_metric([str(proposal_id)], len(room))
+        return [
+            sockets,
+            CounterMetricFamily(
+                "chat_slow_consumers_dropped", "Chat sockets closed for falling behind",
+                value=self.manager.slow_consumers_dropped,
+            ),
+            CounterMetricFamily(
+                "chat_send_errors", "Chat sockets closed after a failed send",
+                value=self.manager.send_errors,
+            ),
+        ]
+
+
+chat_collector = _ChatCollector()
+REGISTRY.register(chat_collector)
+
+
+def watch_chat(manager) -> None:
+    """Report socket counts for ``manager``'s rooms."""
+    chat_collector.manager = manager
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    # CONTENT_TYPE_LATEST already names the charset; media_type would add another
+    return Response(generate_latest(REGISTRY), headers={"Content-Type": CONTENT_TYPE_LATEST})
@@ -1,9 +1,13 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Float, Table, Enum
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Float, Table, Enum, Index, JSON, event, inspect
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .database import Base
 import enum
 
+# Tag arrays: GIN-indexed JSONB on PostgreSQL, JSON text elsewhere
+TagList = JSON().with_variant(JSONB(), "postgresql")
+
 # Association table for proposal assignments
 proposal_assignments = Table(
     'proposal_assignments',
@@ -12,6 +16,24 @@ proposal_assignments = Table(
     Column('user_id', Integer, ForeignKey('users.id'))
 )
 
+# One row per (item, tag) for dialects without JSONB containment indexes;
+# kept in sync with the tags columns by app.tags
+proposal_tags = Table(
+    'proposal_tags',
+    Base.metadata,
+    Column('proposal_id', Integer, ForeignKey('proposals.id', ondelete='CASCADE'), primary_key=True),
+    Column('tag', String, primary_key=True),
+    Index('ix_proposal_tags_tag_proposal_id', 'tag', 'proposal_id'),
+)
+
+knowledge_tags = Table(
+    'knowledge_tags',
+    Base.metadata,
+    Column('knowledge_id', Integer, ForeignKey('knowledge_base.id', ondelete='CASCADE'), primary_key=True),
+    Column('tag', String, primary_key=True),
+    Index('ix_knowledge_tags_tag_knowledge_id', 'tag', 'knowledge_id'),
+)
+
 class UserRole(str, enum.Enum):
     ADMIN = "admin"
     MANAGER = "manager"
@@ -64,6 +86,9 @@ class User(Base):
     hashed_password = Column(String, nullable=False)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Incremented in SQL by every update (see _bump_user_version); part of
+    # the cache keys and ETags of responses that embed the user
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     
     # Relationships
     profile = relationship("UserProfile", back_populates="user", uselist=False)
@@ -74,6 +99,15 @@ class User(Base):
     comments = relationship("Comment", back_populates="author")
     activities = relationship("Activity", back_populates="user")
 
+# Users are edited wherever a session touches them rather than through one
+# endpoint, so the bump happens here. Collection-only changes (e.g. being
+# assigned to a proposal) also reach before_update; they leave the row alone.
+@event.listens_for(User, "before_update")
+def _bump_user_version(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[attr.key].history.has_changes() for attr in mapper.column_attrs):
+        target.version = User.version + 1
+
 class UserProfile(Base):
     __tablename__ = "user_profiles"
     
@@ -97,6 +131,8 @@ class Organization(Base):
     description = Column(Text)
     created_by = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Incremented in SQL by every update; part of response cache keys
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     
     # Relationships
     creator = relationship("User", back_populates="created_organizations")
@@ -104,6 +140,13 @@ class Organization(Base):
 
 class Proposal(Base):
     __tablename__ = "proposals"
+    __table_args__ = (
+        # Keyset pagination: filter column + id seek
+        Index("ix_proposals_status_id", "status", "id"),
+        Index("ix_proposals_organization_id_id", "organization_id", "id"),
+        # Tag filters (@>, ?|); other dialects use proposal_tags
+        Index("ix_proposals_tags", "tags", postgresql_using="gin").ddl_if(dialect="postgresql"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, nullable=False, index=True)
@@ -114,7 +157,7 @@ class Proposal(Base):
     deadline = Column(DateTime(timezone=True), nullable=False, index=True)
     estimated_value = Column(Float, nullable=False)
     created_by = Column(Integer, ForeignKey("users.id"))
-    tags = Column(Text)  # JSON string of tags array
+    tags = Column(TagList, default=list)
     current_version = Column(Integer, default=1)
     is_template = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -132,6 +175,10 @@ class Proposal(Base):
 
 class ProposalSection(Base):
     __tablename__ = "proposal_sections"
+    __table_args__ = (
+        # A proposal's sections in order; also the response cache probe
+        Index("ix_proposal_sections_proposal_id_order", "proposal_id", "order"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     proposal_id = Column(Integer, ForeignKey("proposals.id"))
@@ -152,18 +199,25 @@ class ProposalSection(Base):
 
 class KnowledgeBase(Base):
     __tablename__ = "knowledge_base"
+    __table_args__ = (
+        Index("ix_knowledge_base_is_approved_id", "is_approved", "id"),
+        Index("ix_knowledge_base_tags", "tags", postgresql_using="gin").ddl_if(dialect="postgresql"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, nullable=False, index=True)
     content = Column(Text, nullable=False)
     category = Column(Enum(KnowledgeCategory), nullable=False, index=True)
-    tags = Column(Text)  # JSON string of tags array
+    tags = Column(TagList, default=list)
     industry = Column(String, index=True)
     created_by = Column(Integer, ForeignKey("users.id"))
     usage_count = Column(Integer, default=0)
     is_approved = Column(Boolean, default=False, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # Incremented in SQL by every edit (not by the usage count flush, which
+    # the ETags carry separately); part of ETags
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     
     # Relationships
     creator = relationship("User", back_populates="knowledge_items")
@@ -188,6 +242,9 @@ class Comment(Base):
 
 class Activity(Base):
     __tablename__ = "activities"
+    __table_args__ = (
+        Index("ix_activities_proposal_id_id", "proposal_id", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     proposal_id = Column(Integer, ForeignKey("proposals.id"))
@@ -234,6 +291,10 @@ class Attachment(Base):
 
 class ProposalChat(Base):
     __tablename__ = "proposal_chats"
+    __table_args__ = (
+        # History pages and reconnect sync seek on id within a proposal
+        Index("ix_proposal_chats_proposal_id_id", "proposal_id", "id"),
+    )
     
     id = Column(Integer, primary_key=True)
     proposal_id = Column(Integer, ForeignKey("proposals.id"), nullable=False)
@@ -244,3 +305,16 @@ class ProposalChat(Base):
     # Relationships
     proposal = relationship("Proposal")
     sender = relationship("User")
+
+class ProposalStats(Base):
+    """Pipeline rollup: proposal count and value per (organization, status).
+
+    Rows with ``organization_id == 0`` are totals across all proposals,
+    including those without an organization. Maintained by ``app.stats``.
+    """
+    __tablename__ = "proposal_stats"
+    
+    organization_id = Column(Integer, primary_key=True, autoincrement=False)
+    status = Column(String(20), primary_key=True)
+    proposal_count = Column(Integer, nullable=False, default=0)
+    total_value = Column(Float, nullable=False, default=0.0)
@@ -0,0 +1,75 @@
+import base64
+import binascii
+import json
+from typing import Any, List, Optional, Tuple
+
+from fastapi import HTTPException, Response
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from .etags import make_etag, not_modified
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(*values: Any) -> str:
+    raw = json.dumps(values, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> List[Any]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or not values:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def keyset_paginate(query, key_column, cursor: Optional[str], limit: int, descending: bool = True):
+    """Order ``query`` by an indexed, unique key and seek past ``cursor``.
+
+    The seek is a range predicate on the key, so every page is an index
+    range scan of ``limit`` rows no matter how deep the client has paged.
+    """
+    if cursor:
+        last = decode_cursor(cursor)[0]
+        if not isinstance(last, int):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.filter(key_column < last if descending else key_column > last)
+    order = key_column.desc() if descending else key_column.asc()
+    return query.order_by(order).limit(limit)
+
+
+def next_cursor(rows: list, limit: int, key: str = "id") -> Optional[str]:
+    # A short page means there is nothing after it
+    if not rows or len(rows) < limit:
+        return None
+    return encode_cursor(getattr(rows[-1], key))
+
+
+def set_next_cursor(response: Response, cursor: Optional[str]) -> None:
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
+
+
+def page_etag(session: Session, page, limit: int, *aggregates) -> Tuple[str, Optional[str]]:
+    """ETag and next cursor of a newest-first page, from one aggregate query.
+
+    ``page`` is the page as a subquery with an ``id`` column; ``aggregates``
+    over its other columns must change whenever a row's representation
+    does. Only the page's rows are read, so this stays as cheap as the page.
+    """
+    count, last_id, id_sum, *rest = session.query(
+        func.count(), func.min(page.c.id), func.sum(page.c.id), *aggregates
+    ).one()
+    cursor = encode_cursor(last_id) if count and count >= limit else None
+    return make_etag(count, last_id, id_sum, *rest), cursor
+
+
+def not_modified_page(etag: str, cursor: Optional[str]) -> Response:
+    response = not_modified(etag)
+    set_next_cursor(response, cursor)
+    return response
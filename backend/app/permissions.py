@@ -0,0 +1,71 @@
+import enum
+import json
+import logging
+from functools import lru_cache
+from typing import Iterable, Optional
+
+from .models import UserProfile, UserRole
+
+logger = logging.getLogger(__name__)
+
+
+class Permission(enum.IntFlag):
+    """Named permissions, compiled into one immutable integer per user."""
+
+    NONE = 0
+    READ = enum.auto()
+    WRITE = enum.auto()
+    APPROVE = enum.auto()
+    ADMIN = enum.auto()
+
+    @classmethod
+    def parse(cls, names: Iterable[str]) -> "Permission":
+        """Combine permission names; unknown names raise ``ValueError``."""
+        combined = cls.NONE
+        for name in names:
+            try:
+                combined |= cls[name.upper()]
+            except KeyError:
+                raise ValueError(f"Unknown permission: {name!r}") from None
+        return combined
+
+
+# Granted by the role on top of the profile's explicit ``permissions``
+ROLE_PERMISSIONS = {
+    UserRole.ADMIN: Permission.READ | Permission.WRITE | Permission.APPROVE | Permission.ADMIN,
+    UserRole.MANAGER: Permission.READ | Permission.WRITE | Permission.APPROVE,
+    UserRole.PRESALES: Permission.READ | Permission.WRITE,
+    UserRole.VIEWER: Permission.READ,
+}
+
+
+@lru_cache(maxsize=1024)
+def compile_permissions(role: Optional[UserRole], permissions: Optional[str]) -> Permission:
+    """Role defaults plus the JSON ``permissions`` list of a profile.
+
+    Profiles repeat the same few (role, list) pairs, so results are
+    memoized; names this version does not know are ignored, and a value
+    that is not a JSON list leaves just the role defaults.
+    """
+    granted = ROLE_PERMISSIONS.get(role, Permission.NONE)
+    try:
+        names = json.loads(permissions) if permissions else []
+        if not isinstance(names, list):
+            raise TypeError(f"expected a list, got {type(names).__name__}")
+    except (ValueError, TypeError):
+        logger.warning("Ignoring malformed permissions %r; using the role defaults", permissions)
+        return granted
+    for name in names:
+        member = Permission.__members__.get(str(name).upper())
+        if member is None:
+            logger.warning("Ignoring unknown permission %r", name)
+            continue
+        granted |= member
+    return granted
+
+
+def profile_permissions(profile: Optional[UserProfile]) -> Permission:
+    # No profile, or a deactivated one, grants nothing
+    if profile is None or profile.is_active is False:
+        return Permission.NONE
+    return compile_permissions(profile.role, profile.permissions)
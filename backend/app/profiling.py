@@ -0,0 +1,228 @@
+"""Per-request SQL profiler and N+1 detector for development.
+
+With ``SQL_PROFILER=true`` every HTTP request gets an id and a record of
+the statements it ran: normalized SQL, duration and the application line
+that issued it. A statement that runs ``sql_profiler_n_plus_one`` or more
+times in one request with different parameters - typically a lazy load
+per row while a response model is validated - is reported as an N+1.
+Responses carry ``X-Request-ID`` and a one-line ``X-SQL-Profile`` summary;
+the full report for recent requests is at ``/debug/requests/{id}``.
+
+Parameter values are never stored, only whether they differed. Recording
+call sites walks the stack on every statement, so leave this off in
+production; ``app.metrics`` has the cheap per-route statement counts.
+"""
+import hashlib
+import logging
+import os
+import re
+import sys
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+# Session plumbing between a handler and the statement; never the call site
+_SKIPPED_FILES = {
+    os.path.join(APP_DIR, name) for name in ("profiling.py", "database.py", "replicas.py")
+}
+
+_WHITESPACE = re.compile(r"\s+")
+# qmark, format, pyformat and numeric paramstyles
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|\$\d+|\?")
+# IN lists expand to one placeholder per value
+_PLACEHOLDER_LIST = re.compile(r"\?(?:\s*,\s*\?)+")
+
+
+def normalize_sql(statement: str) -> str:
+    sql = _PLACEHOLDER.sub("?", _WHITESPACE.sub(" ", statement).strip())
+    return _PLACEHOLDER_LIST.sub("?, ...", sql)
+
+
+def call_site() -> Optional[str]:
+    """Innermost frame in this package outside the session plumbing."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(APP_DIR) and filename not in _SKIPPED_FILES:
+            return f"{os.path.relpath(filename, os.path.dirname(APP_DIR))}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return None
+
+
+@dataclass
+class Statement:
+    sql: str
+    seconds: float
+    site: Optional[str]
+    parameters: str
+
+
+@dataclass
+class Profile:
+    """Statements recorded for one request (or one ``capture`` block)."""
+
+    statements: List[Statement] = field(default_factory=list)
+
+    def record(self, statement: str, parameters: Any, seconds: float) -> None:
+        digest = hashlib.blake2b(repr(parameters).encode(), digest_size=8).hexdigest()
+        self.statements.append(Statement(normalize_sql(statement), seconds, call_site(), digest))
+
+    @property
+    def db_seconds(self) -> float:
+        return sum(s.seconds for s in self.statements)
+
+    def n_plus_one(self, threshold: int) -> List[Dict[str, Any]]:
+        """Statements repeated ``threshold`` or more times with differing parameters."""
+        groups: Dict[str, List[Statement]] = {}
+        for statement in self.statements:
+            groups.setdefault(statement.sql, []).append(statement)
+        return [
+            {
+                "sql": sql,
+                "count": len(repeats),
+                "seconds": sum(s.seconds for s in repeats),
+                "sites": sorted({s.site for s in repeats if s.site}),
+            }
+            for sql, repeats in groups.items()
+            if len(repeats) >= threshold and len({s.parameters for s in repeats}) > 1
+        ]
+
+    def report(self, threshold: int) -> Dict[str, Any]:
+        return {
+            "statement_count": len(self.statements),
+            "db_seconds": self.db_seconds,
+            "n_plus_one": self.n_plus_one(threshold),
+            "statements": [
+                {"sql": s.sql, "seconds": s.seconds, "site": s.site} for s in self.statements
+            ],
+        }
+
+
+# The request being profiled; None outside one
+current_profile: ContextVar[Optional[Profile]] = ContextVar("current_profile", default=None)
+
+# Profiles collecting every statement from any thread, for ``capture``
+_captures: List[Profile] = []
+
+
+def _started(conn, cursor, statement, parameters, context, executemany):
+    context._profile_started = time.perf_counter()
+
+
+def _finished(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_profile_started", None)
+    if started is None:
+        return
+    seconds = time.perf_counter() - started
+    profile = current_profile.get()
+    if profile is not None:
+        profile.record(statement, parameters, seconds)
+    for capture_profile in _captures:
+        capture_profile.record(statement, parameters, seconds)
+
+
+def _listen() -> None:
+    if not event.contains(Engine, "before_cursor_execute", _started):
+        event.listen(Engine, "before_cursor_execute", _started)
+        event.listen(Engine, "after_cursor_execute", _finished)
+
+
+@contextmanager
+def capture() -> Iterator[Profile]:
+    """Record every statement run while the block executes, on any thread."""
+    _listen()
+    profile = Profile()
+    _captures.append(profile)
+    try:
+        yield profile
+    finally:
+        _captures.remove(profile)
+
+
+class RequestHistory:
+    """The most recent request reports, by request id."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._reports: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def add(self, request_id: str, report: Dict[str, Any]) -> None:
+        self._reports[request_id] = report
+        while len(self._reports) > self.size:
+            self._reports.popitem(last=False)
+
+    def get(self, request_id: str) -> Optional[Dict[str, Any]]:
+        return self._reports.get(request_id)
+
+    def recent(self) -> List[Dict[str, Any]]:
+        return list(reversed(self._reports.values()))
+
+
+history = RequestHistory(settings.sql_profiler_history)
+
+
+class SQLProfilerMiddleware:
+    """Profiles each HTTP request's SQL and reports it in headers and history."""
+
+    def __init__(self, app, n_plus_one: int):
+        self.app = app
+        self.n_plus_one = n_plus_one
+        _listen()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith("/debug/"):
+            await self.app(scope, receive, send)
+            return
+
+        request_id = uuid.uuid4().hex[:16]
+        profile = Profile()
+        status = 500
+
+        async def send_with_profile(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers["X-Request-ID"] = request_id
+                headers["X-SQL-Profile"] = (
+                    f"statements={len(profile.statements)}; db_ms={profile.db_seconds * 1000:.1f}; "
+                    f"n_plus_one={len(profile.n_plus_one(self.n_plus_one))}"
+                )
+            await send(message)
+
+        token = current_profile.set(profile)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_profile)
+        finally:
+            current_profile.reset(token)
+            report = profile.report(self.n_plus_one)
+            route = scope.get("route")
+            report.update(
+                id=request_id,
+                method=scope["method"],
+                path=scope["path"],
+                route=getattr(route, "path", None),
+                status=status,
+                seconds=time.perf_counter() - start,
+            )
+            history.add(request_id, report)
+            for pattern in report["n_plus_one"]:
+                logger.warning(
+                    "N+1 in %s %s (request %s): %d x %s from %s",
+                    scope["method"], scope["path"], request_id, pattern["count"], pattern["sql"],
+                    ", ".join(pattern["sites"]) or "unknown site",
+                )
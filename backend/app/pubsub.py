@@ -0,0 +1,168 @@
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Dict, Optional
+
+from sqlalchemy.engine import make_url
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[str], Awaitable[None]]
+
+# NOTIFY payloads must be shorter than 8000 bytes in the default build
+MAX_PAYLOAD_BYTES = 7999
+
+
+class PubSub(ABC):
+    """Channel based fan-out between app workers.
+
+    ``subscribe`` registers the one local handler for a channel; every
+    payload published to that channel by any worker is passed to it as a
+    ``str``. Publishers also receive their own messages through the
+    subscription, so local and remote delivery take the same path.
+    """
+
+    @abstractmethod
+    async def subscribe(self, channel: str, handler: Handler) -> None:
+        """Route every payload on ``channel`` to ``handler``."""
+
+    @abstractmethod
+    async def unsubscribe(self, channel: str) -> None:
+        """Stop delivering ``channel`` to this worker."""
+
+    @abstractmethod
+    async def publish(self, channel: str, payload: str) -> None:
+        """Send ``payload`` to every worker subscribed to ``channel``."""
+
+    async def close(self) -> None:
+        pass
+
+
+class InMemoryPubSub(PubSub):
+    """Single-process stand-in for tests and SQLite deployments."""
+
+    def __init__(self):
+        self.handlers: Dict[str, Handler] = {}
+
+    async def subscribe(self, channel: str, handler: Handler) -> None:
+        self.handlers[channel] = handler
+
+    async def unsubscribe(self, channel: str) -> None:
+        self.handlers.pop(channel, None)
+
+    async def publish(self, channel: str, payload: str) -> None:
+        handler = self.handlers.get(channel)
+        if handler is not None:
+            await handler(payload)
+
+
+class PostgresPubSub(PubSub):
+    """``LISTEN``/``NOTIFY`` over asyncpg.
+
+    One dedicated connection per worker holds the ``LISTEN``s, so a worker
+    only hears about channels it has subscribers for; a small pool sends
+    ``pg_notify``. If the listening connection drops, it is re-opened and
+    every channel re-subscribed.
+    """
+
+    def __init__(self, dsn: str, publish_pool_size: int = 4):
+        self.dsn = dsn
+        self.publish_pool_size = publish_pool_size
+        self.handlers: Dict[str, Handler] = {}
+        self._listener = None
+        self._pool = None
+        self._lock = asyncio.Lock()
+        self._closed = False
+        self._reconnect_task: Optional[asyncio.Task] = None
+
+    async def _connect_listener(self):
+        import asyncpg
+
+        if self._listener is None or self._listener.is_closed():
+            self._listener = await asyncpg.connect(self.dsn)
+            self._listener.add_termination_listener(self._on_termination)
+            for channel in self.handlers:
+                await self._listener.add_listener(channel, self._on_notify)
+        return self._listener
+
+    async def _publish_pool(self):
+        import asyncpg
+
+        if self._pool is None:
+            async with self._lock:
+                if self._pool is None:
+                    self._pool = await asyncpg.create_pool(
+                        self.dsn, min_size=1, max_size=self.publish_pool_size
+                    )
+        return self._pool
+
+    def _on_notify(self, connection, pid, channel, payload):
+        handler = self.handlers.get(channel)
+        if handler is not None:
+            # Tasks start in creation order, so per-channel order is kept
+            asyncio.get_running_loop().create_task(handler(payload))
+
+    def _on_termination(self, connection):
+        if not self._closed and (self._reconnect_task is None or self._reconnect_task.done()):
+            self._reconnect_task = asyncio.get_running_loop().create_task(self._reconnect())
+
+    async def _reconnect(self):
+        delay = 0.1
+        while not self._closed:
+            try:
+                async with self._lock:
+                    await self._connect_listener()
+                return
+            except Exception:
+                logger.exception("Re-opening chat LISTEN connection failed")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 5.0)
+
+    async def subscribe(self, channel: str, handler: Handler) -> None:
+        async with self._lock:
+            listener = await self._connect_listener()
+            if channel not in self.handlers:
+                self.handlers[channel] = handler
+                await listener.add_listener(channel, self._on_notify)
+            else:
+                self.handlers[channel] = handler
+
+    async def unsubscribe(self, channel: str) -> None:
+        async with self._lock:
+            if self.handlers.pop(channel, None) is None:
+                return
+            if self._listener is not None and not self._listener.is_closed():
+                await self._listener.remove_listener(channel, self._on_notify)
+
+    async def publish(self, channel: str, payload: str) -> None:
+        if len(payload.encode("utf-8")) > MAX_PAYLOAD_BYTES:
+            raise ValueError("Message too large")
+        pool = await self._publish_pool()
+        await pool.execute("SELECT pg_notify($1, $2)", channel, payload)
+
+    async def close(self) -> None:
+        self._closed = True
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+        if self._listener is not None:
+            await self._listener.close()
+            self._listener = None
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+
+def asyncpg_dsn(url: str) -> str:
+    # asyncpg takes a libpq style URL without the SQLAlchemy driver suffix
+    return make_url(url).set(drivername="postgresql").render_as_string(hide_password=False)
+
+
+def create_pubsub() -> PubSub:
+    backend = settings.chat_pubsub_backend
+    if backend == "auto":
+        backend = "postgres" if make_url(settings.database_url).get_backend_name() == "postgresql" else "memory"
+    if backend == "postgres":
+        return PostgresPubSub(asyncpg_dsn(settings.database_url))
+    return InMemoryPubSub()
@@ -0,0 +1,242 @@
+"""Read replicas for read-only request handlers.
+
+``get_read_database`` hands out a session on the next healthy replica in
+round-robin order, or on the primary when no replica is configured, all
+are ejected, or the client wrote recently. A replica whose connection or
+query fails with a connection-level error is ejected for
+``db_replica_eject_seconds`` and the unit of work is rerun on the primary,
+so an outage costs one slow request rather than a failed one; once the
+ejection expires the replica is tried again.
+
+Replicas lag the primary, so after a successful POST/PUT/PATCH/DELETE
+``PrimaryAfterWriteMiddleware`` keeps that user's reads on the primary for
+``db_replica_stick_seconds`` (read-your-writes). The write is recorded
+against the authenticated user in ``recent_writers``: in this process and,
+when the response cache has a shared backend, there as well, so the
+user's next read goes to the primary whichever worker serves it and from
+whichever client it comes. The response also sets a cookie, which does the
+same for that client when the shared backend is missing or failing.
+Only endpoints that never write may depend on ``get_read_database``.
+"""
+import itertools
+import logging
+import math
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, TypeVar
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+from sqlalchemy.orm import sessionmaker
+from fastapi import Depends
+from starlette.datastructures import MutableHeaders
+from starlette.requests import Request
+
+from .auth import get_current_user
+from .cache import SharedCache, response_cache
+from .config import settings
+from .database import AsyncDatabase, Database, get_async_database_url, open_database, pool_options
+from .metrics import REPLICA_EJECTIONS, watch_engine
+from .token_cache import UserPrincipal
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+PRIMARY_COOKIE = "pf_read_primary"
+SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+@dataclass
+class Replica:
+    name: str
+    engine: object
+    session_factory: Callable
+    ejected_until: float = 0.0
+
+    def open(self) -> Database:
+        session = self.session_factory()
+        return AsyncDatabase(session) if settings.use_async_db else Database(session)
+
+
+def replica_unavailable(error: BaseException) -> bool:
+    """Whether ``error`` means the replica, not the query, is at fault."""
+    if isinstance(error, DBAPIError):
+        return error.connection_invalidated or isinstance(error, (OperationalError, InterfaceError))
+    # asyncpg raises a refused connection as a bare OSError
+    return isinstance(error, OSError)
+
+
+class ReplicaSet:
+    """Round-robin over replicas, skipping ejected ones."""
+
+    def __init__(self, replicas: List[Replica], eject_seconds: float):
+        self.replicas = replicas
+        self.eject_seconds = eject_seconds
+        self._turn = itertools.count()
+
+    def __bool__(self) -> bool:
+        return bool(self.replicas)
+
+    def choose(self) -> Optional[Replica]:
+        if not self.replicas:
+            return None
+        now = time.monotonic()
+        start = next(self._turn)
+        for offset in range(len(self.replicas)):
+            replica = self.replicas[(start + offset) % len(self.replicas)]
+            if replica.ejected_until <= now:
+                return replica
+        return None
+
+    def eject(self, replica: Replica, error: BaseException) -> None:
+        if replica.ejected_until <= time.monotonic():
+            logger.warning(
+                "Read replica %s failed (%s); sending its reads to the primary for %.0f s",
+                replica.name, error, self.eject_seconds,
+            )
+            REPLICA_EJECTIONS.labels(replica.name).inc()
+        replica.ejected_until = time.monotonic() + self.eject_seconds
+
+    async def dispose(self) -> None:
+        for replica in self.replicas:
+            if settings.use_async_db:
+                await replica.engine.dispose()
+            else:
+                replica.engine.dispose()
+
+
+def create_replicas(urls: List[str]) -> ReplicaSet:
+    members = []
+    for index, url in enumerate(urls):
+        name = f"replica-{index}"
+        if settings.use_async_db:
+            from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+            url = get_async_database_url(url)
+            engine = create_async_engine(url, **pool_options(url, name, asyncio=True))
+            factory = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+        else:
+            engine = create_engine(url, **pool_options(url, name))
+            factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        watch_engine(name, engine)
+        members.append(Replica(name, engine, factory))
+    return ReplicaSet(members, settings.db_replica_eject_seconds)
+
+
+replicas = create_replicas(settings.database_replica_urls)
+
+
+class ReplicaDatabase(Database):
+    """A Database on a replica that reruns failed reads on the primary."""
+
+    def __init__(self, replica_set: ReplicaSet, replica: Replica):
+        self.replica_set = replica_set
+        self.replica: Optional[Replica] = replica
+        self.database = replica.open()
+
+    @property
+    def session(self):
+        return self.database.session
+
+    async def run(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        if self.replica is not None:
+            try:
+                return await self.database.run(fn, *args, **kwargs)
+            except Exception as error:
+                if not replica_unavailable(error):
+                    raise
+                self.replica_set.eject(self.replica, error)
+                await self.database.close()
+                self.replica, self.database = None, open_database()
+        return await self.database.run(fn, *args, **kwargs)
+
+    async def close(self) -> None:
+        await self.database.close()
+
+
+class RecentWriters:
+    """Users who wrote in the last ``seconds``, by id."""
+
+    def __init__(self, seconds: float, shared: Optional[SharedCache]):
+        self.seconds = seconds
+        self.shared = shared
+        self._until: Dict[int, float] = {}
+
+    @staticmethod
+    def _key(user_id: int) -> str:
+        return f"wrote:{user_id}"
+
+    async def record(self, user_id: int) -> None:
+        now = time.monotonic()
+        if len(self._until) >= 1024:
+            self._until = {uid: until for uid, until in self._until.items() if until > now}
+        self._until[user_id] = now + self.seconds
+        if self.shared is not None:
+            try:
+                await self.shared.set(self._key(user_id), b"1", max(1, math.ceil(self.seconds)))
+            except Exception:
+                logger.warning("Recording a write in the shared cache failed", exc_info=True)
+
+    async def wrote_recently(self, user_id: int) -> bool:
+        until = self._until.get(user_id)
+        if until is not None:
+            if until > time.monotonic():
+                return True
+            self._until.pop(user_id, None)
+        if self.shared is None:
+            return False
+        try:
+            return await self.shared.get(self._key(user_id)) is not None
+        except Exception:
+            logger.warning("Looking up a write in the shared cache failed", exc_info=True)
+            return False
+
+
+recent_writers = RecentWriters(settings.db_replica_stick_seconds, response_cache.shared)
+
+
+async def wrote_recently(request: Request, principal: UserPrincipal) -> bool:
+    return PRIMARY_COOKIE in request.cookies or await recent_writers.wrote_recently(principal.id)
+
+
+async def get_read_database(request: Request, current_user: UserPrincipal = Depends(get_current_user)):
+    """Like ``get_database``, but on a replica when one is available."""
+    replica = None
+    if replicas and not await wrote_recently(request, current_user):
+        replica = replicas.choose()
+    db = ReplicaDatabase(replicas, replica) if replica is not None else open_database()
+    try:
+        yield db
+    finally:
+        await db.close()
+
+
+class PrimaryAfterWriteMiddleware:
+    """Records successful unsafe requests for read-your-writes."""
+
+    def __init__(self, app, writers: RecentWriters):
+        self.app = app
+        self.writers = writers
+        self.cookie = (
+            f"{PRIMARY_COOKIE}=1; Max-Age={max(1, math.ceil(writers.seconds))}; Path=/; HttpOnly; SameSite=lax"
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS:
+            await self.app(scope, receive, send)
+            return
+        # get_current_user leaves the principal here
+        state = scope.setdefault("state", {})
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                # Before the response goes out, so the client's next read
+                # cannot overtake the record
+                principal = state.get("principal")
+                if principal is not None:
+                    await self.writers.record(principal.id)
+                MutableHeaders(scope=message).append("set-cookie", self.cookie)
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
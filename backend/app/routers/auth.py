@@ -2,52 +2,57 @@ from datetime import timedelta
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
-from ..database import get_db
+from ..database import Database, get_database
 from ..models import User, UserProfile
 from ..schemas import UserCreate, UserResponse, Token, LoginRequest, UserProfileCreate
-from ..auth import authenticate_user, create_access_token, get_password_hash, get_current_active_user
+from ..auth import authenticate_user, create_access_token, get_password_hash_async, get_current_active_user, get_user_by_email
+from ..token_cache import UserPrincipal
 from ..config import settings
 import json
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 
 @router.post("/register", response_model=UserResponse)
-def register_user(user: UserCreate, db: Session = Depends(get_db)):
+async def register_user(user: UserCreate, db: Database = Depends(get_database)):
     # Check if user already exists
-    db_user = db.query(User).filter(User.email == user.email).first()
+    db_user = await db.run(get_user_by_email, user.email)
     if db_user:
         raise HTTPException(
             status_code=400,
             detail="Email already registered"
         )
-    
-    # Create new user
-    hashed_password = get_password_hash(user.password)
-    db_user = User(
-        email=user.email,
-        name=user.name,
-        hashed_password=hashed_password
-    )
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-    
-    # Create default user profile
-    default_permissions = ["read", "write"]
-    db_profile = UserProfile(
-        user_id=db_user.id,
-        role="presales",
-        department="Sales",
-        permissions=json.dumps(default_permissions)
-    )
-    db.add(db_profile)
-    db.commit()
-    
-    return db_user
+
+    hashed_password = await get_password_hash_async(user.password)
+
+    def create(session: Session):
+        # Create new user
+        db_user = User(
+            email=user.email,
+            name=user.name,
+            hashed_password=hashed_password
+        )
+        session.add(db_user)
+        session.commit()
+        session.refresh(db_user)
+
+        # Create default user profile
+        default_permissions = ["read", "write"]
+        db_profile = UserProfile(
+            user_id=db_user.id,
+            role="presales",
+            department="Sales",
+            permissions=json.dumps(default_permissions)
+        )
+        session.add(db_profile)
+        session.commit()
+
+        return UserResponse.model_validate(db_user)
+
+    return await db.run(create)
 
 @router.post("/login", response_model=Token)
-def login_user(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = authenticate_user(db, form_data.username, form_data.password)
+async def login_user(form_data: OAuth2PasswordRequestForm = Depends(), db: Database = Depends(get_database)):
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -61,5 +66,5 @@ def login_user(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = D
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.get("/me", response_model=UserResponse)
-def read_users_me(current_user: User = Depends(get_current_active_user)):
+def read_users_me(current_user: UserPrincipal = Depends(get_current_active_user)):
     return current_user
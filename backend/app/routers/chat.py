@@ -1,25 +1,26 @@
-from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect, HTTPException
+import asyncio
+import json
+from functools import partial
+from fastapi import APIRouter, Depends, Query, WebSocket, WebSocketDisconnect, HTTPException, status
 from sqlalchemy.orm import Session
-from backend.database import SessionLocal
-from backend.models import ProposalChat, Proposal, User
-from pydantic import BaseModel
-from typing import List, Dict
+from ..chat_writer import chat_writer
+from ..config import settings
+from ..database import Database, get_database, session_scope
+from ..metrics import watch_chat
+from ..models import ProposalChat, Proposal, User
+from ..pubsub import PubSub, create_pubsub
+from pydantic import BaseModel, ValidationError
+from typing import Callable, Dict, List, Optional
 from datetime import datetime
 
 router = APIRouter()
 
-# Dependency to get DB session
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 # Pydantic schemas
 class ChatMessage(BaseModel):
     sender_id: int
     message: str
+    # Echoed back in the WebSocket ack so clients can match it up
+    client_id: Optional[str] = None
 
 class ChatResponse(BaseModel):
     id: int
@@ -27,48 +28,217 @@ class ChatResponse(BaseModel):
     message: str
     timestamp: datetime
 
-# In-memory WebSocket room manager
+# JSON-encoded message text limit; leaves room for the envelope within
+# the 8000 byte NOTIFY payload
+MAX_CHAT_MESSAGE_LENGTH = 6000
+
+CHAT_HISTORY_PAGE_SIZE = 50
+CHAT_HISTORY_MAX_PAGE_SIZE = 500
+
+# Close code for sockets that fall too far behind (RFC 6455 "Try Again Later")
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+class ChatConnection:
+    """One socket's outbound side: a bounded queue drained by a writer task.
+
+    ``offer`` never waits, so delivering to a room costs one ``put_nowait``
+    per member however slow any of them is.
+    """
+
+    def __init__(self, websocket: WebSocket, max_queue: int):
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(max_queue)
+        self.writer: Optional[asyncio.Task] = None
+
+    def start(self, on_error: Callable[["ChatConnection"], None]):
+        self.writer = asyncio.get_running_loop().create_task(self._write(on_error))
+
+    def offer(self, payload: str) -> bool:
+        try:
+            self.queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    async def _write(self, on_error):
+        try:
+            while True:
+                payload = await self.queue.get()
+                await self.websocket.send_text(payload)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            on_error(self)
+
+    async def close(self, code: Optional[int] = None):
+        if self.writer is not None and self.writer is not asyncio.current_task():
+            self.writer.cancel()
+        if code is not None:
+            # Best effort: a stalled peer may never complete the handshake
+            try:
+                await asyncio.wait_for(self.websocket.close(code), timeout=1.0)
+            except Exception:
+                pass
+
+# WebSocket rooms. Sockets are local to this worker; messages travel
+# through the pub/sub backend so every worker's members receive them.
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[int, List[WebSocket]] = {}
+    def __init__(self, pubsub: PubSub, max_queue: int = settings.chat_send_queue_size):
+        self.pubsub = pubsub
+        self.max_queue = max_queue
+        self.active_connections: Dict[int, Dict[WebSocket, ChatConnection]] = {}
+        self.slow_consumers_dropped = 0
+        self.send_errors = 0
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def channel(proposal_id: int) -> str:
+        return f"proposal_chat_{proposal_id}"
 
     async def connect(self, proposal_id: int, websocket: WebSocket):
         await websocket.accept()
-        self.active_connections.setdefault(proposal_id, []).append(websocket)
+        connection = ChatConnection(websocket, self.max_queue)
+        connection.start(partial(self._on_send_error, proposal_id))
+        async with self._lock:
+            room = self.active_connections.setdefault(proposal_id, {})
+            room[websocket] = connection
+            # Only listen for rooms this worker has sockets in
+            if len(room) == 1:
+                await self.pubsub.subscribe(self.channel(proposal_id), partial(self.deliver, proposal_id))
 
-    def disconnect(self, proposal_id: int, websocket: WebSocket):
-        self.active_connections[proposal_id].remove(websocket)
+    async def disconnect(self, proposal_id: int, websocket: WebSocket, code: Optional[int] = None):
+        async with self._lock:
+            room = self.active_connections.get(proposal_id, {})
+            connection = room.pop(websocket, None)
+            if not room and proposal_id in self.active_connections:
+                del self.active_connections[proposal_id]
+                await self.pubsub.unsubscribe(self.channel(proposal_id))
+        if connection is not None:
+            await connection.close(code)
 
     async def broadcast(self, proposal_id: int, message: Dict):
-        for connection in self.active_connections.get(proposal_id, []):
-            await connection.send_json(message)
+        await self.pubsub.publish(self.channel(proposal_id), json.dumps(message))
+
+    async def deliver(self, proposal_id: int, payload: str):
+        # ``payload`` is already-encoded JSON; every member gets the same str
+        for websocket, connection in list(self.active_connections.get(proposal_id, {}).items()):
+            if not connection.offer(payload):
+                self.slow_consumers_dropped += 1
+                self._evict(proposal_id, websocket, SLOW_CONSUMER_CLOSE_CODE)
+
+    def send_personal(self, proposal_id: int, websocket: WebSocket, message: Dict):
+        # Through the socket's queue so it stays ordered with room traffic
+        connection = self.active_connections.get(proposal_id, {}).get(websocket)
+        if connection is not None:
+            connection.offer(json.dumps(message))
+
+    def _on_send_error(self, proposal_id: int, connection: ChatConnection):
+        self.send_errors += 1
+        self._evict(proposal_id, connection.websocket, None)
+
+    def _evict(self, proposal_id: int, websocket: WebSocket, code: Optional[int]):
+        room = self.active_connections.get(proposal_id)
+        if room is not None and websocket in room:
+            asyncio.get_running_loop().create_task(self.disconnect(proposal_id, websocket, code))
+
+manager = ConnectionManager(create_pubsub())
+watch_chat(manager)
+
+async def proposal_exists(proposal_id: int) -> bool:
+    def query(session: Session):
+        return session.query(Proposal.id).filter(Proposal.id == proposal_id).first() is not None
 
-manager = ConnectionManager()
+    async with session_scope() as db:
+        return await db.run(query)
+
+def chat_history(
+    session: Session,
+    proposal_id: int,
+    before: Optional[int] = None,
+    after: Optional[int] = None,
+    limit: int = CHAT_HISTORY_PAGE_SIZE,
+) -> List[ChatResponse]:
+    """Up to ``limit`` messages, oldest first, from the (proposal_id, id) index.
+
+    With ``after`` (a reconnecting client's last-seen id) this is the oldest
+    messages newer than it; otherwise it is the newest messages, older than
+    ``before`` when given, for scrolling back.
+    """
+    query = session.query(ProposalChat).filter(ProposalChat.proposal_id == proposal_id)
+    if before is not None:
+        query = query.filter(ProposalChat.id < before)
+    if after is not None:
+        rows = query.filter(ProposalChat.id > after).order_by(ProposalChat.id.asc()).limit(limit).all()
+    else:
+        rows = query.order_by(ProposalChat.id.desc()).limit(limit).all()
+        rows.reverse()
+    return [ChatResponse.model_validate(row, from_attributes=True) for row in rows]
 
 # REST endpoints
 @router.get("/api/proposals/{proposal_id}/chat", response_model=List[ChatResponse])
-def get_chat(proposal_id: int, db: Session = Depends(get_db)):
-    return db.query(ProposalChat).filter(ProposalChat.proposal_id == proposal_id).order_by(ProposalChat.timestamp).all()
+async def get_chat(
+    proposal_id: int,
+    before: Optional[int] = None,
+    after: Optional[int] = None,
+    limit: int = Query(CHAT_HISTORY_PAGE_SIZE, ge=1, le=CHAT_HISTORY_MAX_PAGE_SIZE),
+    db: Database = Depends(get_database)
+):
+    return await db.run(chat_history, proposal_id, before, after, limit)
 
 @router.post("/api/proposals/{proposal_id}/chat", response_model=ChatResponse)
-def post_message(proposal_id: int, msg: ChatMessage, db: Session = Depends(get_db)):
-    new_msg = ProposalChat(
-        proposal_id=proposal_id,
-        sender_id=msg.sender_id,
-        message=msg.message
-    )
-    db.add(new_msg)
-    db.commit()
-    db.refresh(new_msg)
+async def post_message(proposal_id: int, msg: ChatMessage):
+    if len(json.dumps(msg.message)) > MAX_CHAT_MESSAGE_LENGTH:
+        raise HTTPException(status_code=413, detail="Message too large")
+    if not await proposal_exists(proposal_id):
+        raise HTTPException(status_code=404, detail="Proposal not found")
+
+    message_id, timestamp = await chat_writer.submit(proposal_id, msg.sender_id, msg.message)
+    new_msg = ChatResponse(id=message_id, sender_id=msg.sender_id, message=msg.message, timestamp=timestamp)
+    await manager.broadcast(proposal_id, new_msg.model_dump(mode="json"))
     return new_msg
 
 # WebSocket endpoint
 @router.websocket("/ws/proposals/{proposal_id}/chat")
-async def websocket_chat(websocket: WebSocket, proposal_id: int):
-    await manager.connect(proposal_id, websocket)
+async def websocket_chat(websocket: WebSocket, proposal_id: int, after: Optional[int] = None):
+    if not await proposal_exists(proposal_id):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
     try:
+        await manager.connect(proposal_id, websocket)
+        if after is not None:
+            # Joined the room first, so nothing falls between the catch-up
+            # page and live traffic; clients de-duplicate by id
+            async with session_scope() as db:
+                history = await db.run(chat_history, proposal_id, None, after, CHAT_HISTORY_MAX_PAGE_SIZE)
+            manager.send_personal(proposal_id, websocket, {
+                "history": [m.model_dump(mode="json") for m in history],
+                "more": len(history) == CHAT_HISTORY_MAX_PAGE_SIZE,
+            })
         while True:
             data = await websocket.receive_json()
-            await manager.broadcast(proposal_id, data)
+            try:
+                msg = ChatMessage.model_validate(data)
+            except ValidationError:
+                manager.send_personal(proposal_id, websocket, {"error": "Invalid message"})
+                continue
+            if len(json.dumps(msg.message)) > MAX_CHAT_MESSAGE_LENGTH:
+                manager.send_personal(proposal_id, websocket, {"error": "Message too large"})
+                continue
+
+            # Stored (in a shared batch) before anyone sees it, so every
+            # broadcast message carries its id
+            try:
+                message_id, timestamp = await chat_writer.submit(proposal_id, msg.sender_id, msg.message)
+            except Exception:
+                manager.send_personal(
+                    proposal_id, websocket, {"error": "Message could not be saved", "client_id": msg.client_id}
+                )
+                continue
+
+            manager.send_personal(proposal_id, websocket, {"ack": message_id, "client_id": msg.client_id})
+            new_msg = ChatResponse(id=message_id, sender_id=msg.sender_id, message=msg.message, timestamp=timestamp)
+            await manager.broadcast(proposal_id, new_msg.model_dump(mode="json"))
     except WebSocketDisconnect:
-        manager.disconnect(proposal_id, websocket)
+        pass
+    finally:
+        await manager.disconnect(proposal_id, websocket)
@@ -0,0 +1,21 @@
+from typing import Any, Dict, List
+from fastapi import APIRouter, HTTPException
+from ..profiling import history
+
+# Mounted only with SQL_PROFILER=true; see app/profiling.py
+router = APIRouter(prefix="/debug", tags=["debug"])
+
+@router.get("/requests")
+def list_profiled_requests(limit: int = 50) -> List[Dict[str, Any]]:
+    # Newest first, without the per-statement detail
+    return [
+        {key: value for key, value in report.items() if key != "statements"}
+        for report in history.recent()[:limit]
+    ]
+
+@router.get("/requests/{request_id}")
+def get_profiled_request(request_id: str) -> Dict[str, Any]:
+    report = history.get(request_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="No profile for this request id (it may have been evicted)")
+    return report
@@ -1,118 +1,217 @@
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_
-from ..database import get_db
-from ..models import KnowledgeBase, User, UserProfile
-from ..schemas import KnowledgeBaseCreate, KnowledgeBaseResponse
-from ..auth import get_current_active_user
-import json
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from pydantic import TypeAdapter
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import and_, func, or_
+from ..cache import cache_key, response_cache, user_version, users_digest
+from ..database import Database, get_database
+from ..replicas import get_read_database
+from ..models import KnowledgeBase, User
+from ..schemas import KnowledgeBaseCreate, KnowledgeBaseResponse, KnowledgeSearchResult
+from ..auth import get_current_active_user, require
+from ..token_cache import UserPrincipal
+from ..counters import usage_counter
+from ..etags import if_none_match, set_etag
+from ..pagination import keyset_paginate, next_cursor, not_modified_page, page_etag, set_next_cursor
+from ..responses import ModelJSONResponse
+from ..search import index_knowledge_item, search_backend
+from ..search import bm25 as bm25_search
+from ..search import postgres as postgres_search
+from ..tags import filter_tags
 
 router = APIRouter(prefix="/knowledge", tags=["knowledge"])
 
+# KnowledgeBaseResponse nests the creator; join it into the main SELECT
+knowledge_response_options = (joinedload(KnowledgeBase.creator),)
+knowledge_list_adapter = TypeAdapter(List[KnowledgeBaseResponse])
+
 @router.post("/", response_model=KnowledgeBaseResponse)
-def create_knowledge_item(
+async def create_knowledge_item(
     knowledge: KnowledgeBaseCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    db: Database = Depends(get_database),
+    current_user: UserPrincipal = Depends(get_current_active_user)
 ):
-    db_knowledge = KnowledgeBase(
-        title=knowledge.title,
-        content=knowledge.content,
-        category=knowledge.category,
-        tags=json.dumps(knowledge.tags),
-        industry=knowledge.industry,
-        created_by=current_user.id,
-        is_approved=False  # Requires approval
-    )
-    db.add(db_knowledge)
-    db.commit()
-    db.refresh(db_knowledge)
-    return db_knowledge
+    def create(session: Session):
+        db_knowledge = KnowledgeBase(
+            title=knowledge.title,
+            content=knowledge.content,
+            category=knowledge.category,
+            tags=knowledge.tags,
+            industry=knowledge.industry,
+            created_by=current_user.id,
+            is_approved=False  # Requires approval
+        )
+        session.add(db_knowledge)
+        session.commit()
+        session.refresh(db_knowledge)
+        index_knowledge_item(db_knowledge)
+        return KnowledgeBaseResponse.model_validate(db_knowledge)
+
+    return await db.run(create)
 
 @router.get("/", response_model=List[KnowledgeBaseResponse])
-def list_knowledge_items(
+async def list_knowledge_items(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     category: Optional[str] = None,
     industry: Optional[str] = None,
     approved_only: bool = True,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    tag: Optional[str] = None,
+    tags_any: Optional[List[str]] = Query(None),
+    tags_all: Optional[List[str]] = Query(None),
+    db: Database = Depends(get_read_database),
+    current_user: UserPrincipal = Depends(get_current_active_user)
 ):
-    query = db.query(KnowledgeBase)
-    
-    if approved_only:
-        query = query.filter(KnowledgeBase.is_approved == True)
-    if category:
-        query = query.filter(KnowledgeBase.category == category)
-    if industry:
-        query = query.filter(KnowledgeBase.industry == industry)
-    
-    knowledge_items = query.offset(skip).limit(limit).all()
-    return knowledge_items
-
-@router.get("/search", response_model=List[KnowledgeBaseResponse])
-def search_knowledge(
+    def filtered(session: Session):
+        query = session.query(KnowledgeBase)
+
+        if approved_only:
+            query = query.filter(KnowledgeBase.is_approved == True)
+        if category:
+            query = query.filter(KnowledgeBase.category == category)
+        if industry:
+            query = query.filter(KnowledgeBase.industry == industry)
+        return filter_tags(query, KnowledgeBase, tag, tags_any, tags_all)
+
+    # usage_count is written by bulk UPDATEs that do not bump version
+    def probe(session: Session):
+        page = keyset_paginate(
+            filtered(session).with_entities(
+                KnowledgeBase.id,
+                func.coalesce(KnowledgeBase.updated_at, KnowledgeBase.created_at).label("changed"),
+                KnowledgeBase.version,
+                func.coalesce(KnowledgeBase.usage_count, 0).label("usage_count"),
+                user_version(KnowledgeBase.created_by).label("creator_version"),
+            ),
+            KnowledgeBase.id, cursor, limit,
+        ).offset(skip).subquery()
+        return page_etag(
+            session, page, limit,
+            func.max(page.c.changed), func.sum(page.c.version), func.sum(page.c.usage_count),
+            func.sum(page.c.creator_version),
+        )
+
+    def query(session: Session):
+        query = filtered(session).options(*knowledge_response_options)
+        knowledge_items = keyset_paginate(query, KnowledgeBase.id, cursor, limit).offset(skip).all()
+        response = ModelJSONResponse(
+            [KnowledgeBaseResponse.model_validate(k) for k in knowledge_items], knowledge_list_adapter
+        )
+        return response, next_cursor(knowledge_items, limit)
+
+    etag, cursor_out = await db.run(probe)
+    if if_none_match(request, etag):
+        return not_modified_page(etag, cursor_out)
+    response, cursor_out = await db.run(query)
+    set_next_cursor(response, cursor_out)
+    set_etag(response, etag)
+    return response
+
+@router.get("/search", response_model=List[KnowledgeSearchResult])
+async def search_knowledge(
     q: str,
     category: Optional[str] = None,
     industry: Optional[str] = None,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    limit: int = Query(20, ge=1, le=100),
+    db: Database = Depends(get_read_database),
+    current_user: UserPrincipal = Depends(get_current_active_user)
 ):
-    query = db.query(KnowledgeBase).filter(
-        and_(
-            KnowledgeBase.is_approved == True,
-            or_(
-                KnowledgeBase.title.ilike(f"%{q}%"),
-                KnowledgeBase.content.ilike(f"%{q}%")
+    def query(session: Session):
+        backend = search_backend(session)
+        if backend in ("postgres", "bm25"):
+            engine = postgres_search if backend == "postgres" else bm25_search
+            results = engine.search(
+                session, q, category, industry, limit, options=knowledge_response_options
             )
+            return [
+                KnowledgeSearchResult.model_validate(item).model_copy(update={"rank": rank, "snippet": snippet})
+                for item, rank, snippet in results
+            ]
+
+        query = session.query(KnowledgeBase).options(*knowledge_response_options).filter(
+            and_(
+                KnowledgeBase.is_approved == True,
+                or_(
+                    KnowledgeBase.title.ilike(f"%{q}%"),
+                    KnowledgeBase.content.ilike(f"%{q}%")
+                )
+            )
+        )
+
+        if category:
+            query = query.filter(KnowledgeBase.category == category)
+        if industry:
+            query = query.filter(KnowledgeBase.industry == industry)
+
+        results = query.limit(limit).all()
+        return [KnowledgeSearchResult.model_validate(k) for k in results]
+
+    return await db.run(query)
+
+@router.get("/{knowledge_id}", response_model=KnowledgeBaseResponse)
+async def get_knowledge_item(
+    knowledge_id: int,
+    request: Request,
+    db: Database = Depends(get_read_database),
+    current_user: UserPrincipal = Depends(get_current_active_user)
+):
+    # The response embeds the creator, so their version is part of the key
+    def probe(session: Session):
+        row = session.query(KnowledgeBase.version, KnowledgeBase.usage_count, KnowledgeBase.created_by).filter(
+            KnowledgeBase.id == knowledge_id
+        ).first()
+        if not row:
+            raise HTTPException(status_code=404, detail="Knowledge item not found")
+        creator = session.query(User.id, User.version).filter(User.id == row.created_by)
+        return cache_key("knowledge", knowledge_id, row.version, row.usage_count, users_digest(creator))
+
+    def render(session: Session):
+        knowledge_item = session.query(KnowledgeBase).options(*knowledge_response_options).filter(
+            KnowledgeBase.id == knowledge_id
+        ).first()
+        if not knowledge_item:
+            raise HTTPException(status_code=404, detail="Knowledge item not found")
+        key = cache_key(
+            "knowledge", knowledge_id, knowledge_item.version, knowledge_item.usage_count,
+            users_digest([knowledge_item.creator]),
         )
-    )
-    
-    if category:
-        query = query.filter(KnowledgeBase.category == category)
-    if industry:
-        query = query.filter(KnowledgeBase.industry == industry)
-    
-    results = query.limit(20).all()
-    return results
+        return key, KnowledgeBaseResponse.model_validate(knowledge_item).model_dump_json().encode()
+
+    return await response_cache.respond(request, "knowledge", lambda: db.run(probe), lambda: db.run(render))
 
 @router.put("/{knowledge_id}/approve")
-def approve_knowledge_item(
+async def approve_knowledge_item(
     knowledge_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    db: Database = Depends(get_database),
+    current_user: UserPrincipal = Depends(require("approve"))
 ):
-    # Check if user has approval permissions
-    user_profile = db.query(UserProfile).filter(UserProfile.user_id == current_user.id).first()
-    if not user_profile:
-        raise HTTPException(status_code=403, detail="User profile not found")
-    
-    permissions = json.loads(user_profile.permissions) if user_profile.permissions else []
-    if "approve" not in permissions:
-        raise HTTPException(status_code=403, detail="Insufficient permissions")
-    
-    knowledge_item = db.query(KnowledgeBase).filter(KnowledgeBase.id == knowledge_id).first()
-    if not knowledge_item:
-        raise HTTPException(status_code=404, detail="Knowledge item not found")
-    
-    knowledge_item.is_approved = True
-    db.commit()
-    
+    def approve(session: Session):
+        knowledge_item = session.query(KnowledgeBase).filter(KnowledgeBase.id == knowledge_id).first()
+        if not knowledge_item:
+            raise HTTPException(status_code=404, detail="Knowledge item not found")
+
+        knowledge_item.is_approved = True
+        knowledge_item.version = func.coalesce(KnowledgeBase.version, 1) + 1
+        session.commit()
+        index_knowledge_item(knowledge_item)
+
+    await db.run(approve)
     return {"message": "Knowledge item approved"}
 
 @router.put("/{knowledge_id}/increment-usage")
-def increment_usage_count(
+async def increment_usage_count(
     knowledge_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    db: Database = Depends(get_database),
+    current_user: UserPrincipal = Depends(get_current_active_user)
 ):
-    knowledge_item = db.query(KnowledgeBase).filter(KnowledgeBase.id == knowledge_id).first()
-    if not knowledge_item:
+    def exists(session: Session):
+        return session.query(KnowledgeBase.id).filter(KnowledgeBase.id == knowledge_id).first() is not None
+
+    if not await db.run(exists):
         raise HTTPException(status_code=404, detail="Knowledge item not found")
-    
-    knowledge_item.usage_count += 1
-    db.commit()
-    
+
+    # Coalesced in memory and written by the periodic flush
+    usage_counter.record(knowledge_id)
     return {"message": "Usage count incremented"}
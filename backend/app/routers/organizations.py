@@ -1,45 +1,99 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from ..database import get_db
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Request
+from pydantic import TypeAdapter
+from sqlalchemy import func
+from sqlalchemy.orm import Session, joinedload
+from ..cache import cache_key, response_cache, user_version, users_digest
+from ..database import Database, get_database
+from ..replicas import get_read_database
 from ..models import Organization, User
 from ..schemas import OrganizationCreate, OrganizationResponse
 from ..auth import get_current_active_user
+from ..token_cache import UserPrincipal
+from ..etags import if_none_match, set_etag
+from ..pagination import keyset_paginate, next_cursor, not_modified_page, page_etag, set_next_cursor
+from ..responses import ModelJSONResponse
 
 router = APIRouter(prefix="/organizations", tags=["organizations"])
 
+# OrganizationResponse nests the creator; join it into the main SELECT
+organization_response_options = (joinedload(Organization.creator),)
+organization_list_adapter = TypeAdapter(List[OrganizationResponse])
+
 @router.post("/", response_model=OrganizationResponse)
-def create_organization(
+async def create_organization(
     organization: OrganizationCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    db: Database = Depends(get_database),
+    current_user: UserPrincipal = Depends(get_current_active_user)
 ):
-    db_organization = Organization(
-        **organization.dict(),
-        created_by=current_user.id
-    )
-    db.add(db_organization)
-    db.commit()
-    db.refresh(db_organization)
-    return db_organization
+    def create(session: Session):
+        db_organization = Organization(
+            **organization.dict(),
+            created_by=current_user.id
+        )
+        session.add(db_organization)
+        session.commit()
+        session.refresh(db_organization)
+        return OrganizationResponse.model_validate(db_organization)
+
+    return await db.run(create)
 
 @router.get("/", response_model=List[OrganizationResponse])
-def list_organizations(
+async def list_organizations(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    cursor: Optional[str] = None,
+    db: Database = Depends(get_read_database),
+    current_user: UserPrincipal = Depends(get_current_active_user)
 ):
-    organizations = db.query(Organization).offset(skip).limit(limit).all()
-    return organizations
+    def probe(session: Session):
+        page = keyset_paginate(
+            session.query(
+                Organization.id, Organization.version, user_version(Organization.created_by).label("creator_version")
+            ),
+            Organization.id, cursor, limit,
+        ).offset(skip).subquery()
+        return page_etag(session, page, limit, func.sum(page.c.version), func.sum(page.c.creator_version))
+
+    def query(session: Session):
+        query = session.query(Organization).options(*organization_response_options)
+        organizations = keyset_paginate(query, Organization.id, cursor, limit).offset(skip).all()
+        response = ModelJSONResponse(
+            [OrganizationResponse.model_validate(o) for o in organizations], organization_list_adapter
+        )
+        return response, next_cursor(organizations, limit)
+
+    etag, cursor_out = await db.run(probe)
+    if if_none_match(request, etag):
+        return not_modified_page(etag, cursor_out)
+    response, cursor_out = await db.run(query)
+    set_next_cursor(response, cursor_out)
+    set_etag(response, etag)
+    return response
 
 @router.get("/{organization_id}", response_model=OrganizationResponse)
-def get_organization(
+async def get_organization(
     organization_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    request: Request,
+    db: Database = Depends(get_read_database),
+    current_user: UserPrincipal = Depends(get_current_active_user)
 ):
-    organization = db.query(Organization).filter(Organization.id == organization_id).first()
-    if not organization:
-        raise HTTPException(status_code=404, detail="Organization not found")
-    return organization
+    # The response embeds the creator, so their version is part of the key
+    def probe(session: Session):
+        row = session.query(Organization.version, Organization.created_by).filter(
+            Organization.id == organization_id
+        ).first()
+        if row is None:
+            raise HTTPException(status_code=404, detail="Organization not found")
+        creator = session.query(User.id, User.version).filter(User.id == row.created_by)
+        return cache_key("organization", organization_id, row.version, users_digest(creator))
+
+    def render(session: Session):
+        organization = session.query(Organization).options(*organization_response_options).filter(Organization.id == organization_id).first()
+        if not organization:
+            raise HTTPException(status_code=404, detail="Organization not found")
+        key = cache_key("organization", organization_id, organization.version, users_digest([organization.creator]))
+        return key, OrganizationResponse.model_validate(organization).model_dump_json().encode()
+
+    return await response_cache.respond(request, "organization", lambda: db.run(probe), lambda: db.run(render))
@@ -0,0 +1,58 @@
+import asyncio
+from typing import Literal
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+from ..auth import require
+from ..token_cache import UserPrincipal
+from ..config import settings
+from ..sampler import StackSampler, route_codes
+
+router = APIRouter(prefix="/debug", tags=["debug"])
+
+# One profile per worker at a time
+_profiling = asyncio.Lock()
+
+@router.get("/profile")
+async def profile_worker(
+    request: Request,
+    seconds: float = Query(10.0, gt=0, le=settings.sampling_profiler_max_seconds),
+    interval_ms: float = Query(10.0, ge=1, le=1000),
+    format: Literal["collapsed", "json"] = "collapsed",
+    include_idle: bool = False,
+    current_user: UserPrincipal = Depends(require("admin"))
+):
+    """Sample this worker's stacks for ``seconds`` and return them per route.
+
+    ``collapsed`` output feeds flamegraph.pl, speedscope or inferno; each
+    stack's root frame is the route it was serving.
+    """
+    if _profiling.locked():
+        raise HTTPException(status_code=409, detail="A profile is already running on this worker")
+
+    async with _profiling:
+        sampler = StackSampler(
+            route_codes(request.app.routes),
+            interval_ms / 1000,
+            settings.sampling_profiler_max_overhead,
+            include_idle,
+        )
+        sampler.start(seconds)
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            await run_in_threadpool(sampler.stop)
+
+    overhead = sampler.sampling_seconds / sampler.elapsed if sampler.elapsed else 0.0
+    if format == "json":
+        return {
+            "samples": sampler.samples,
+            "seconds": sampler.elapsed,
+            "overhead": overhead,
+            "dropped_samples": sampler.dropped,
+            "routes": sampler.by_route(),
+        }
+    return PlainTextResponse(
+        sampler.collapsed(),
+        headers={"X-Profile-Samples": str(sampler.samples), "X-Profile-Overhead": f"{overhead:.4f}"},
+    )
@@ -1,204 +1,444 @@
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import or_
-from ..database import get_db
-from ..models import Proposal, ProposalSection, Activity, User, UserProfile
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from pydantic import TypeAdapter
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy import func, or_, select
+from datetime import datetime, timedelta, timezone
+from .. import stats
+from ..cache import cache_key, response_cache, user_version, users_digest, versions_digest
+from ..database import Database, get_database
+from ..replicas import get_read_database
+from ..models import (
+    Proposal, ProposalSection, ProposalStats, ProposalStatus, Activity, Organization, User, UserProfile,
+    proposal_assignments,
+)
 from ..schemas import (
     ProposalCreate, ProposalResponse, ProposalUpdate,
     ProposalSectionCreate, ProposalSectionResponse, ProposalSectionUpdate,
-    ActivityResponse
+    ActivityResponse, KnowledgeSuggestion,
+    ProposalStatsResponse, ProposalStatusStats, OrganizationPipelineStats, UpcomingDeadline
 )
 from ..auth import get_current_active_user
-import json
+from ..token_cache import UserPrincipal
+from ..etags import if_none_match, set_etag
+from ..pagination import keyset_paginate, next_cursor, not_modified_page, page_etag, set_next_cursor
+from ..responses import ModelJSONResponse
+from ..search import vectors
+from ..tags import filter_tags
+from .knowledge import knowledge_response_options
 
 router = APIRouter(prefix="/proposals", tags=["proposals"])
 
+# Relationships serialized by the response schemas. Many-to-one relations
+# are joined into the main SELECT and collections use one extra IN query,
+# so a page costs the same number of statements whatever its size.
+proposal_response_options = (
+    joinedload(Proposal.organization).joinedload(Organization.creator),
+    joinedload(Proposal.creator),
+    selectinload(Proposal.assigned_users),
+)
+section_response_options = (joinedload(ProposalSection.last_editor),)
+activity_response_options = (joinedload(Activity.user),)
+proposal_list_adapter = TypeAdapter(List[ProposalResponse])
+# Assigned users are embedded too; sum their versions into list ETags
+assigned_user_versions = select(func.coalesce(func.sum(User.version), 0)).join(
+    proposal_assignments, proposal_assignments.c.user_id == User.id
+).where(proposal_assignments.c.proposal_id == Proposal.id).scalar_subquery()
+section_list_adapter = TypeAdapter(List[ProposalSectionResponse])
+activity_list_adapter = TypeAdapter(List[ActivityResponse])
+
 @router.post("/", response_model=ProposalResponse)
-def create_proposal(
+async def create_proposal(
     proposal: ProposalCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    db: Database = Depends(get_database),
+    current_user: UserPrincipal = Depends(get_current_active_user)
 ):
-    # Create proposal
-    db_proposal = Proposal(
-        title=proposal.title,
-        description=proposal.description,
-        organization_id=proposal.organization_id,
-        priority=proposal.priority,
-        deadline=proposal.deadline,
-        estimated_value=proposal.estimated_value,
-        tags=json.dumps(proposal.tags),
-        created_by=current_user.id
-    )
-    
-    # Add assigned users
-    if proposal.assigned_to:
-        assigned_users = db.query(User).filter(User.id.in_(proposal.assigned_to)).all()
-        db_proposal.assigned_users = assigned_users
-    
-    db.add(db_proposal)
-    db.commit()
-    db.refresh(db_proposal)
-    
-    # Log activity
-    activity = Activity(
-        proposal_id=db_proposal.id,
-        user_id=current_user.id,
-        action="created",
-        details=f"Created proposal: {proposal.title}"
-    )
-    db.add(activity)
-    db.commit()
-    
-    return db_proposal
+    def create(session: Session):
+        # Create proposal
+        db_proposal = Proposal(
+            title=proposal.title,
+            description=proposal.description,
+            organization_id=proposal.organization_id,
+            priority=proposal.priority,
+            deadline=proposal.deadline,
+            estimated_value=proposal.estimated_value,
+            tags=proposal.tags,
+            created_by=current_user.id
+        )
+
+        # Add assigned users
+        if proposal.assigned_to:
+            assigned_users = session.query(User).filter(User.id.in_(proposal.assigned_to)).all()
+            db_proposal.assigned_users = assigned_users
+
+        session.add(db_proposal)
+        session.commit()
+        session.refresh(db_proposal)
+
+        # Log activity
+        activity = Activity(
+            proposal_id=db_proposal.id,
+            user_id=current_user.id,
+            action="created",
+            details=f"Created proposal: {proposal.title}"
+        )
+        session.add(activity)
+        session.commit()
+
+        return ProposalResponse.model_validate(db_proposal)
+
+    return await db.run(create)
 
 @router.get("/", response_model=List[ProposalResponse])
-def list_proposals(
+async def list_proposals(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     status: Optional[str] = None,
     organization_id: Optional[int] = None,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    tag: Optional[str] = None,
+    tags_any: Optional[List[str]] = Query(None),
+    tags_all: Optional[List[str]] = Query(None),
+    db: Database = Depends(get_read_database),
+    current_user: UserPrincipal = Depends(get_current_active_user)
+):
+    def filtered(session: Session):
+        query = session.query(Proposal)
+
+        if status:
+            query = query.filter(Proposal.status == status)
+        if organization_id:
+            query = query.filter(Proposal.organization_id == organization_id)
+        return filter_tags(query, Proposal, tag, tags_any, tags_all)
+
+    # Polling clients send If-None-Match; answer from one aggregate over the page
+    def probe(session: Session):
+        page = keyset_paginate(
+            filtered(session).outerjoin(Organization, Proposal.organization_id == Organization.id).with_entities(
+                Proposal.id,
+                func.coalesce(Proposal.updated_at, Proposal.created_at).label("changed"),
+                func.coalesce(Proposal.current_version, 1).label("version"),
+                Organization.version.label("organization_version"),
+                (
+                    func.coalesce(user_version(Proposal.created_by), 0)
+                    + func.coalesce(user_version(Organization.created_by), 0)
+                    + assigned_user_versions
+                ).label("user_versions"),
+            ),
+            Proposal.id, cursor, limit,
+        ).offset(skip).subquery()
+        return page_etag(
+            session, page, limit,
+            func.max(page.c.changed), func.sum(page.c.version), func.sum(page.c.organization_version),
+            func.sum(page.c.user_versions),
+        )
+
+    def query(session: Session):
+        # Newest first; pass X-Next-Cursor back as ?cursor= for the next page
+        query = filtered(session).options(*proposal_response_options)
+        proposals = keyset_paginate(query, Proposal.id, cursor, limit).offset(skip).all()
+        response = ModelJSONResponse([ProposalResponse.model_validate(p) for p in proposals], proposal_list_adapter)
+        return response, next_cursor(proposals, limit)
+
+    etag, cursor_out = await db.run(probe)
+    if if_none_match(request, etag):
+        return not_modified_page(etag, cursor_out)
+    response, cursor_out = await db.run(query)
+    set_next_cursor(response, cursor_out)
+    set_etag(response, etag)
+    return response
+
+@router.get("/stats", response_model=ProposalStatsResponse)
+async def get_proposal_stats(
+    organization_id: Optional[int] = None,
+    deadline_days: int = Query(7, ge=1, le=365),
+    organization_limit: int = Query(20, ge=0, le=200),
+    db: Database = Depends(get_database),
+    current_user: UserPrincipal = Depends(get_current_active_user)
 ):
-    query = db.query(Proposal)
-    
-    if status:
-        query = query.filter(Proposal.status == status)
-    if organization_id:
-        query = query.filter(Proposal.organization_id == organization_id)
-    
-    proposals = query.offset(skip).limit(limit).all()
-    return proposals
+    def query(session: Session):
+        # Rollup rows only: cost follows statuses x organizations shown,
+        # not the number of proposals
+        scope = stats.ALL_ORGANIZATIONS if organization_id is None else organization_id
+        by_status = [
+            ProposalStatusStats(status=row.status, count=row.proposal_count, total_value=row.total_value)
+            for row in session.query(ProposalStats).filter(
+                ProposalStats.organization_id == scope, ProposalStats.proposal_count > 0
+            ).order_by(ProposalStats.status)
+        ]
+
+        top = session.query(ProposalStats.organization_id).filter(
+            ProposalStats.organization_id != stats.ALL_ORGANIZATIONS,
+            ProposalStats.proposal_count > 0
+        )
+        if organization_id is not None:
+            top = top.filter(ProposalStats.organization_id == organization_id)
+        top = top.group_by(ProposalStats.organization_id).order_by(
+            func.sum(ProposalStats.total_value).desc(), ProposalStats.organization_id
+        ).limit(organization_limit).subquery()
+
+        organizations = {}
+        rows = session.query(ProposalStats, Organization.name).join(
+            Organization, Organization.id == ProposalStats.organization_id
+        ).filter(
+            ProposalStats.organization_id.in_(select(top.c.organization_id)),
+            ProposalStats.proposal_count > 0
+        ).order_by(ProposalStats.organization_id, ProposalStats.status)
+        for row, name in rows:
+            pipeline = organizations.setdefault(row.organization_id, OrganizationPipelineStats(
+                organization_id=row.organization_id, organization_name=name,
+                count=0, total_value=0.0, open_value=0.0, by_status=[]
+            ))
+            pipeline.by_status.append(
+                ProposalStatusStats(status=row.status, count=row.proposal_count, total_value=row.total_value)
+            )
+            pipeline.count += row.proposal_count
+            pipeline.total_value += row.total_value
+            if row.status not in stats.CLOSED_STATUSES:
+                pipeline.open_value += row.total_value
+
+        # Top-k on the deadline index rather than a rollup
+        upcoming = session.query(Proposal).filter(
+            Proposal.deadline <= datetime.now(timezone.utc) + timedelta(days=deadline_days),
+            Proposal.status.notin_(stats.CLOSED_STATUSES)
+        )
+        if organization_id is not None:
+            upcoming = upcoming.filter(Proposal.organization_id == organization_id)
+        upcoming = upcoming.order_by(Proposal.deadline).limit(10).all()
+
+        return ProposalStatsResponse(
+            total=sum(s.count for s in by_status),
+            total_value=sum(s.total_value for s in by_status),
+            won_value=sum(s.total_value for s in by_status if s.status == ProposalStatus.WON),
+            open_value=sum(s.total_value for s in by_status if s.status not in stats.CLOSED_STATUSES),
+            by_status=by_status,
+            organizations=sorted(organizations.values(), key=lambda o: (-o.total_value, o.organization_id)),
+            upcoming_deadlines=[UpcomingDeadline.model_validate(p) for p in upcoming],
+        )
+
+    return await db.run(query)
 
 @router.get("/{proposal_id}", response_model=ProposalResponse)
-def get_proposal(
+async def get_proposal(
     proposal_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    request: Request,
+    db: Database = Depends(get_read_database),
+    current_user: UserPrincipal = Depends(get_current_active_user)
 ):
-    proposal = db.query(Proposal).filter(Proposal.id == proposal_id).first()
-    if not proposal:
-        raise HTTPException(status_code=404, detail="Proposal not found")
-    return proposal
+    # The response also embeds the organization and users (creators and
+    # assignees), so their versions are part of the key
+    def probe(session: Session):
+        row = session.query(
+            Proposal.current_version, Organization.version, Proposal.created_by, Organization.created_by
+        ).outerjoin(Organization, Proposal.organization_id == Organization.id).filter(Proposal.id == proposal_id).first()
+        if not row:
+            raise HTTPException(status_code=404, detail="Proposal not found")
+        current_version, organization_version, *creators = row
+        assigned = select(proposal_assignments.c.user_id).where(proposal_assignments.c.proposal_id == proposal_id)
+        users = session.query(User.id, User.version).filter(
+            or_(User.id.in_([c for c in creators if c is not None]), User.id.in_(assigned))
+        )
+        return cache_key("proposal", proposal_id, current_version, organization_version, users_digest(users))
+
+    def render(session: Session):
+        proposal = session.query(Proposal).options(*proposal_response_options).filter(
+            Proposal.id == proposal_id
+        ).first()
+        if not proposal:
+            raise HTTPException(status_code=404, detail="Proposal not found")
+        organization = proposal.organization
+        users = [proposal.creator, organization.creator if organization else None, *proposal.assigned_users]
+        key = cache_key(
+            "proposal", proposal_id, proposal.current_version, organization.version if organization else None,
+            users_digest(users),
+        )
+        return key, ProposalResponse.model_validate(proposal).model_dump_json().encode()
+
+    return await response_cache.respond(request, "proposal", lambda: db.run(probe), lambda: db.run(render))
 
 @router.put("/{proposal_id}", response_model=ProposalResponse)
-def update_proposal(
+async def update_proposal(
     proposal_id: int,
     proposal_update: ProposalUpdate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    db: Database = Depends(get_database),
+    current_user: UserPrincipal = Depends(get_current_active_user)
 ):
-    db_proposal = db.query(Proposal).filter(Proposal.id == proposal_id).first()
-    if not db_proposal:
-        raise HTTPException(status_code=404, detail="Proposal not found")
-    
-    update_data = proposal_update.dict(exclude_unset=True)
-    if 'tags' in update_data:
-        update_data['tags'] = json.dumps(update_data['tags'])
-    
-    for field, value in update_data.items():
-        setattr(db_proposal, field, value)
-    
-    db.commit()
-    db.refresh(db_proposal)
-    
-    # Log activity if status changed
-    if proposal_update.status:
-        activity = Activity(
-            proposal_id=proposal_id,
-            user_id=current_user.id,
-            action="status_updated",
-            details=f"Status changed to: {proposal_update.status}"
-        )
-        db.add(activity)
-        db.commit()
-    
-    return db_proposal
+    def update(session: Session):
+        db_proposal = session.query(Proposal).filter(Proposal.id == proposal_id).first()
+        if not db_proposal:
+            raise HTTPException(status_code=404, detail="Proposal not found")
+
+        update_data = proposal_update.dict(exclude_unset=True)
+
+        for field, value in update_data.items():
+            setattr(db_proposal, field, value)
+        # In SQL, so concurrent edits cannot both claim the same version
+        db_proposal.current_version = func.coalesce(Proposal.current_version, 1) + 1
+
+        session.commit()
+        session.refresh(db_proposal)
+
+        # Log activity if status changed
+        if proposal_update.status:
+            activity = Activity(
+                proposal_id=proposal_id,
+                user_id=current_user.id,
+                action="status_updated",
+                details=f"Status changed to: {proposal_update.status}"
+            )
+            session.add(activity)
+            session.commit()
+
+        return ProposalResponse.model_validate(db_proposal)
+
+    return await db.run(update)
 
 # Proposal Sections
 @router.post("/{proposal_id}/sections", response_model=ProposalSectionResponse)
-def create_proposal_section(
+async def create_proposal_section(
     proposal_id: int,
     section: ProposalSectionCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    db: Database = Depends(get_database),
+    current_user: UserPrincipal = Depends(get_current_active_user)
 ):
-    # Verify proposal exists
-    proposal = db.query(Proposal).filter(Proposal.id == proposal_id).first()
-    if not proposal:
-        raise HTTPException(status_code=404, detail="Proposal not found")
-    
-    db_section = ProposalSection(
-        proposal_id=proposal_id,
-        title=section.title,
-        content=section.content,
-        section_type=section.section_type,
-        order=section.order,
-        last_edited_by=current_user.id
-    )
-    db.add(db_section)
-    db.commit()
-    db.refresh(db_section)
-    
-    # Log activity
-    activity = Activity(
-        proposal_id=proposal_id,
-        user_id=current_user.id,
-        action="section_created",
-        details=f"Created section: {section.title}"
-    )
-    db.add(activity)
-    db.commit()
-    
-    return db_section
+    def create(session: Session):
+        # Verify proposal exists
+        proposal = session.query(Proposal).filter(Proposal.id == proposal_id).first()
+        if not proposal:
+            raise HTTPException(status_code=404, detail="Proposal not found")
+
+        db_section = ProposalSection(
+            proposal_id=proposal_id,
+            title=section.title,
+            content=section.content,
+            section_type=section.section_type,
+            order=section.order,
+            last_edited_by=current_user.id
+        )
+        session.add(db_section)
+        session.commit()
+        session.refresh(db_section)
+
+        # Log activity
+        activity = Activity(
+            proposal_id=proposal_id,
+            user_id=current_user.id,
+            action="section_created",
+            details=f"Created section: {section.title}"
+        )
+        session.add(activity)
+        session.commit()
+
+        return ProposalSectionResponse.model_validate(db_section)
+
+    return await db.run(create)
 
 @router.get("/{proposal_id}/sections", response_model=List[ProposalSectionResponse])
-def get_proposal_sections(
+async def get_proposal_sections(
     proposal_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    request: Request,
+    db: Database = Depends(get_read_database),
+    current_user: UserPrincipal = Depends(get_current_active_user)
 ):
-    sections = db.query(ProposalSection).filter(
-        ProposalSection.proposal_id == proposal_id
-    ).order_by(ProposalSection.order).all()
-    return sections
+    # Adding, editing or reordering a section changes the (id, version) list
+    def probe(session: Session):
+        versions = session.query(ProposalSection.id, ProposalSection.version).filter(
+            ProposalSection.proposal_id == proposal_id
+        ).order_by(ProposalSection.order, ProposalSection.id).all()
+        editors = session.query(User.id, User.version).filter(User.id.in_(
+            select(ProposalSection.last_edited_by).where(ProposalSection.proposal_id == proposal_id)
+        ))
+        return cache_key("sections", proposal_id, versions_digest(versions), users_digest(editors))
+
+    def render(session: Session):
+        sections = session.query(ProposalSection).options(*section_response_options).filter(
+            ProposalSection.proposal_id == proposal_id
+        ).order_by(ProposalSection.order, ProposalSection.id).all()
+        key = cache_key(
+            "sections", proposal_id, versions_digest((s.id, s.version) for s in sections),
+            users_digest(s.last_editor for s in sections),
+        )
+        return key, section_list_adapter.dump_json(
+            [ProposalSectionResponse.model_validate(s) for s in sections]
+        )
+
+    return await response_cache.respond(request, "sections", lambda: db.run(probe), lambda: db.run(render))
 
 @router.put("/{proposal_id}/sections/{section_id}", response_model=ProposalSectionResponse)
-def update_proposal_section(
+async def update_proposal_section(
     proposal_id: int,
     section_id: int,
     section_update: ProposalSectionUpdate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    db: Database = Depends(get_database),
+    current_user: UserPrincipal = Depends(get_current_active_user)
+):
+    def update(session: Session):
+        db_section = session.query(ProposalSection).filter(
+            ProposalSection.id == section_id,
+            ProposalSection.proposal_id == proposal_id
+        ).first()
+
+        if not db_section:
+            raise HTTPException(status_code=404, detail="Section not found")
+
+        update_data = section_update.dict(exclude_unset=True)
+        for field, value in update_data.items():
+            setattr(db_section, field, value)
+
+        db_section.last_edited_by = current_user.id
+        db_section.version = func.coalesce(ProposalSection.version, 1) + 1
+
+        session.commit()
+        session.refresh(db_section)
+        return ProposalSectionResponse.model_validate(db_section)
+
+    return await db.run(update)
+
+@router.get("/{proposal_id}/sections/{section_id}/suggestions", response_model=List[KnowledgeSuggestion])
+async def get_section_suggestions(
+    proposal_id: int,
+    section_id: int,
+    k: int = Query(10, ge=1, le=50),
+    db: Database = Depends(get_database),
+    current_user: UserPrincipal = Depends(get_current_active_user)
 ):
-    db_section = db.query(ProposalSection).filter(
-        ProposalSection.id == section_id,
-        ProposalSection.proposal_id == proposal_id
-    ).first()
-    
-    if not db_section:
-        raise HTTPException(status_code=404, detail="Section not found")
-    
-    update_data = section_update.dict(exclude_unset=True)
-    for field, value in update_data.items():
-        setattr(db_section, field, value)
-    
-    db_section.last_edited_by = current_user.id
-    db_section.version += 1
-    
-    db.commit()
-    db.refresh(db_section)
-    return db_section
+    def query(session: Session):
+        section = session.query(ProposalSection).filter(
+            ProposalSection.id == section_id,
+            ProposalSection.proposal_id == proposal_id
+        ).first()
+
+        if not section:
+            raise HTTPException(status_code=404, detail="Section not found")
+
+        # Approved knowledge items most similar to what is being written
+        results = vectors.similar(
+            session, f"{section.title} {section.content or ''}", k, options=knowledge_response_options
+        )
+        return [
+            KnowledgeSuggestion.model_validate(item).model_copy(update={"score": score})
+            for item, score in results
+        ]
+
+    return await db.run(query)
 
 @router.get("/{proposal_id}/activities", response_model=List[ActivityResponse])
-def get_proposal_activities(
+async def get_proposal_activities(
     proposal_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    db: Database = Depends(get_read_database),
+    current_user: UserPrincipal = Depends(get_current_active_user)
 ):
-    activities = db.query(Activity).filter(
-        Activity.proposal_id == proposal_id
-    ).order_by(Activity.timestamp.desc()).all()
-    return activities
+    def query(session: Session):
+        query = session.query(Activity).options(*activity_response_options).filter(
+            Activity.proposal_id == proposal_id
+        )
+        activities = keyset_paginate(query, Activity.id, cursor, limit).all()
+        response = ModelJSONResponse([ActivityResponse.model_validate(a) for a in activities], activity_list_adapter)
+        return response, next_cursor(activities, limit)
+
+    response, cursor_out = await db.run(query)
+    set_next_cursor(response, cursor_out)
+    return response
@@ -0,0 +1,65 @@
+from datetime import datetime
+from typing import List, Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from starlette.concurrency import run_in_threadpool
+from ..analytics import analytics
+from ..database import Database, get_database
+from ..schemas import ProposalReport, ReportGroup
+from ..auth import get_current_active_user
+from ..token_cache import UserPrincipal
+
+router = APIRouter(prefix="/reports", tags=["reports"])
+
+Dimension = Literal["industry", "size", "priority", "status", "organization", "tag"]
+
+@router.get("/proposals", response_model=ProposalReport)
+async def proposal_report(
+    group_by: List[Dimension] = Query([]),
+    industry: Optional[List[str]] = Query(None),
+    size: Optional[List[str]] = Query(None),
+    priority: Optional[List[str]] = Query(None),
+    status: Optional[List[str]] = Query(None),
+    organization_id: Optional[List[int]] = Query(None),
+    tags_any: Optional[List[str]] = Query(None),
+    tags_all: Optional[List[str]] = Query(None),
+    date_field: Literal["created", "deadline", "closed"] = "created",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    min_value: Optional[float] = None,
+    max_value: Optional[float] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: Database = Depends(get_database),
+    current_user: UserPrincipal = Depends(get_current_active_user)
+):
+    """Win rate, deal value and time to close per group, from the
+    analytics snapshot (see ``snapshot_at`` for its age)."""
+    if len(set(group_by)) != len(group_by) or len(group_by) > 3:
+        raise HTTPException(status_code=400, detail="group_by takes up to 3 distinct dimensions")
+
+    snapshot = analytics.snapshot or await db.run(analytics.ensure_built)
+
+    def report():
+        mask = snapshot.filter(
+            {"industry": industry, "size": size, "priority": priority,
+             "status": status, "organization": organization_id},
+            tags_any=tags_any, tags_all=tags_all,
+            date_field=date_field, start=start, end=end,
+            min_value=min_value, max_value=max_value,
+        )
+        groups = snapshot.group(mask, group_by)[:limit]
+        names = {}
+        if "organization" in group_by:
+            for group in groups:
+                org = group["key"]["organization"]
+                if org in snapshot.organization_names:
+                    names[org] = snapshot.organization_names[org]
+        return ProposalReport(
+            snapshot_at=snapshot.built_at,
+            proposals=int(mask.sum()),
+            group_by=list(group_by),
+            groups=[ReportGroup(**group) for group in groups],
+            organization_names=names,
+        )
+
+    # NumPy releases the GIL for most of this; keep it off the event loop
+    return await run_in_threadpool(report)
@@ -0,0 +1,159 @@
+"""In-process stack sampling profiler.
+
+A daemon thread wakes every ``interval`` seconds, reads every thread's
+Python stack with ``sys._current_frames()`` and counts each distinct
+stack. Requests add nothing while no profile runs, and sampling needs no
+ptrace or extra tooling, so it works in locked-down containers.
+
+Samples are attributed to a route by finding a frame on the stack that
+belongs to an endpoint, or to a function defined inside one (the
+``db.run`` unit of work running in the threadpool), so handlers need no
+instrumentation. Idle threads - the event loop waiting in ``select`` and
+threadpool workers waiting for work - are skipped.
+
+Overhead is capped: a sample holds the GIL, so after each one the sampler
+sleeps long enough that sampling stays below ``max_overhead`` of one CPU,
+whatever the number of threads or stack depth. Stack depth and the number
+of distinct stacks kept are bounded too.
+"""
+import os
+import sys
+import sysconfig
+import threading
+import time
+from collections import Counter
+from types import CodeType
+from typing import Dict, Iterable, Optional, Tuple
+
+UNROUTED = "<no route>"
+MAX_DEPTH = 128
+MAX_STACKS = 20000
+
+# Innermost frames of a thread with nothing to do: the event loop (uvloop's
+# C loop leaves asyncio.run as the innermost Python frame) and pool workers
+_IDLE_FRAMES = {
+    ("selectors.py", "select"),
+    ("runners.py", "run"),
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+}
+
+
+def route_codes(routes: Iterable) -> Dict[CodeType, str]:
+    """Code objects of each route's endpoint and the functions nested in it."""
+    codes: Dict[CodeType, str] = {}
+    for route in routes:
+        endpoint = getattr(route, "endpoint", None)
+        code = getattr(endpoint, "__code__", None)
+        if code is None:
+            continue
+        pending = [code]
+        while pending:
+            code = pending.pop()
+            codes.setdefault(code, route.path)
+            pending.extend(const for const in code.co_consts if isinstance(const, CodeType))
+    return codes
+
+
+# Frames are labelled relative to the first of these that contains them
+_ROOTS = sorted(
+    {
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + os.sep,
+        *(sysconfig.get_paths()[name] + os.sep for name in ("purelib", "platlib", "stdlib")),
+    },
+    key=len,
+    reverse=True,
+)
+
+
+def _short_path(filename: str) -> str:
+    for root in _ROOTS:
+        if filename.startswith(root):
+            return filename[len(root):]
+    return os.path.basename(filename)
+
+
+class StackSampler:
+    """Collapsed-stack counts per route for one time-bounded run."""
+
+    def __init__(self, codes: Dict[CodeType, str], interval: float, max_overhead: float, include_idle: bool = False):
+        self.codes = codes
+        self.interval = interval
+        self.max_overhead = max_overhead
+        self.include_idle = include_idle
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.dropped = 0
+        self.sampling_seconds = 0.0
+        self.elapsed = 0.0
+        self._labels: Dict[CodeType, str] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _label(self, code: CodeType) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            # ';' separates frames in collapsed stacks
+            label = f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+            self._labels[code] = label
+        return label
+
+    def _sample(self, own_ident: int) -> None:
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            code = frame.f_code
+            if not self.include_idle and (os.path.basename(code.co_filename), code.co_name) in _IDLE_FRAMES:
+                continue
+            route = UNROUTED
+            labels = []
+            while frame is not None and len(labels) < MAX_DEPTH:
+                code = frame.f_code
+                labels.append(self._label(code))
+                route = self.codes.get(code, route)
+                frame = frame.f_back
+            labels.append(route)
+            key: Tuple[str, ...] = tuple(reversed(labels))
+            if key in self.stacks or len(self.stacks) < MAX_STACKS:
+                self.stacks[key] += 1
+            else:
+                self.dropped += 1
+            self.samples += 1
+
+    def _run(self, duration: float) -> None:
+        own_ident = threading.get_ident()
+        start = time.perf_counter()
+        deadline = start + duration
+        while not self._stop.is_set():
+            before = time.perf_counter()
+            if before >= deadline:
+                break
+            self._sample(own_ident)
+            cost = time.perf_counter() - before
+            self.sampling_seconds += cost
+            # cost / (cost + pause) <= max_overhead
+            pause = max(self.interval - cost, cost * (1 / self.max_overhead - 1))
+            self._stop.wait(min(pause, max(deadline - time.perf_counter(), 0)))
+        self.elapsed = time.perf_counter() - start
+
+    def start(self, duration: float) -> None:
+        self._thread = threading.Thread(target=self._run, args=(duration,), name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def collapsed(self) -> str:
+        """``route;outer;...;inner count`` lines, for flamegraph.pl or speedscope."""
+        return "".join(
+            f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common()
+        )
+
+    def by_route(self) -> Dict[str, int]:
+        routes: Counter = Counter()
+        for stack, count in self.stacks.items():
+            routes[stack[0]] += count
+        return dict(routes.most_common())
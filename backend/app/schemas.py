@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, EmailStr, field_validator
+from typing import List, Optional, Dict, Any, Union
 from datetime import datetime
 from .models import UserRole, ProposalStatus, Priority, SectionType, KnowledgeCategory, ApprovalStatus
 
@@ -64,6 +64,12 @@ class ProposalBase(BaseModel):
     estimated_value: float
     tags: List[str] = []
 
+    @field_validator("tags", mode="before")
+    @classmethod
+    def parse_tags(cls, value):
+        # Rows written before tags had a default may hold NULL
+        return value or []
+
 class ProposalCreate(ProposalBase):
     assigned_to: List[int] = []
 
@@ -91,6 +97,57 @@ class ProposalResponse(ProposalBase):
     class Config:
         from_attributes = True
 
+class ProposalStatusStats(BaseModel):
+    status: ProposalStatus
+    count: int
+    total_value: float
+
+class OrganizationPipelineStats(BaseModel):
+    organization_id: int
+    organization_name: str
+    count: int
+    total_value: float
+    open_value: float
+    by_status: List[ProposalStatusStats]
+
+class UpcomingDeadline(BaseModel):
+    id: int
+    title: str
+    status: ProposalStatus
+    deadline: datetime
+    estimated_value: float
+    organization_id: Optional[int] = None
+
+    class Config:
+        from_attributes = True
+
+class ProposalStatsResponse(BaseModel):
+    total: int
+    total_value: float
+    won_value: float
+    open_value: float
+    by_status: List[ProposalStatusStats]
+    organizations: List[OrganizationPipelineStats]
+    upcoming_deadlines: List[UpcomingDeadline]
+
+class ReportGroup(BaseModel):
+    key: Dict[str, Union[int, str, None]]
+    count: int
+    won: int
+    lost: int
+    win_rate: Optional[float] = None
+    total_value: float
+    won_value: float
+    average_value: float
+    average_days_to_close: Optional[float] = None
+
+class ProposalReport(BaseModel):
+    snapshot_at: datetime
+    proposals: int
+    group_by: List[str]
+    groups: List[ReportGroup]
+    organization_names: Dict[int, str] = {}
+
 # Proposal Section Schemas
 class ProposalSectionBase(BaseModel):
     title: str
@@ -128,6 +185,12 @@ class KnowledgeBaseBase(BaseModel):
     tags: List[str] = []
     industry: Optional[str] = None
 
+    @field_validator("tags", mode="before")
+    @classmethod
+    def parse_tags(cls, value):
+        # Rows written before tags had a default may hold NULL
+        return value or []
+
 class KnowledgeBaseCreate(KnowledgeBaseBase):
     pass
 
@@ -143,6 +206,13 @@ class KnowledgeBaseResponse(KnowledgeBaseBase):
     class Config:
         from_attributes = True
 
+class KnowledgeSearchResult(KnowledgeBaseResponse):
+    rank: Optional[float] = None
+    snippet: Optional[str] = None
+
+class KnowledgeSuggestion(KnowledgeBaseResponse):
+    score: Optional[float] = None
+
 # Comment Schemas
 class CommentBase(BaseModel):
     content: str
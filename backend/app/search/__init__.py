@@ -0,0 +1,22 @@
+# Knowledge base search backends
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..models import KnowledgeBase
+from .bm25 import bm25_index
+from .vectors import vector_store
+
+
+def search_backend(session: Session) -> str:
+    """Resolve ``settings.knowledge_search_backend`` for the bound dialect."""
+    backend = settings.knowledge_search_backend
+    if backend == "auto":
+        dialect = session.get_bind().dialect.name
+        return "postgres" if dialect == "postgresql" else "ilike"
+    return backend
+
+
+def index_knowledge_item(item: KnowledgeBase) -> None:
+    """Apply a committed create/approve to the in-process indexes."""
+    bm25_index.add_item(item)
+    vector_store.add_item(item)
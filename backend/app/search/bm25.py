@@ -0,0 +1,299 @@
+import math
+import re
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..models import KnowledgeBase
+from .refresh import KnowledgeIndex, Row
+
+_WORD_RE = re.compile(r"\w+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has in is it of on or that the to was were will with".split()
+)
+# Title terms count double so that title hits outrank body mentions
+TITLE_WEIGHT = 2
+# Retired slots are compacted away once they exceed this fraction of live ones
+COMPACT_RATIO = 0.25
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    if not text:
+        return []
+    return [t for t in _WORD_RE.findall(text.lower()) if t not in _STOPWORDS]
+
+
+class _Bitmap:
+    """Append-only boolean bitmap; one byte per slot so NumPy can view it."""
+
+    __slots__ = ("bits",)
+
+    def __init__(self):
+        self.bits = bytearray()
+
+    def set(self, slot: int, value: bool) -> None:
+        if slot >= len(self.bits):
+            self.bits.extend(b"\x00" * (slot + 1 - len(self.bits)))
+        self.bits[slot] = 1 if value else 0
+
+    def test(self, slots: np.ndarray) -> np.ndarray:
+        view = np.frombuffer(self.bits, dtype=np.bool_)
+        mask = np.zeros(len(slots), dtype=np.bool_)
+        in_range = slots < len(view)
+        mask[in_range] = view[slots[in_range]]
+        return mask
+
+    def take(self, slots: np.ndarray) -> None:
+        """Keep only ``slots``, renumbered from 0 in order."""
+        self.bits = bytearray(self.test(slots).tobytes())
+
+
+class BM25Index(KnowledgeIndex):
+    """In-memory inverted index over knowledge items with Okapi BM25 scoring.
+
+    Every indexed item occupies a dense slot. Postings are parallel
+    ``array('i')`` slot lists and ``array('f')`` term frequencies, so a term
+    costs 8 bytes per document and is scored with vectorised NumPy.
+    Category, industry, approval and liveness are byte bitmaps over slots.
+    Updates append a new slot and retire the old one. Once retired slots
+    pass ``COMPACT_RATIO`` of the live ones, the postings are rewritten
+    without them, so the index tracks live documents rather than edits.
+
+    Writes through other workers are applied by ``refresh`` (see
+    ``refresh.py``); ``start`` runs it every ``refresh_interval`` seconds.
+    """
+
+    columns = (
+        KnowledgeBase.title, KnowledgeBase.content, KnowledgeBase.tags,
+        KnowledgeBase.category, KnowledgeBase.industry, KnowledgeBase.is_approved,
+    )
+    # Swapped in whole from a rebuilt copy
+    _CONTENTS = (
+        "_slot_by_id", "_ids", "_versions", "_lengths", "_terms_by_slot", "_postings", "_doc_freq",
+        "_alive", "_approved", "_categories", "_industries", "_live_docs", "_total_length",
+        "_id_sum", "_version_sum",
+    )
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, refresh_interval: float = 0.0):
+        super().__init__(refresh_interval)
+        self.k1 = k1
+        self.b = b
+        self._reset()
+
+    def _reset(self) -> None:
+        self._slot_by_id: Dict[int, int] = {}
+        self._ids = array("q")
+        self._versions = array("q")
+        self._lengths = array("f")
+        self._terms_by_slot: List[Tuple[str, ...]] = []
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._doc_freq: Dict[str, int] = {}
+        self._alive = _Bitmap()
+        self._approved = _Bitmap()
+        self._categories: Dict[str, _Bitmap] = {}
+        self._industries: Dict[str, _Bitmap] = {}
+        self._live_docs = 0
+        self._total_length = 0.0
+        self._id_sum = 0
+        self._version_sum = 0
+
+    def __len__(self) -> int:
+        return self._live_docs
+
+    def add(
+        self, doc_id: int, title: str, content: str, tags, category, industry: Optional[str], approved: bool,
+        version: int = 1,
+    ) -> None:
+        with self._lock:
+            self._add(doc_id, version, title, content, tags, category, industry, approved)
+            self._maybe_compact()
+
+    def remove(self, doc_id: int) -> None:
+        with self._lock:
+            self._remove(doc_id)
+            self._maybe_compact()
+
+    def _apply(self, row: Row) -> None:
+        self._add(*row)
+
+    def _version(self, doc_id: int) -> Optional[int]:
+        slot = self._slot_by_id.get(doc_id)
+        return None if slot is None else self._versions[slot]
+
+    def _fingerprint(self) -> Tuple[int, int, int]:
+        return self._live_docs, self._id_sum, self._version_sum
+
+    def _settle(self) -> None:
+        self._maybe_compact()
+
+    def _copy(self) -> "BM25Index":
+        return BM25Index(self.k1, self.b)
+
+    def _take(self, fresh: "BM25Index") -> None:
+        for name in self._CONTENTS:
+            setattr(self, name, getattr(fresh, name))
+
+    def _add(self, doc_id, version, title, content, tags, category, industry, approved) -> None:
+        self._remove(doc_id)
+        tokens = tokenize(title) * TITLE_WEIGHT + tokenize(" ".join(tags or [])) + tokenize(content)
+
+        counts: Dict[str, int] = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+
+        slot = len(self._ids)
+        self._ids.append(doc_id)
+        self._versions.append(version)
+        self._lengths.append(len(tokens))
+        self._terms_by_slot.append(tuple(counts))
+        self._slot_by_id[doc_id] = slot
+        for term, tf in counts.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = (array("i"), array("f"))
+            postings[0].append(slot)
+            postings[1].append(tf)
+            self._doc_freq[term] = self._doc_freq.get(term, 0) + 1
+
+        self._alive.set(slot, True)
+        self._approved.set(slot, bool(approved))
+        if category is not None:
+            key = getattr(category, "value", category)
+            self._categories.setdefault(key, _Bitmap()).set(slot, True)
+        if industry:
+            self._industries.setdefault(industry, _Bitmap()).set(slot, True)
+        self._live_docs += 1
+        self._total_length += len(tokens)
+        self._id_sum += doc_id
+        self._version_sum += version
+
+    def _remove(self, doc_id: int) -> None:
+        slot = self._slot_by_id.pop(doc_id, None)
+        if slot is None:
+            return
+        self._alive.set(slot, False)
+        for term in self._terms_by_slot[slot]:
+            self._doc_freq[term] -= 1
+        self._terms_by_slot[slot] = ()
+        self._live_docs -= 1
+        self._total_length -= self._lengths[slot]
+        self._id_sum -= doc_id
+        self._version_sum -= self._versions[slot]
+
+    def _maybe_compact(self) -> None:
+        if len(self._ids) - self._live_docs > COMPACT_RATIO * self._live_docs:
+            self._compact()
+
+    def _compact(self) -> None:
+        """Drop retired slots and renumber the live ones, keeping their order."""
+        keep = np.flatnonzero(self._alive.test(np.arange(len(self._ids))))
+        new_slots = np.full(len(self._ids), -1, dtype=np.int32)
+        new_slots[keep] = np.arange(len(keep), dtype=np.int32)
+        alive = new_slots >= 0
+
+        ids = np.frombuffer(self._ids, dtype=np.int64)[keep]
+        versions = np.frombuffer(self._versions, dtype=np.int64)[keep]
+        lengths = np.frombuffer(self._lengths, dtype=np.float32)[keep]
+        self._ids = array("q", ids.tobytes())
+        self._versions = array("q", versions.tobytes())
+        self._lengths = array("f", lengths.tobytes())
+        self._terms_by_slot = [self._terms_by_slot[slot] for slot in keep]
+        self._slot_by_id = {int(doc_id): slot for slot, doc_id in enumerate(ids)}
+
+        for term, (slots, tf) in list(self._postings.items()):
+            slots = np.frombuffer(slots, dtype=np.int32)
+            live = alive[slots]
+            if not live.any():
+                del self._postings[term]
+                self._doc_freq.pop(term, None)
+                continue
+            tf = np.frombuffer(tf, dtype=np.float32)[live]
+            self._postings[term] = (array("i", new_slots[slots[live]].tobytes()), array("f", tf.tobytes()))
+
+        for bitmap in (self._alive, self._approved, *self._categories.values(), *self._industries.values()):
+            bitmap.take(keep)
+
+    def search(
+        self,
+        q: str,
+        category: Optional[str] = None,
+        industry: Optional[str] = None,
+        limit: int = 20,
+        approved_only: bool = True,
+    ) -> List[Tuple[int, float]]:
+        terms = list(dict.fromkeys(tokenize(q)))
+        with self._lock:
+            if not terms or not self._live_docs:
+                return []
+            n_docs = self._live_docs
+            avg_length = self._total_length / n_docs
+            lengths = np.frombuffer(self._lengths, dtype=np.float32)
+
+            slot_parts = []
+            score_parts = []
+            for term in terms:
+                postings = self._postings.get(term)
+                doc_freq = self._doc_freq.get(term, 0)
+                if postings is None or doc_freq <= 0:
+                    continue
+                slots = np.frombuffer(postings[0], dtype=np.int32)
+                tf = np.frombuffer(postings[1], dtype=np.float32)
+                idf = math.log(1.0 + (n_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+                norm = self.k1 * (1.0 - self.b + self.b * lengths[slots] / avg_length)
+                slot_parts.append(slots.copy())
+                score_parts.append(idf * tf * (self.k1 + 1.0) / (tf + norm))
+            if not slot_parts:
+                return []
+
+            candidates, inverse = np.unique(np.concatenate(slot_parts), return_inverse=True)
+            scores = np.bincount(inverse, weights=np.concatenate(score_parts))
+
+            mask = self._alive.test(candidates)
+            if approved_only:
+                mask &= self._approved.test(candidates)
+            for value, bitmaps in ((category, self._categories), (industry, self._industries)):
+                if value:
+                    bitmap = bitmaps.get(value)
+                    if bitmap is None:
+                        return []
+                    mask &= bitmap.test(candidates)
+            candidates = candidates[mask]
+            scores = scores[mask]
+            if not len(candidates):
+                return []
+
+            if len(candidates) > limit:
+                top = np.argpartition(-scores, limit - 1)[:limit]
+            else:
+                top = np.arange(len(candidates))
+            top = top[np.argsort(-scores[top], kind="stable")]
+            ids = np.frombuffer(self._ids, dtype=np.int64)
+            return [(int(ids[candidates[i]]), float(scores[i])) for i in top]
+
+
+bm25_index = BM25Index(refresh_interval=settings.search_refresh_interval_seconds)
+
+
+def search(
+    session: Session,
+    q: str,
+    category: Optional[str] = None,
+    industry: Optional[str] = None,
+    limit: int = 20,
+    options=(),
+) -> List[Tuple[KnowledgeBase, float, Optional[str]]]:
+    """Score in memory, then load just the winning rows by primary key."""
+    bm25_index.ensure_built(session)
+    hits = bm25_index.search(q, category, industry, limit)
+    if not hits:
+        return []
+    items = {
+        item.id: item
+        for item in session.query(KnowledgeBase).options(*options).filter(
+            KnowledgeBase.id.in_([doc_id for doc_id, _ in hits])
+        )
+    }
+    return [(items[doc_id], score, None) for doc_id, score in hits if doc_id in items]
@@ -0,0 +1,120 @@
+import re
+from typing import List, Optional, Tuple
+
+from sqlalchemy import DDL, event, func, literal_column
+from sqlalchemy.orm import Session
+
+from ..models import KnowledgeBase
+
+# Weighted search document: title (A) > tags (B) > content (C). PostgreSQL
+# keeps the generated column in sync on every INSERT/UPDATE; to_tsvector on
+# the JSONB tags indexes the string elements only.
+SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(tags, '[]'::jsonb)), 'B') || "
+    "setweight(to_tsvector('english', coalesce(content, '')), 'C')"
+)
+SEARCH_VECTOR_DDL = DDL(
+    "ALTER TABLE knowledge_base ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    f"GENERATED ALWAYS AS ({SEARCH_VECTOR_SQL}) STORED"
+)
+SEARCH_INDEX_DDL = DDL(
+    "CREATE INDEX IF NOT EXISTS ix_knowledge_base_search_vector "
+    "ON knowledge_base USING gin (search_vector)"
+)
+
+# Fresh databases built with Base.metadata.create_all get the column too;
+# existing ones get it from the 0002 migration.
+event.listen(KnowledgeBase.__table__, "after_create", SEARCH_VECTOR_DDL.execute_if(dialect="postgresql"))
+event.listen(KnowledgeBase.__table__, "after_create", SEARCH_INDEX_DDL.execute_if(dialect="postgresql"))
+
+SEARCH_VECTOR = literal_column("knowledge_base.search_vector")
+TS_CONFIG = literal_column("'english'::regconfig")
+HEADLINE_OPTIONS = "StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=30, MinWords=10"
+
+_TOKEN_RE = re.compile(r'(-?)"([^"]*)"|(\S+)')
+_WORD_RE = re.compile(r"\w+")
+
+
+def to_tsquery_text(q: str) -> Optional[str]:
+    """Translate user search syntax into a safe ``to_tsquery`` expression.
+
+    ``"exact phrase"`` becomes a ``<->`` phrase, ``cloud*`` a prefix match,
+    ``-word`` a negation and ``OR`` between terms an alternative; all other
+    terms are ANDed. Only word characters reach the tsquery, so user input
+    can never inject tsquery operators.
+    """
+    terms: List[str] = []
+    joiners: List[str] = []
+    pending_or = False
+    for match in _TOKEN_RE.finditer(q):
+        negated, phrase, word = match.group(1), match.group(2), match.group(3)
+        if word is not None and word.upper() == "OR":
+            pending_or = bool(terms)
+            continue
+        prefix = False
+        if word is not None:
+            negated = "-" if word.startswith("-") else ""
+            prefix = word.endswith("*")
+            lexemes = _WORD_RE.findall(word)
+        else:
+            lexemes = _WORD_RE.findall(phrase)
+        if not lexemes:
+            continue
+        term = " <-> ".join(lexemes)
+        if prefix:
+            term += ":*"
+        term = f"({term})"
+        if negated:
+            term = "!" + term
+        if terms:
+            joiners.append(" | " if pending_or else " & ")
+        terms.append(term)
+        pending_or = False
+
+    if not terms:
+        return None
+    text = terms[0]
+    for joiner, term in zip(joiners, terms[1:]):
+        text += joiner + term
+    return text
+
+
+def search(
+    session: Session,
+    q: str,
+    category: Optional[str] = None,
+    industry: Optional[str] = None,
+    limit: int = 20,
+    options=(),
+) -> List[Tuple[KnowledgeBase, float, Optional[str]]]:
+    """Ranked GIN-backed search over approved knowledge items.
+
+    Ranking and LIMIT run on the tsvector alone; ``ts_headline`` re-parses
+    content, so it is only evaluated for the rows that made the page.
+    """
+    query_text = to_tsquery_text(q)
+    if query_text is None:
+        return []
+    tsquery = func.to_tsquery(TS_CONFIG, query_text)
+    rank = func.ts_rank_cd(SEARCH_VECTOR, tsquery)
+
+    top = session.query(KnowledgeBase.id.label("id"), rank.label("rank")).filter(
+        KnowledgeBase.is_approved == True,
+        SEARCH_VECTOR.op("@@")(tsquery),
+    )
+    if category:
+        top = top.filter(KnowledgeBase.category == category)
+    if industry:
+        top = top.filter(KnowledgeBase.industry == industry)
+    top = top.order_by(rank.desc(), KnowledgeBase.id.desc()).limit(limit).subquery()
+
+    snippet = func.ts_headline(TS_CONFIG, KnowledgeBase.content, tsquery, HEADLINE_OPTIONS)
+    rows = (
+        session.query(KnowledgeBase, top.c.rank, snippet)
+        .options(*options)
+        .join(top, top.c.id == KnowledgeBase.id)
+        .order_by(top.c.rank.desc(), KnowledgeBase.id.desc())
+        .all()
+    )
+    return [(item, float(item_rank), item_snippet) for item, item_rank, item_snippet in rows]
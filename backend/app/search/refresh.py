@@ -0,0 +1,217 @@
+"""Keeps the in-process knowledge indexes in step with the database.
+
+Each worker holds its own indexes and applies its own writes as they
+commit. ``KnowledgeIndex.refresh`` pulls in writes made through other
+workers without a rebuild:
+
+- rows whose ``coalesce(updated_at, created_at)`` is at or after the
+  index's high-water mark, less ``OVERLAP`` for transactions that commit
+  well after stamping their rows, are re-read and upserted. Rows whose
+  ``version`` the index already holds are skipped, so usage count updates
+  and the overlap cost nothing to apply;
+- the count, id sum and version sum of the rows the index should hold are
+  then compared with its own. Deletes, and anything the window missed,
+  show up there. Only a mismatch that persists over two passes costs a
+  full rebuild.
+
+A full rebuild is done on the side while searches keep using the current
+contents. Local writes committed meanwhile are replayed onto the new ones.
+"""
+import asyncio
+import logging
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import Any, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Query, Session
+
+from ..database import session_scope
+from ..models import KnowledgeBase
+
+logger = logging.getLogger(__name__)
+
+# How long after stamping its rows a transaction may commit and still be
+# picked up by the changed-since pass
+OVERLAP = timedelta(seconds=60)
+
+changed_at = func.coalesce(KnowledgeBase.updated_at, KnowledgeBase.created_at)
+
+# ``(id, version, *KnowledgeIndex.columns)``
+Row = Tuple[Any, ...]
+
+
+def fingerprint(session: Session, criteria=()) -> Tuple[int, int, int]:
+    count, ids, versions = session.query(
+        func.count(KnowledgeBase.id), func.sum(KnowledgeBase.id), func.sum(KnowledgeBase.version)
+    ).filter(*criteria).one()
+    return int(count), int(ids or 0), int(versions or 0)
+
+
+class KnowledgeIndex(ABC):
+    """An in-process index over knowledge rows.
+
+    Subclasses name the ``columns`` each row carries after ``id`` and
+    ``version``, and the ``criteria`` for rows worth holding. The storage
+    hooks are called with ``_lock`` held.
+    """
+
+    columns: Tuple = ()
+    criteria: Tuple = ()
+
+    def __init__(self, refresh_interval: float = 0.0):
+        self.refresh_interval = refresh_interval
+        self.built = False
+        self.mark: Optional[datetime] = None
+        self.rebuilds = 0
+        self._lock = threading.RLock()
+        self._mismatched = False
+        self._replay: Optional[List[Row]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @abstractmethod
+    def _reset(self) -> None:
+        """Drop every row."""
+
+    @abstractmethod
+    def _apply(self, row: Row) -> None:
+        """Insert, replace or drop the document for ``row``."""
+
+    @abstractmethod
+    def _version(self, doc_id: int) -> Optional[int]:
+        """The version held for ``doc_id``, or None."""
+
+    @abstractmethod
+    def _fingerprint(self) -> Tuple[int, int, int]:
+        """Count, id sum and version sum of the rows held."""
+
+    @abstractmethod
+    def _settle(self) -> None:
+        """Tidy up after a batch of writes, e.g. compact retired slots."""
+
+    @abstractmethod
+    def _copy(self) -> "KnowledgeIndex":
+        """An empty index configured like this one."""
+
+    @abstractmethod
+    def _take(self, fresh: "KnowledgeIndex") -> None:
+        """Adopt the contents of ``fresh``, a rebuilt copy of this index."""
+
+    def _query(self, session: Session) -> Query:
+        return session.query(KnowledgeBase.id, KnowledgeBase.version, *self.columns)
+
+    def _upsert(self, row: Row) -> None:
+        held = self._version(row[0])
+        # Versions only grow, so a held one at least as new has nothing to add
+        if held is not None and held >= row[1]:
+            return
+        self._apply(row)
+
+    def _advance(self, mark: Optional[datetime]) -> None:
+        if mark is not None and (self.mark is None or mark > self.mark):
+            self.mark = mark
+
+    def build(self, session: Session, batch_size: int = 5000) -> None:
+        mark = session.query(func.max(changed_at)).scalar()
+        rows = self._query(session).filter(*self.criteria).yield_per(batch_size)
+        with self._lock:
+            self._reset()
+            for row in rows:
+                self._apply(row)
+            self._settle()
+            self.mark = mark
+            self.built = True
+
+    def ensure_built(self, session: Session) -> None:
+        if not self.built:
+            with self._lock:
+                if not self.built:
+                    self.build(session)
+
+    def add_item(self, item: KnowledgeBase) -> None:
+        """Apply a write this worker has just committed."""
+        row = (item.id, item.version) + tuple(getattr(item, column.key) for column in self.columns)
+        changed = item.updated_at or item.created_at
+        with self._lock:
+            if self._replay is not None:
+                self._replay.append(row)
+            # Checked under the lock, which a build holds while it scans: a
+            # write it may have missed waits for it and is applied after
+            if not self.built:
+                return
+            self._upsert(row)
+            self._settle()
+            self._advance(changed)
+
+    def refresh(self, session: Session) -> bool:
+        """Apply what other workers changed; True if it took a rebuild.
+
+        Never builds an index nobody has used.
+        """
+        if not self.built:
+            return False
+        mark = session.query(func.max(changed_at)).scalar()
+        query = self._query(session)
+        if self.mark is not None:
+            query = query.filter(changed_at >= self.mark - OVERLAP)
+        rows = query.all()
+        expected = fingerprint(session, self.criteria)
+        with self._lock:
+            for row in rows:
+                self._upsert(row)
+            self._settle()
+            self._advance(mark)
+            held = self._fingerprint()
+        if held == expected:
+            self._mismatched = False
+            return False
+        # A commit landing between the queries above mismatches once; the
+        # next pass picks it up
+        if not self._mismatched:
+            self._mismatched = True
+            return False
+        self._rebuild(session)
+        return True
+
+    def _rebuild(self, session: Session) -> None:
+        fresh = self._copy()
+        with self._lock:
+            self._replay = []
+        try:
+            fresh.build(session)
+            with self._lock:
+                self._take(fresh)
+                self.mark = fresh.mark
+                for row in self._replay:
+                    self._upsert(row)
+                self._settle()
+                self._mismatched = False
+                self.rebuilds += 1
+        finally:
+            with self._lock:
+                self._replay = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            if not self.built:
+                continue
+            try:
+                async with session_scope() as db:
+                    await db.run(self.refresh)
+            except Exception:
+                logger.exception("Refreshing %s failed; keeping its current contents", type(self).__name__)
+
+    def start(self) -> None:
+        if self._task is None and self.refresh_interval > 0:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
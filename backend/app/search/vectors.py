@@ -0,0 +1,312 @@
+import math
+import os
+import tempfile
+import zlib
+from array import array
+from typing import List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..models import KnowledgeBase
+from .bm25 import COMPACT_RATIO, TITLE_WEIGHT, tokenize
+from .refresh import KnowledgeIndex, Row
+
+
+class HashingVectorizer:
+    """Offline text embedding: hashed word unigrams and bigrams.
+
+    Terms are hashed with CRC32 (stable across processes, unlike ``hash``)
+    into ``dim`` signed buckets, weighted with sublinear TF and L2
+    normalised. Document frequencies per bucket are tracked so queries can
+    be IDF-weighted without re-embedding the corpus.
+    """
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.doc_freq = np.zeros(dim, dtype=np.float32)
+        self.n_docs = 0
+
+    def _features(self, text: str) -> List[str]:
+        words = tokenize(text)
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def transform(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        counts = {}
+        for feature in self._features(text):
+            counts[feature] = counts.get(feature, 0) + 1
+        for feature, tf in counts.items():
+            h = zlib.crc32(feature.encode("utf-8"))
+            sign = 1.0 if h & 0x80000000 else -1.0
+            vector[h % self.dim] += sign * (1.0 + math.log(tf))
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+        return vector
+
+    def observe(self, vector: np.ndarray, weight: float = 1.0) -> None:
+        self.doc_freq += weight * (vector != 0)
+        self.n_docs += weight
+
+    def query_weights(self) -> np.ndarray:
+        # Smoothed IDF, squared because it applies to one side of the dot
+        idf = np.log((1.0 + self.n_docs) / (1.0 + self.doc_freq)) + 1.0
+        return (idf * idf).astype(np.float32)
+
+
+def document_text(title: Optional[str], content: Optional[str], tags) -> str:
+    return " ".join([title or ""] * TITLE_WEIGHT + list(tags or []) + [content or ""])
+
+
+class IVFIndex:
+    """Inverted-file index: k-means centroids with per-centroid row lists.
+
+    A query scores the centroids, then only the rows in the ``nprobe``
+    closest lists, trading a little recall for sub-linear latency.
+    """
+
+    def __init__(self, centroids: np.ndarray, nprobe: int):
+        self.centroids = centroids
+        self.nprobe = min(nprobe, len(centroids))
+        self.lists = [array("q") for _ in range(len(centroids))]
+
+    @classmethod
+    def train(cls, vectors: np.ndarray, nlist: int, nprobe: int, iterations: int = 10, sample: int = 50000):
+        rng = np.random.default_rng(0)
+        rows = vectors if len(vectors) <= sample else vectors[rng.choice(len(vectors), sample, replace=False)]
+        centroids = rows[rng.choice(len(rows), nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = np.argmax(rows @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = rows[assignment == c]
+                if len(members):
+                    centroid = members.sum(axis=0)
+                    norm = np.linalg.norm(centroid)
+                    centroids[c] = centroid / norm if norm else centroid
+        index = cls(centroids, nprobe)
+        index.assign(vectors)
+        return index
+
+    def assign(self, vectors: np.ndarray) -> None:
+        """Refill the lists with rows ``0..len(vectors)`` of a matrix."""
+        self.lists = [array("q") for _ in range(len(self.centroids))]
+        for start in range(0, len(vectors), 65536):
+            block = vectors[start:start + 65536]
+            for offset, c in enumerate(np.argmax(block @ self.centroids.T, axis=1)):
+                self.lists[c].append(start + offset)
+
+    def add(self, row: int, vector: np.ndarray) -> None:
+        self.lists[int(np.argmax(self.centroids @ vector))].append(row)
+
+    def candidates(self, query: np.ndarray) -> np.ndarray:
+        scores = self.centroids @ query
+        probe = np.argpartition(-scores, self.nprobe - 1)[:self.nprobe]
+        return np.concatenate([np.frombuffer(self.lists[c], dtype=np.int64) for c in probe])
+
+
+class VectorStore(KnowledgeIndex):
+    """Knowledge item embeddings in a memory-mapped float32 matrix.
+
+    Rows live in a per-process scratch file under ``settings.vector_store_dir``
+    so a large corpus is paged in by the OS instead of held on the heap. The
+    file is unlinked as soon as it is mapped, so it disappears with the
+    process. It doubles in capacity as items are added; retired rows are
+    zeroed and their id set to -1 until they pass ``COMPACT_RATIO`` of the
+    live ones and the matrix is compacted. Below
+    ``settings.vector_ivf_min_docs`` rows a brute-force matrix-vector
+    product is both exact and within budget; above it an IVF index keeps
+    query cost sub-linear.
+
+    Only approved items are held. Writes through other workers are applied
+    by ``refresh`` (see ``refresh.py``); ``start`` runs it every
+    ``refresh_interval`` seconds.
+    """
+
+    columns = (KnowledgeBase.title, KnowledgeBase.content, KnowledgeBase.tags, KnowledgeBase.is_approved)
+    criteria = (KnowledgeBase.is_approved == True,)
+
+    def __init__(self, dim: int, directory: Optional[str] = None, refresh_interval: float = 0.0):
+        super().__init__(refresh_interval)
+        self.dim = dim
+        self.directory = directory or tempfile.gettempdir()
+        self.vectorizer = HashingVectorizer(dim)
+        self.ivf: Optional[IVFIndex] = None
+        # Set only where a mapped file cannot be unlinked (Windows)
+        self._path: Optional[str] = None
+        self._matrix = np.zeros((0, dim), dtype=np.float32)
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._versions = np.zeros(0, dtype=np.int64)
+        self._row_by_id = {}
+        self._size = 0
+        self._id_sum = 0
+        self._version_sum = 0
+
+    def _allocate(self, capacity: int) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        fd, path = tempfile.mkstemp(prefix=f"knowledge-vectors-{os.getpid()}-", suffix=".f32", dir=self.directory)
+        os.close(fd)
+        matrix = np.memmap(path, dtype=np.float32, mode="w+", shape=(max(capacity, 1), self.dim))
+        try:
+            # The mapping stays valid; the space is freed when it is unmapped
+            os.remove(path)
+        except OSError:
+            pass
+        else:
+            path = None
+        ids = np.full(max(capacity, 1), -1, dtype=np.int64)
+        versions = np.zeros(max(capacity, 1), dtype=np.int64)
+        if self._size:
+            matrix[:self._size] = self._matrix[:self._size]
+            ids[:self._size] = self._ids[:self._size]
+            versions[:self._size] = self._versions[:self._size]
+        self._remove_file()
+        self._matrix, self._ids, self._versions, self._path = matrix, ids, versions, path
+
+    def _remove_file(self) -> None:
+        if self._path:
+            try:
+                os.remove(self._path)
+            except OSError:
+                pass
+            self._path = None
+
+    def _reset(self) -> None:
+        self.vectorizer = HashingVectorizer(self.dim)
+        self.ivf = None
+        self._size = 0
+        self._row_by_id = {}
+        self._id_sum = 0
+        self._version_sum = 0
+        self._allocate(1024)
+
+    def _apply(self, row: Row) -> None:
+        doc_id, version, title, content, tags, approved = row
+        if approved:
+            self._store(doc_id, version, self.vectorizer.transform(document_text(title, content, tags)))
+        else:
+            self._remove(doc_id)
+
+    def _version(self, doc_id: int) -> Optional[int]:
+        row = self._row_by_id.get(doc_id)
+        return None if row is None else int(self._versions[row])
+
+    def _fingerprint(self) -> Tuple[int, int, int]:
+        return len(self._row_by_id), self._id_sum, self._version_sum
+
+    def _settle(self) -> None:
+        if self._size - len(self._row_by_id) > COMPACT_RATIO * len(self._row_by_id):
+            self._compact()
+        if self.ivf is None and self._size >= settings.vector_ivf_min_docs:
+            self._train_ivf()
+
+    def _copy(self) -> "VectorStore":
+        return VectorStore(self.dim, self.directory)
+
+    def _take(self, fresh: "VectorStore") -> None:
+        self._remove_file()
+        self.vectorizer, self.ivf = fresh.vectorizer, fresh.ivf
+        self._matrix, self._ids, self._versions, self._path = fresh._matrix, fresh._ids, fresh._versions, fresh._path
+        self._row_by_id, self._size = fresh._row_by_id, fresh._size
+        self._id_sum, self._version_sum = fresh._id_sum, fresh._version_sum
+
+    async def stop(self) -> None:
+        await super().stop()
+        with self._lock:
+            self._remove_file()
+
+    def _train_ivf(self) -> None:
+        nlist = max(1, int(4 * math.sqrt(self._size)))
+        self.ivf = IVFIndex.train(self._matrix[:self._size], nlist, settings.vector_ivf_nprobe)
+
+    def _store(self, doc_id: int, version: int, vector: np.ndarray) -> None:
+        self._remove(doc_id)
+        if self._size == len(self._ids):
+            self._allocate(2 * len(self._ids))
+        row = self._size
+        self._matrix[row] = vector
+        self._ids[row] = doc_id
+        self._versions[row] = version
+        self._row_by_id[doc_id] = row
+        self._size += 1
+        self._id_sum += doc_id
+        self._version_sum += version
+        self.vectorizer.observe(vector)
+        if self.ivf is not None:
+            self.ivf.add(row, vector)
+
+    def _remove(self, doc_id: int) -> None:
+        row = self._row_by_id.pop(doc_id, None)
+        if row is None:
+            return
+        self.vectorizer.observe(self._matrix[row], weight=-1.0)
+        self._id_sum -= doc_id
+        self._version_sum -= int(self._versions[row])
+        self._matrix[row] = 0.0
+        self._ids[row] = -1
+
+    def _compact(self) -> None:
+        """Move the live rows down over retired ones, keeping their order."""
+        keep = np.flatnonzero(self._ids[:self._size] >= 0)
+        size = len(keep)
+        # keep[i] >= i, so no block reads a row an earlier block overwrote
+        for start in range(0, size, 65536):
+            block = keep[start:start + 65536]
+            self._matrix[start:start + len(block)] = self._matrix[block]
+        self._matrix[size:self._size] = 0.0
+        self._ids[:size] = self._ids[keep]
+        self._ids[size:self._size] = -1
+        self._versions[:size] = self._versions[keep]
+        self._row_by_id = {int(doc_id): row for row, doc_id in enumerate(self._ids[:size])}
+        self._size = size
+        if self.ivf is not None:
+            self.ivf.assign(self._matrix[:size])
+
+    def search(self, text: str, k: int = 10) -> List[Tuple[int, float]]:
+        with self._lock:
+            if not self._row_by_id:
+                return []
+            query = self.vectorizer.transform(text) * self.vectorizer.query_weights()
+            if self.ivf is not None:
+                rows = self.ivf.candidates(query)
+                scores = self._matrix[rows] @ query
+            else:
+                rows = np.arange(self._size)
+                scores = self._matrix[:self._size] @ query
+
+            ids = self._ids[rows]
+            keep = ids >= 0
+            ids, scores = ids[keep], scores[keep]
+            if not len(ids):
+                return []
+            if len(ids) > k:
+                top = np.argpartition(-scores, k - 1)[:k]
+            else:
+                top = np.arange(len(ids))
+            top = top[np.argsort(-scores[top], kind="stable")]
+            return [(int(ids[i]), float(scores[i])) for i in top if scores[i] > 0]
+
+
+vector_store = VectorStore(
+    settings.vector_dim, settings.vector_store_dir, settings.search_refresh_interval_seconds
+)
+
+
+def similar(
+    session: Session,
+    text: str,
+    k: int = 10,
+    options=(),
+) -> List[Tuple[KnowledgeBase, float]]:
+    vector_store.ensure_built(session)
+    hits = vector_store.search(text, k)
+    if not hits:
+        return []
+    items = {
+        item.id: item
+        for item in session.query(KnowledgeBase).options(*options).filter(
+            KnowledgeBase.id.in_([doc_id for doc_id, _ in hits])
+        )
+    }
+    return [(items[doc_id], score) for doc_id, score in hits if doc_id in items]
@@ -0,0 +1,154 @@
+"""Incrementally maintained proposal pipeline rollups.
+
+Every insert, update or delete of a ``Proposal`` applies a +/- delta to the
+matching ``proposal_stats`` rows in the same transaction, so dashboard
+reads touch one row per (organization, status) instead of every proposal.
+``rebuild`` recomputes the table from scratch; run it after bulk imports
+or to repair drift:
+
+    python -m app.stats
+"""
+import asyncio
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import event, func, inspect, text
+from sqlalchemy.orm import Session
+
+from .models import Proposal, ProposalStats, ProposalStatus
+
+# organization_id of the all-proposals rows
+ALL_ORGANIZATIONS = 0
+CLOSED_STATUSES = (ProposalStatus.WON, ProposalStatus.LOST)
+
+_Key = Tuple[Optional[int], Optional[str], float]
+
+
+def _status_value(status) -> Optional[str]:
+    return getattr(status, "value", status)
+
+
+def _upsert(connection, organization_id: int, status: str, count: int, value: float) -> None:
+    table = ProposalStats.__table__
+    values = {
+        "organization_id": organization_id,
+        "status": status,
+        "proposal_count": count,
+        "total_value": value,
+    }
+    if connection.dialect.name in ("postgresql", "sqlite"):
+        if connection.dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        statement = insert(table).values(**values)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.organization_id, table.c.status],
+            set_={
+                "proposal_count": table.c.proposal_count + statement.excluded.proposal_count,
+                "total_value": table.c.total_value + statement.excluded.total_value,
+            },
+        )
+        connection.execute(statement)
+        return
+
+    updated = connection.execute(
+        table.update()
+        .where(table.c.organization_id == organization_id, table.c.status == status)
+        .values(proposal_count=table.c.proposal_count + count, total_value=table.c.total_value + value)
+    )
+    if not updated.rowcount:
+        connection.execute(table.insert().values(**values))
+
+
+def _apply(connection, key: _Key, sign: int) -> None:
+    organization_id, status, value = key
+    if status is None:
+        return
+    value = sign * (value or 0.0)
+    _upsert(connection, ALL_ORGANIZATIONS, status, sign, value)
+    if organization_id is not None:
+        _upsert(connection, organization_id, status, sign, value)
+
+
+def _current(target: Proposal) -> _Key:
+    return target.organization_id, _status_value(target.status), target.estimated_value
+
+
+def _previous(target: Proposal) -> _Key:
+    state = inspect(target)
+    values = []
+    for key in ("organization_id", "status", "estimated_value"):
+        history = state.attrs[key].history
+        values.append(history.deleted[0] if history.deleted else getattr(target, key))
+    return values[0], _status_value(values[1]), values[2]
+
+
+# Make plain assignments load the old value so after_update can see it
+# even when the row was never read first
+for _attribute in (Proposal.organization_id, Proposal.status, Proposal.estimated_value):
+    event.listen(_attribute, "set", lambda *args: None, active_history=True)
+
+
+@event.listens_for(Proposal, "after_insert")
+def _count_inserted_proposal(mapper, connection, target):
+    _apply(connection, _current(target), +1)
+
+
+@event.listens_for(Proposal, "after_update")
+def _count_updated_proposal(mapper, connection, target):
+    before, after = _previous(target), _current(target)
+    if before != after:
+        _apply(connection, before, -1)
+        _apply(connection, after, +1)
+
+
+@event.listens_for(Proposal, "after_delete")
+def _count_deleted_proposal(mapper, connection, target):
+    _apply(connection, _previous(target), -1)
+
+
+def _snapshot(session: Session) -> Dict[Tuple[int, str], Tuple[int, float]]:
+    return {
+        (row.organization_id, row.status): (row.proposal_count, round(row.total_value, 6))
+        for row in session.query(ProposalStats).filter(ProposalStats.proposal_count != 0)
+    }
+
+
+def rebuild(session: Session) -> int:
+    """Recompute every rollup row; returns how many rows were corrected."""
+    if session.bind.dialect.name == "postgresql":
+        # Hold off proposal writes so no delta lands between the scan and commit
+        session.execute(text("LOCK TABLE proposals IN SHARE MODE"))
+    before = _snapshot(session)
+
+    rows: Dict[Tuple[int, str], Dict[str, float]] = {}
+    grouped = session.query(
+        Proposal.organization_id, Proposal.status, func.count(), func.coalesce(func.sum(Proposal.estimated_value), 0.0)
+    ).filter(Proposal.status.isnot(None)).group_by(Proposal.organization_id, Proposal.status)
+    for organization_id, status, count, value in grouped:
+        scopes = [ALL_ORGANIZATIONS] if organization_id is None else [ALL_ORGANIZATIONS, organization_id]
+        for scope in scopes:
+            row = rows.setdefault((scope, _status_value(status)), {"proposal_count": 0, "total_value": 0.0})
+            row["proposal_count"] += count
+            row["total_value"] += value
+
+    session.query(ProposalStats).delete()
+    if rows:
+        session.execute(ProposalStats.__table__.insert(), [
+            {"organization_id": scope, "status": status, **totals} for (scope, status), totals in rows.items()
+        ])
+    after = _snapshot(session)
+    session.commit()
+    return sum(before.get(key) != after.get(key) for key in before.keys() | after.keys())
+
+
+async def main() -> None:
+    from .database import session_scope
+
+    async with session_scope() as db:
+        corrected = await db.run(rebuild)
+    print(f"proposal_stats rebuilt; {corrected} row(s) differed")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,125 @@
+"""Tag storage and tag filters.
+
+On PostgreSQL ``tags`` is JSONB with a GIN index, so "has all of" is
+``tags @> '[...]'`` and "has any of" is ``tags ?| ARRAY[...]``. Other
+dialects keep a normalized copy in ``proposal_tags`` / ``knowledge_tags``:
+the mapper events below rewrite an item's rows whenever its tags change,
+in the same flush, and filters become indexed ``IN`` subqueries on it.
+Bulk ``insert()``/``update()`` statements skip mapper events; refill the
+tag tables afterwards with:
+
+    python -m app.tags
+"""
+import asyncio
+from typing import Optional, Sequence
+
+from sqlalchemy import Text, event, inspect, select, type_coerce
+from sqlalchemy.dialects.postgresql import JSONB, array
+from sqlalchemy.orm import Query, Session
+
+from .models import KnowledgeBase, Proposal, knowledge_tags, proposal_tags
+
+# Mapped class -> (tag table, its item id column)
+TAG_TABLES = {
+    Proposal: (proposal_tags, proposal_tags.c.proposal_id),
+    KnowledgeBase: (knowledge_tags, knowledge_tags.c.knowledge_id),
+}
+
+
+def _uses_tag_table(connection) -> bool:
+    return connection.dialect.name != "postgresql"
+
+
+def _insert_tags(connection, model, target) -> None:
+    table, id_column = TAG_TABLES[model]
+    tags = sorted(set(target.tags or ()))
+    if tags:
+        connection.execute(table.insert(), [{id_column.key: target.id, "tag": tag} for tag in tags])
+
+
+def _delete_tags(connection, model, target) -> None:
+    table, id_column = TAG_TABLES[model]
+    connection.execute(table.delete().where(id_column == target.id))
+
+
+def _tags_inserted(mapper, connection, target):
+    if _uses_tag_table(connection):
+        _insert_tags(connection, mapper.class_, target)
+
+
+def _tags_updated(mapper, connection, target):
+    if _uses_tag_table(connection) and inspect(target).attrs.tags.history.has_changes():
+        _delete_tags(connection, mapper.class_, target)
+        _insert_tags(connection, mapper.class_, target)
+
+
+def _tags_deleted(mapper, connection, target):
+    # SQLite does not enforce ON DELETE CASCADE unless foreign keys are on
+    if _uses_tag_table(connection):
+        _delete_tags(connection, mapper.class_, target)
+
+
+for _model in TAG_TABLES:
+    event.listen(_model, "after_insert", _tags_inserted)
+    event.listen(_model, "after_update", _tags_updated)
+    event.listen(_model, "before_delete", _tags_deleted)
+
+
+def filter_tags(
+    query: Query,
+    model,
+    tag: Optional[str] = None,
+    tags_any: Optional[Sequence[str]] = None,
+    tags_all: Optional[Sequence[str]] = None,
+) -> Query:
+    """Restrict ``query`` to ``model`` rows carrying ``tag``, at least one
+    of ``tags_any`` and every one of ``tags_all``."""
+    required = list(dict.fromkeys(([tag] if tag else []) + list(tags_all or [])))
+    tags_any = list(dict.fromkeys(tags_any or []))
+
+    if query.session.get_bind().dialect.name == "postgresql":
+        # The column type is a JSON/JSONB variant; coerce for the JSONB operators
+        tags = type_coerce(model.tags, JSONB)
+        if required:
+            query = query.filter(tags.contains(required))
+        if tags_any:
+            query = query.filter(tags.has_any(array(tags_any, type_=Text)))
+        return query
+
+    table, id_column = TAG_TABLES[model]
+    for value in required:
+        query = query.filter(model.id.in_(select(id_column).where(table.c.tag == value)))
+    if tags_any:
+        query = query.filter(model.id.in_(select(id_column).where(table.c.tag.in_(tags_any))))
+    return query
+
+
+def rebuild(session: Session) -> int:
+    """Refill the tag tables from the tags columns; returns rows written."""
+    if not _uses_tag_table(session.connection()):
+        return 0
+    written = 0
+    for model, (table, id_column) in TAG_TABLES.items():
+        session.execute(table.delete())
+        rows = [
+            {id_column.key: item_id, "tag": tag}
+            for item_id, tags in session.query(model.id, model.tags)
+            for tag in sorted(set(tags or ()))
+        ]
+        if rows:
+            session.execute(table.insert(), rows)
+        written += len(rows)
+    session.commit()
+    return written
+
+
+async def main() -> None:
+    from .database import session_scope
+
+    async with session_scope() as db:
+        written = await db.run(rebuild)
+    print(f"tag tables rebuilt; {written} row(s) written")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
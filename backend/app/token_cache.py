@@ -0,0 +1,202 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Optional, Set, Tuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+
+from .config import settings
+from .models import User, UserProfile
+from .permissions import Permission, profile_permissions
+
+
+@dataclass(frozen=True)
+class UserPrincipal:
+    """Detached snapshot of an authenticated user.
+
+    Exposes the same attributes the routers and ``UserResponse`` read from
+    ``User`` so it can be cached across requests without holding a session.
+    ``permissions`` is compiled from the profile once, when the principal is
+    built, so authorization checks are a bitwise AND.
+    """
+    id: int
+    email: str
+    name: str
+    is_active: bool
+    created_at: Optional[datetime]
+    permissions: Permission = Permission.NONE
+
+    @classmethod
+    def from_user(cls, user: User) -> "UserPrincipal":
+        # Reads user.profile; load it with the user
+        return cls(
+            id=user.id,
+            email=user.email,
+            name=user.name,
+            is_active=bool(user.is_active),
+            created_at=user.created_at,
+            permissions=profile_permissions(user.profile),
+        )
+
+    def has(self, permissions: Permission) -> bool:
+        return self.permissions & permissions == permissions
+
+
+class TokenCache:
+    """Bounded LRU of verified JWTs keyed by the SHA-256 of the raw token.
+
+    Entries expire at the token's ``exp`` claim or after ``ttl`` seconds,
+    whichever comes first, so a cached entry is never more permissive than
+    a fresh ``jwt.decode`` would be.
+
+    Invalidation is per process: other workers keep serving a user's old
+    principal until its entry expires.
+    """
+
+    def __init__(self, maxsize: int, ttl: int):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Bumped by every invalidation; see ``set``
+        self.invalidations = 0
+        self._entries: "OrderedDict[bytes, Tuple[float, Dict[str, Any], UserPrincipal]]" = OrderedDict()
+        self._keys_by_user: Dict[int, Set[bytes]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def get(self, token: str) -> Optional[Tuple[Dict[str, Any], UserPrincipal]]:
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, claims, principal = entry
+            if expires_at <= time.time():
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return claims, principal
+
+    def set(
+        self, token: str, claims: Dict[str, Any], principal: UserPrincipal, invalidations: Optional[int] = None
+    ) -> None:
+        """Cache ``principal`` for ``token``.
+
+        Pass the ``invalidations`` count read before the principal was
+        loaded: if a user was invalidated since, the row may predate that
+        change, and the principal is not stored.
+        """
+        if self.maxsize <= 0:
+            return
+        expires_at = time.time() + self.ttl
+        exp = claims.get("exp")
+        if exp is not None:
+            expires_at = min(expires_at, float(exp))
+        key = self._key(token)
+        with self._lock:
+            if invalidations is not None and invalidations != self.invalidations:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires_at, claims, principal)
+            self._keys_by_user.setdefault(principal.id, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate_user(self, user_id: int) -> None:
+        with self._lock:
+            self.invalidations += 1
+            for key in self._keys_by_user.pop(user_id, set()):
+                self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _remove(self, key: bytes) -> None:
+        _, _, principal = self._entries.pop(key)
+        keys = self._keys_by_user.get(principal.id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[principal.id]
+
+
+token_cache = TokenCache(settings.token_cache_size, settings.token_cache_ttl_seconds)
+
+
+# Any change to a user row (deactivation, email change, ...) drops the
+# cached principals for that user so the next request re-resolves it.
+# Flushes only record the user and the commit evicts it: before the
+# commit, a request that misses the cache would reload the old row and
+# cache it again.
+_INVALIDATED_USERS = "invalidated_users"
+
+
+def _invalidate_after_commit(target, user_id: Optional[int]) -> None:
+    if user_id is None:
+        return
+    session = object_session(target)
+    if session is None:
+        token_cache.invalidate_user(user_id)
+    else:
+        session.info.setdefault(_INVALIDATED_USERS, set()).add(user_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _evict_invalidated_users(session):
+    for user_id in session.info.pop(_INVALIDATED_USERS, ()):
+        token_cache.invalidate_user(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_invalidated_users(session):
+    session.info.pop(_INVALIDATED_USERS, None)
+
+
+# Collection-only changes (e.g. being assigned to a proposal) also mark the
+# user dirty, so only column changes count.
+@event.listens_for(User, "after_update")
+def _invalidate_cached_user(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[attr.key].history.has_changes() for attr in mapper.column_attrs):
+        _invalidate_after_commit(target, target.id)
+
+
+@event.listens_for(User, "after_delete")
+def _invalidate_deleted_user(mapper, connection, target):
+    _invalidate_after_commit(target, target.id)
+
+
+# Role and permission changes take effect on the user's next request
+@event.listens_for(UserProfile, "after_insert")
+@event.listens_for(UserProfile, "after_update")
+@event.listens_for(UserProfile, "after_delete")
+def _invalidate_profile_user(mapper, connection, target):
+    history = inspect(target).attrs.user_id.history
+    for user_id in {target.user_id, *history.deleted}:
+        _invalidate_after_commit(target, user_id)
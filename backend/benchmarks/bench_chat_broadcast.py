@@ -0,0 +1,144 @@
+"""Broadcast to one large chat room with slow and broken members.
+
+Usage (from backend/):
+
+    python -m benchmarks.bench_chat_broadcast [--sockets 1000] [--slow 10] [--dead 10]
+
+Runs ``ConnectionManager`` in process with the in-memory pub/sub and
+stand-in sockets: healthy ones yield to the loop on every send, slow ones
+take ``--slow-delay`` seconds per frame, and dead ones raise. The same
+room is also driven with the previous sequential ``await send`` loop for
+comparison. Reported latency is publish-to-send for the healthy sockets.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+from app.pubsub import InMemoryPubSub
+from app.routers.chat import ConnectionManager
+
+
+class HealthySocket:
+    def __init__(self, log):
+        self.log = log
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, payload):
+        await asyncio.sleep(0)
+        self.log.append((payload, time.perf_counter()))
+
+    async def close(self, code=1000):
+        pass
+
+
+class SlowSocket(HealthySocket):
+    def __init__(self, log, delay):
+        super().__init__(log)
+        self.delay = delay
+
+    async def send_text(self, payload):
+        await asyncio.sleep(self.delay)
+
+
+class DeadSocket(HealthySocket):
+    async def send_text(self, payload):
+        raise RuntimeError("connection reset")
+
+
+def make_sockets(args, log):
+    healthy = [HealthySocket(log) for _ in range(args.sockets - args.slow - args.dead)]
+    slow = [SlowSocket(log, args.slow_delay) for _ in range(args.slow)]
+    dead = [DeadSocket(log) for _ in range(args.dead)]
+    # Interleave the bad ones so the sequential loop hits them early
+    sockets = slow + dead + healthy
+    return sockets, len(healthy)
+
+
+def report(name, log, published, healthy, messages, elapsed):
+    latencies = [at - published[payload] for payload, at in log]
+    print(f"{name}: {len(log)}/{healthy * messages} healthy deliveries in {elapsed:.2f} s")
+    if latencies:
+        latencies.sort()
+        print(
+            f"  publish->send p50 {statistics.median(latencies) * 1000:8.2f} ms"
+            f"  p99 {latencies[int(0.99 * (len(latencies) - 1))] * 1000:8.2f} ms"
+            f"  max {latencies[-1] * 1000:8.2f} ms"
+        )
+
+
+async def run_manager(args):
+    log, published = [], {}
+    sockets, healthy = make_sockets(args, log)
+    manager = ConnectionManager(InMemoryPubSub(), max_queue=args.queue)
+    for socket in sockets:
+        await manager.connect(1, socket)
+
+    start = time.perf_counter()
+    encode = []
+    for seq in range(args.messages):
+        before = time.perf_counter()
+        message = {"sender_id": 1, "message": f"message {seq}", "seq": seq}
+        published[f'{{"sender_id": 1, "message": "message {seq}", "seq": {seq}}}'] = before
+        await manager.broadcast(1, message)
+        encode.append(time.perf_counter() - before)
+        await asyncio.sleep(args.interval)
+    deadline = time.perf_counter() + args.timeout
+    while len(log) < healthy * args.messages and time.perf_counter() < deadline:
+        await asyncio.sleep(0.001)
+    elapsed = time.perf_counter() - start
+
+    report("queued writers", log, published, healthy, args.messages, elapsed)
+    print(f"  broadcast() call p50 {statistics.median(encode) * 1e6:8.1f} us")
+    print(
+        f"  room size now {len(manager.active_connections.get(1, {}))},"
+        f" slow dropped {manager.slow_consumers_dropped}, send errors {manager.send_errors}"
+    )
+    for socket in list(manager.active_connections.get(1, {})):
+        await manager.disconnect(1, socket)
+
+
+async def run_sequential(args):
+    log, published = [], {}
+    sockets, healthy = make_sockets(args, log)
+    start = time.perf_counter()
+    for seq in range(args.messages):
+        payload = f'{{"sender_id": 1, "message": "message {seq}", "seq": {seq}}}'
+        published[payload] = time.perf_counter()
+        try:
+            for socket in sockets:
+                await socket.send_text(payload)
+        except RuntimeError:
+            # The old loop aborted at the first broken socket
+            pass
+        await asyncio.sleep(args.interval)
+    elapsed = time.perf_counter() - start
+    report("sequential send", log, published, healthy, args.messages, elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sockets", type=int, default=1000)
+    parser.add_argument("--slow", type=int, default=10)
+    parser.add_argument("--dead", type=int, default=10)
+    parser.add_argument("--slow-delay", type=float, default=0.05)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--interval", type=float, default=0.005)
+    parser.add_argument("--queue", type=int, default=64)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--skip-sequential", action="store_true")
+    args = parser.parse_args()
+    print(f"sockets={args.sockets} slow={args.slow} dead={args.dead} messages={args.messages}")
+    asyncio.run(run_manager(args))
+    if not args.skip_sequential:
+        asyncio.run(run_sequential(args))
+
+
+if __name__ == "__main__":
+    main()
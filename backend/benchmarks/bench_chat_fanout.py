@@ -0,0 +1,158 @@
+"""Measure proposal chat fan-out across several app workers.
+
+Usage (from backend/, with DATABASE_URL pointing at PostgreSQL):
+
+    python -m benchmarks.bench_chat_fanout [--workers 4] [--clients 200] [--messages 200]
+
+Starts ``--workers`` independent uvicorn processes on consecutive ports,
+as a load balancer would see them, and spreads ``--clients`` WebSocket
+clients for one proposal room across them. Two phases run:
+
+* latency: one message at a time from a rotating sender; reports the
+  send-to-receive time seen by every client, split into receivers on the
+  sender's worker and receivers on other workers.
+* throughput: every worker gets a sender that fires ``--messages``
+  messages back to back; reports delivered frames per second.
+
+All timings come from this one process's clock.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+import websockets
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def start_workers(count: int, base_port: int, pubsub: str):
+    env = dict(os.environ, CHAT_PUBSUB_BACKEND=pubsub)
+    processes = []
+    for i in range(count):
+        processes.append(subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(base_port + i), "--log-level", "warning"],
+            env=env,
+        ))
+    for i in range(count):
+        deadline = time.time() + 30
+        while True:
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{base_port + i}/health", timeout=1)
+                break
+            except OSError:
+                if time.time() > deadline:
+                    raise RuntimeError(f"worker on port {base_port + i} did not start")
+                time.sleep(0.2)
+    return processes
+
+
+class Client:
+    def __init__(self, worker: int, ws):
+        self.worker = worker
+        self.ws = ws
+        self.received = 0
+        self.latencies = []
+        self.expected = None
+        self.done = asyncio.Event()
+
+    async def read(self):
+        async for raw in self.ws:
+            message = json.loads(raw)
+            if message.get("phase") == "latency":
+                self.latencies.append((message["worker"], time.perf_counter() - message["t"]))
+            self.received += 1
+            if self.expected is not None and self.received >= self.expected:
+                self.done.set()
+
+
+async def run(args):
+    processes = start_workers(args.workers, args.port, args.pubsub)
+    try:
+        urls = [f"ws://127.0.0.1:{args.port + i}/ws/proposals/{args.room}/chat" for i in range(args.workers)]
+        clients = []
+        for i in range(args.clients):
+            worker = i % args.workers
+            clients.append(Client(worker, await websockets.connect(urls[worker], max_queue=None)))
+        senders = [await websockets.connect(url) for url in urls]
+        readers = [asyncio.create_task(client.read()) for client in clients]
+        # Give every worker time to finish its LISTEN
+        await asyncio.sleep(0.5)
+
+        # Latency: one message in flight at a time
+        for seq in range(args.latency_messages):
+            worker = seq % args.workers
+            target = sum(c.received for c in clients) + len(clients)
+            await senders[worker].send(json.dumps({"phase": "latency", "worker": worker, "t": time.perf_counter()}))
+            deadline = time.perf_counter() + 5
+            while sum(c.received for c in clients) < target and time.perf_counter() < deadline:
+                await asyncio.sleep(0.0005)
+
+        local = [lat for c in clients for w, lat in c.latencies if w == c.worker]
+        remote = [lat for c in clients for w, lat in c.latencies if w != c.worker]
+        expected_latency = args.latency_messages * len(clients)
+        got = len(local) + len(remote)
+        print(f"workers={args.workers} clients={args.clients} pubsub={args.pubsub}")
+        print(f"latency: delivered {got}/{expected_latency}")
+        for name, values in (("same worker", local), ("other worker", remote)):
+            if values:
+                print(
+                    f"  {name:12s} p50 {statistics.median(values) * 1000:7.2f} ms"
+                    f"  p95 {percentile(values, 0.95) * 1000:7.2f} ms"
+                    f"  p99 {percentile(values, 0.99) * 1000:7.2f} ms"
+                )
+
+        # Throughput: every worker publishes back to back
+        for client in clients:
+            client.expected = client.received + args.messages * args.workers
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            sender.send(json.dumps({"phase": "throughput", "seq": seq}))
+            for sender in senders for seq in range(args.messages)
+        ))
+        try:
+            await asyncio.wait_for(asyncio.gather(*(c.done.wait() for c in clients)), timeout=args.timeout)
+        except asyncio.TimeoutError:
+            pass
+        elapsed = time.perf_counter() - start
+        delivered = sum(c.received for c in clients) - got
+        published = args.messages * args.workers
+        print(
+            f"throughput: {published} messages, {delivered}/{published * len(clients)} frames delivered"
+            f" in {elapsed:.2f} s ({published / elapsed:,.0f} msg/s, {delivered / elapsed:,.0f} frames/s)"
+        )
+
+        for task in readers:
+            task.cancel()
+        for ws in senders + [c.ws for c in clients]:
+            await ws.close()
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=200, help="throughput messages per worker")
+    parser.add_argument("--latency-messages", type=int, default=100)
+    parser.add_argument("--pubsub", default="postgres", choices=["postgres", "memory"])
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--room", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""Response encoding throughput for large list pages.
+
+Usage (from backend/):
+
+    python -m benchmarks.bench_json_responses [--page-size 100] [--seconds 3]
+
+Builds pages of synthetic ``ProposalResponse`` (organization, creator and
+three assigned users nested in each) and ``KnowledgeBaseResponse`` models
+and compares FastAPI's default path - validate against ``response_model``,
+dump to Python objects, ``json.dumps`` - with ``ModelJSONResponse``, first
+for the encoding alone and then for whole requests through a two-route
+app, called in process so no server or network time is included. Both
+paths must produce identical bytes.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from pydantic import TypeAdapter
+
+from app.responses import ModelJSONResponse
+from app.schemas import KnowledgeBaseResponse, ProposalResponse
+
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+WORDS = ["cloud", "migration", "security", "pricing", "timeline", "support", "compliance", "integration", "Übersicht"]
+
+
+def text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def user(rng: random.Random, user_id: int) -> dict:
+    return {
+        "id": user_id, "email": f"user{user_id}@example.com", "name": f"User {user_id}",
+        "is_active": True, "created_at": EPOCH + timedelta(days=rng.randrange(300)),
+    }
+
+
+def proposals(count: int, seed: int = 0) -> List[ProposalResponse]:
+    rng = random.Random(seed)
+    items = []
+    for proposal_id in range(count, 0, -1):
+        organization_id = rng.randint(1, 50)
+        created = EPOCH + timedelta(seconds=rng.randrange(300 * 86400))
+        items.append(ProposalResponse.model_validate({
+            "id": proposal_id, "title": text(rng, 6), "description": text(rng, 60),
+            "organization_id": organization_id, "priority": rng.choice(["low", "medium", "high", "critical"]),
+            "deadline": created + timedelta(days=45), "estimated_value": round(rng.lognormvariate(11, 1), 2),
+            "tags": rng.sample(WORDS, 3), "status": rng.choice(["draft", "in_review", "submitted", "won"]),
+            "created_by": 1, "current_version": rng.randint(1, 20), "is_template": False,
+            "created_at": created, "updated_at": created + timedelta(hours=rng.randrange(500)),
+            "organization": {
+                "id": organization_id, "name": f"Organization {organization_id}", "industry": "technology",
+                "size": "large", "description": text(rng, 20), "created_by": 1, "created_at": EPOCH,
+                "creator": user(rng, 1),
+            },
+            "creator": user(rng, 1),
+            "assigned_users": [user(rng, rng.randint(2, 40)) for _ in range(3)],
+        }))
+    return items
+
+
+def knowledge_items(count: int, seed: int = 0) -> List[KnowledgeBaseResponse]:
+    rng = random.Random(seed)
+    return [
+        KnowledgeBaseResponse.model_validate({
+            "id": knowledge_id, "title": text(rng, 5), "content": text(rng, 300),
+            "category": rng.choice(["case_study", "solution_template", "pricing_model", "technical_spec"]),
+            "tags": rng.sample(WORDS, 2), "industry": "technology", "created_by": 1,
+            "usage_count": rng.randrange(1000), "is_approved": True,
+            "created_at": EPOCH + timedelta(days=rng.randrange(300)), "updated_at": None,
+            "creator": user(rng, 1),
+        })
+        for knowledge_id in range(count, 0, -1)
+    ]
+
+
+def build_app(pages: dict) -> FastAPI:
+    """``/default/{name}`` returns models, ``/fast/{name}`` a ModelJSONResponse."""
+    app = FastAPI()
+    for name, (model, items) in pages.items():
+        default, fast = endpoints(model, items)
+        app.add_api_route(f"/default/{name}", default, response_model=List[model])
+        app.add_api_route(f"/fast/{name}", fast, response_model=List[model])
+    return app
+
+
+def endpoints(model, items):
+    # Closures, not default arguments: FastAPI would take those for query
+    # parameters and copy them on every request
+    adapter = TypeAdapter(List[model])
+
+    async def default():
+        return items
+
+    async def fast():
+        return ModelJSONResponse(items, adapter)
+
+    return default, fast
+
+
+async def request(app: FastAPI, path: str) -> bytes:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "root_path": "", "headers": [], "client": ("127.0.0.1", 1), "server": ("127.0.0.1", 80),
+    }
+    body = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            body.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return b"".join(body)
+
+
+async def rate(fn, seconds: float):
+    """Calls per second and per-call timings over ``seconds``."""
+    timings = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        await fn()
+        timings.append(time.perf_counter() - start)
+    return len(timings) / sum(timings), timings
+
+
+def report(label: str, per_second: float, timings: List[float], size: int, baseline: float = None):
+    speedup = f"  {per_second / baseline:4.1f}x" if baseline else ""
+    print(f"    {label:8s} {per_second:8.0f}/s  p50 {statistics.median(timings) * 1000:6.2f} ms"
+          f"  {per_second * size / 1e6:7.1f} MB/s{speedup}")
+
+
+async def bench(args):
+    pages = {
+        "proposals": (ProposalResponse, proposals(args.page_size)),
+        "knowledge": (KnowledgeBaseResponse, knowledge_items(args.page_size)),
+    }
+    app = build_app(pages)
+    fields = {route.path: route.response_field for route in app.routes if route.path.startswith("/default/")}
+
+    for name, (model, items) in pages.items():
+        field = fields[f"/default/{name}"]
+        adapter = TypeAdapter(List[model])
+
+        async def default_encode():
+            content = await serialize_response(field=field, response_content=items)
+            return JSONResponse(content).body
+
+        async def fast_encode():
+            return ModelJSONResponse(items, adapter).body
+
+        body = await fast_encode()
+        if body != await default_encode() or body != await request(app, f"/default/{name}"):
+            raise SystemExit(f"{name}: encodings differ")
+        print(f"{name}: {len(items)} per page, {len(body) / 1024:.0f} KiB")
+
+        print("  encoding")
+        default_rate, timings = await rate(default_encode, args.seconds)
+        report("default", default_rate, timings, len(body))
+        fast_rate, timings = await rate(fast_encode, args.seconds)
+        report("fast", fast_rate, timings, len(body), default_rate)
+
+        print("  request")
+        default_rate, timings = await rate(lambda: request(app, f"/default/{name}"), args.seconds)
+        report("default", default_rate, timings, len(body))
+        fast_rate, timings = await rate(lambda: request(app, f"/fast/{name}"), args.seconds)
+        report("fast", fast_rate, timings, len(body), default_rate)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args()
+    asyncio.run(bench(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Compare knowledge search backends on a synthetic corpus.
+
+Usage (from backend/):
+
+    python -m benchmarks.bench_knowledge_search [SIZES] [QUERIES]
+
+``SIZES`` is a comma separated list of corpus sizes (default
+``10000,100000,1000000``). Each size is loaded into a throwaway SQLite file;
+the ILIKE path runs the same query the router issues, the BM25 path runs
+against an index built from that table.
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+from sqlalchemy import and_, create_engine, or_
+from sqlalchemy.orm import sessionmaker
+
+from app.models import Base, KnowledgeBase, KnowledgeCategory
+from app.search.bm25 import BM25Index
+
+INDUSTRIES = ["finance", "healthcare", "retail", "manufacturing", "energy", "public sector"]
+CATEGORIES = list(KnowledgeCategory)
+
+
+def make_vocabulary(size: int, rng: random.Random):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(4, 9))) for _ in range(size)]
+
+
+def zipf_weights(vocabulary):
+    # Rank-weighted sampling gives a realistic long-tail term distribution
+    cumulative, total = [], 0.0
+    for rank in range(len(vocabulary)):
+        total += 1.0 / (rank + 1)
+        cumulative.append(total)
+    return cumulative
+
+
+def zipf_words(vocabulary, cum_weights, count: int, rng: random.Random):
+    return rng.choices(vocabulary, cum_weights=cum_weights, k=count)
+
+
+def load_corpus(session, size: int, vocabulary, rng: random.Random, batch: int = 10000):
+    cum_weights = zipf_weights(vocabulary)
+    rows = []
+    for i in range(size):
+        rows.append({
+            "title": " ".join(zipf_words(vocabulary, cum_weights, 6, rng)),
+            "content": " ".join(zipf_words(vocabulary, cum_weights, 120, rng)),
+            "category": rng.choice(CATEGORIES),
+            "tags": [],
+            "industry": rng.choice(INDUSTRIES),
+            "created_by": 1,
+            "usage_count": 0,
+            "is_approved": rng.random() < 0.9,
+        })
+        if len(rows) == batch:
+            session.bulk_insert_mappings(KnowledgeBase, rows)
+            rows = []
+    if rows:
+        session.bulk_insert_mappings(KnowledgeBase, rows)
+    session.commit()
+
+
+def ilike_search(session, q: str, limit: int = 20):
+    return session.query(KnowledgeBase.id).filter(
+        and_(
+            KnowledgeBase.is_approved == True,
+            or_(KnowledgeBase.title.ilike(f"%{q}%"), KnowledgeBase.content.ilike(f"%{q}%")),
+        )
+    ).limit(limit).all()
+
+
+def timed(fn, queries, repeat: int = 1):
+    samples = []
+    for _ in range(repeat):
+        for q in queries:
+            start = time.perf_counter()
+            fn(q)
+            samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+
+def main():
+    sizes = [int(s) for s in (sys.argv[1] if len(sys.argv) > 1 else "10000,100000,1000000").split(",")]
+    n_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    rng = random.Random(42)
+    vocabulary = make_vocabulary(20000, rng)
+    # Mid-frequency terms: common enough to match, rare enough to be selective
+    queries = [" ".join(rng.sample(vocabulary[50:2000], 2)) for _ in range(n_queries)]
+
+    print(f"{'docs':>9} {'backend':>8} {'p50 ms':>9} {'p99 ms':>9} {'build s':>8}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+            Base.metadata.create_all(engine)
+            session = sessionmaker(bind=engine)()
+            load_corpus(session, size, vocabulary, rng)
+
+            p50, p99 = timed(lambda q: ilike_search(session, q.split()[0]), queries[:10])
+            print(f"{size:>9} {'ilike':>8} {p50:>9.2f} {p99:>9.2f} {'-':>8}")
+
+            index = BM25Index()
+            start = time.perf_counter()
+            index.build(session)
+            build_seconds = time.perf_counter() - start
+            p50, p99 = timed(lambda q: index.search(q, limit=20), queries, repeat=3)
+            print(f"{size:>9} {'bm25':>8} {p50:>9.2f} {p99:>9.2f} {build_seconds:>8.1f}")
+            p50, p99 = timed(lambda q: index.search(q, category="case_study", industry="retail", limit=20), queries)
+            print(f"{size:>9} {'bm25+flt':>8} {p50:>9.2f} {p99:>9.2f} {'-':>8}")
+            session.close()
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
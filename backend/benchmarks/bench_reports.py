@@ -0,0 +1,143 @@
+"""Report latency on the columnar analytics snapshot.
+
+Usage (from backend/):
+
+    python -m benchmarks.bench_reports [--proposals 1000000] [--sql-proposals 100000]
+
+Builds a ``ProposalColumns`` snapshot from ``--proposals`` synthetic rows
+(skewed industries, 40 tags with a few popular ones, three years of
+dates) and times a set of typical leadership reports against it. With
+``--sql-proposals`` the same data, at that size, is also loaded into an
+in-memory SQLite database and the equivalent GROUP BY queries (tags
+matched with LIKE on a JSON string, the old ``Text`` layout) are timed
+for comparison.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+from sqlalchemy import create_engine, text
+
+from app.analytics import ProposalColumns
+
+INDUSTRIES = ["technology", "healthcare", "finance", "government", "retail", "energy", "education", "manufacturing"]
+SIZES = ["small", "medium", "large", "enterprise"]
+PRIORITIES = ["low", "medium", "high", "critical"]
+STATUSES = ["draft", "in_review", "approved", "submitted", "won", "lost"]
+TAGS = [f"tag{i:02d}" for i in range(40)]
+EPOCH = datetime(2022, 1, 1, tzinfo=timezone.utc)
+
+
+def synthetic_rows(count: int, organizations: int, seed: int = 0):
+    rng = random.Random(seed)
+    orgs = [(i, f"Org {i}", rng.choice(INDUSTRIES), rng.choice(SIZES)) for i in range(1, organizations + 1)]
+    tag_weights = [1.0 / (rank + 1) for rank in range(len(TAGS))]
+    for proposal_id in range(1, count + 1):
+        org_id, name, industry, size = orgs[int(rng.paretovariate(1.2)) % organizations]
+        status = rng.choices(STATUSES, weights=[2, 1, 1, 2, 3, 3])[0]
+        created = EPOCH + timedelta(seconds=rng.randrange(3 * 365 * 86400))
+        closed = created + timedelta(days=rng.randint(5, 180)) if status in ("won", "lost") else None
+        tags = sorted(set(rng.choices(TAGS, weights=tag_weights, k=rng.randint(0, 4))))
+        yield (
+            proposal_id, org_id, name, industry, size, status, rng.choice(PRIORITIES),
+            round(rng.lognormvariate(11, 1), 2), created, created + timedelta(days=60), closed, tags,
+        )
+
+
+REPORTS = [
+    ("win rate by industry", dict(group_by=("industry",))),
+    ("by industry, last 90 days", dict(group_by=("industry",), filters=dict(date_field="created",
+        start=datetime(2024, 10, 3, tzinfo=timezone.utc), end=datetime(2025, 1, 1, tzinfo=timezone.utc)))),
+    ("priority x size", dict(group_by=("priority", "size"))),
+    ("by tag", dict(group_by=("tag",))),
+    ("industry x tag, closed in 2024", dict(group_by=("industry", "tag"), filters=dict(date_field="closed",
+        start=datetime(2024, 1, 1, tzinfo=timezone.utc), end=datetime(2025, 1, 1, tzinfo=timezone.utc)))),
+    ("by organization, tag00 and tag01", dict(group_by=("organization",), filters=dict(tags_all=["tag00", "tag01"]))),
+    ("enterprise healthcare, rare tag", dict(group_by=("priority",), filters=dict(
+        filters={"industry": ["healthcare"], "size": ["enterprise"]}, tags_any=["tag37", "tag38"]))),
+]
+
+
+def time_call(fn, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return result, timings
+
+
+def bench_columns(args):
+    start = time.perf_counter()
+    snapshot = ProposalColumns(synthetic_rows(args.proposals, args.organizations))
+    print(f"snapshot: {snapshot.size:,} proposals, {len(snapshot.tags)} tags"
+          f" ({len(snapshot.tag_bitmaps)} as bitmaps), built in {time.perf_counter() - start:.1f} s")
+    for name, report in REPORTS:
+        def run():
+            mask = snapshot.filter(**report.get("filters", {}))
+            return snapshot.group(mask, report["group_by"])
+        groups, timings = time_call(run, args.repeat)
+        print(f"  {name:36s} {len(groups):5d} groups  p50 {statistics.median(timings) * 1000:7.2f} ms"
+              f"  max {max(timings) * 1000:7.2f} ms")
+
+
+def bench_sql(args):
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE organizations (id INTEGER PRIMARY KEY, name TEXT, industry TEXT, size TEXT)"))
+        conn.execute(text(
+            "CREATE TABLE proposals (id INTEGER PRIMARY KEY, organization_id INTEGER, status TEXT, priority TEXT,"
+            " estimated_value REAL, created_at TIMESTAMP, closed_at TIMESTAMP, tags TEXT)"
+        ))
+        orgs, proposals = {}, []
+        for row in synthetic_rows(args.sql_proposals, args.organizations):
+            orgs[row[1]] = {"id": row[1], "name": row[2], "industry": row[3], "size": row[4]}
+            proposals.append({
+                "id": row[0], "organization_id": row[1], "status": row[5], "priority": row[6],
+                "estimated_value": row[7], "created_at": row[8], "closed_at": row[10], "tags": json.dumps(row[11]),
+            })
+        conn.execute(text("INSERT INTO organizations VALUES (:id, :name, :industry, :size)"), list(orgs.values()))
+        conn.execute(text(
+            "INSERT INTO proposals VALUES (:id, :organization_id, :status, :priority, :estimated_value,"
+            " :created_at, :closed_at, :tags)"
+        ), proposals)
+        conn.execute(text("CREATE INDEX ix_created ON proposals (created_at)"))
+
+    queries = [
+        ("win rate by industry",
+         "SELECT o.industry, count(*), sum(p.status = 'won'), sum(p.status = 'lost'), sum(p.estimated_value)"
+         " FROM proposals p JOIN organizations o ON o.id = p.organization_id GROUP BY o.industry"),
+        ("by tag (one LIKE per tag)",
+         " UNION ALL ".join(
+             f"SELECT '{tag}', count(*), sum(status = 'won'), sum(estimated_value) FROM proposals"
+             f" WHERE tags LIKE '%\"{tag}\"%'" for tag in TAGS
+         )),
+    ]
+    print(f"SQLite baseline: {args.sql_proposals:,} proposals")
+    with engine.connect() as conn:
+        for name, sql in queries:
+            _, timings = time_call(lambda: conn.execute(text(sql)).all(), max(1, args.repeat // 5))
+            print(f"  {name:36s} p50 {statistics.median(timings) * 1000:9.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--proposals", type=int, default=1000000)
+    parser.add_argument("--organizations", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--sql-proposals", type=int, default=0)
+    args = parser.parse_args()
+    bench_columns(args)
+    if args.sql_proposals:
+        bench_sql(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Shared fixtures. Tests run against a throwaway SQLite database unless
+``TEST_DATABASE_URL`` names another one."""
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import Callable, ContextManager, Iterator
+
+import pytest
+from fastapi.testclient import TestClient
+
+# Before anything imports app.config
+os.environ["DATABASE_URL"] = os.environ.get(
+    "TEST_DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="proposal-forge-tests-"), "test.db")
+)
+os.environ.setdefault("SECRET_KEY", "test-secret")
+
+from app.main import app  # noqa: E402
+from app.profiling import Profile, capture  # noqa: E402
+
+
+def _describe(profile: Profile, threshold: int) -> str:
+    lines = [f"  {i}. {s.sql}  [{s.site or 'unknown site'}]" for i, s in enumerate(profile.statements, 1)]
+    for pattern in profile.n_plus_one(threshold):
+        lines.append(f"  N+1: {pattern['count']} x {pattern['sql']}  [{', '.join(pattern['sites'])}]")
+    return "\n".join(lines)
+
+
+@contextmanager
+def assert_max_queries(budget: int, n_plus_one: int = 3) -> Iterator[Profile]:
+    """Fail if the block runs more than ``budget`` SQL statements.
+
+    Every statement executed while the block runs counts, whichever thread
+    runs it (``TestClient`` serves requests on its own event loop thread).
+    Over budget, the failure lists each statement, its call site and any
+    N+1 patterns among them.
+    """
+    with capture() as profile:
+        yield profile
+    if len(profile.statements) > budget:
+        pytest.fail(
+            f"{len(profile.statements)} SQL statements ran, budget is {budget}:\n"
+            + _describe(profile, n_plus_one),
+            pytrace=False,
+        )
+
+
+@pytest.fixture
+def query_budget() -> Callable[..., ContextManager[Profile]]:
+    """``with query_budget(n):`` fails the test above ``n`` statements."""
+    return assert_max_queries
+
+
+@pytest.fixture(scope="session")
+def client() -> Iterator[TestClient]:
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture(scope="session")
+def auth_headers(client: TestClient) -> dict:
+    client.post("/auth/register", json={"email": "tester@example.com", "name": "Tester", "password": "secret"})
+    response = client.post("/auth/login", data={"username": "tester@example.com", "password": "secret"})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
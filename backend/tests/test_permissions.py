@@ -0,0 +1,29 @@
+import pytest
+
+from app.database import SessionLocal
+from app.models import User, UserProfile, UserRole
+from app.permissions import ROLE_PERMISSIONS, Permission, compile_permissions
+
+
+def test_compile_permissions_adds_listed_names_to_the_role():
+    granted = compile_permissions(UserRole.PRESALES, '["approve", "no-such-permission"]')
+    assert granted == ROLE_PERMISSIONS[UserRole.PRESALES] | Permission.APPROVE
+
+
+@pytest.mark.parametrize("permissions", ["not json", "5", '"approve"', '{"approve": true}', "null"])
+def test_malformed_permissions_fall_back_to_the_role(permissions):
+    assert compile_permissions(UserRole.PRESALES, permissions) == ROLE_PERMISSIONS[UserRole.PRESALES]
+
+
+def test_malformed_permissions_do_not_break_requests(client):
+    client.post("/auth/register", json={"email": "malformed@example.com", "name": "Malformed", "password": "secret"})
+    with SessionLocal() as session:
+        user = session.query(User).filter(User.email == "malformed@example.com").one()
+        session.query(UserProfile).filter(UserProfile.user_id == user.id).update({"permissions": "5"})
+        session.commit()
+    response = client.post("/auth/login", data={"username": "malformed@example.com", "password": "secret"})
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    assert client.get("/auth/me", headers=headers).status_code == 200
+    # Presales role defaults: read and write, but not approve
+    assert client.put("/knowledge/1/approve", headers=headers).status_code == 403
@@ -0,0 +1,44 @@
+import pytest
+
+# Probe for the ETag, the page with its many-to-one relations joined, and
+# one IN query for the assigned users - whatever the page size
+LIST_STATEMENTS = 3
+
+
+@pytest.fixture(scope="module")
+def proposals(client, auth_headers):
+    assignees = []
+    for i in range(3):
+        response = client.post(
+            "/auth/register", json={"email": f"assignee{i}@example.com", "name": f"Assignee {i}", "password": "secret"}
+        )
+        assignees.append(response.json()["id"])
+    organization = client.post(
+        "/organizations/", json={"name": "Acme", "industry": "technology", "size": "large"}, headers=auth_headers
+    ).json()
+    for i in range(50):
+        response = client.post("/proposals/", json={
+            "title": f"Proposal {i}",
+            "description": "Cloud migration",
+            "organization_id": organization["id"],
+            "priority": "high",
+            "deadline": "2030-01-01T00:00:00",
+            "estimated_value": 1000.0 + i,
+            "tags": ["cloud"],
+            "assigned_to": assignees[: i % 4],
+        }, headers=auth_headers)
+        assert response.status_code == 200, response.text
+
+
+@pytest.mark.parametrize("limit", [5, 50])
+def test_list_proposals_statement_count_is_constant(client, auth_headers, proposals, query_budget, limit):
+    # Resolve the token first so the principal lookup is not counted
+    assert client.get("/auth/me", headers=auth_headers).status_code == 200
+
+    with query_budget(LIST_STATEMENTS) as profile:
+        response = client.get(f"/proposals/?limit={limit}", headers=auth_headers)
+
+    assert response.status_code == 200
+    assert len(response.json()) == limit
+    assert all(p["organization"] and p["creator"] for p in response.json())
+    assert len(profile.statements) == LIST_STATEMENTS
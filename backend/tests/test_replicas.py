@@ -0,0 +1,32 @@
+import asyncio
+
+from app.cache import InMemorySharedCache
+from app.replicas import RecentWriters
+
+
+def test_writes_stick_per_user():
+    async def scenario():
+        writers = RecentWriters(10, None)
+        await writers.record(1)
+        return await writers.wrote_recently(1), await writers.wrote_recently(2)
+
+    assert asyncio.run(scenario()) == (True, False)
+
+
+def test_writes_are_seen_by_other_workers_through_the_shared_cache():
+    async def scenario():
+        shared = InMemorySharedCache()
+        writer, reader = RecentWriters(10, shared), RecentWriters(10, shared)
+        await writer.record(1)
+        return await reader.wrote_recently(1)
+
+    assert asyncio.run(scenario())
+
+
+def test_writes_expire():
+    async def scenario():
+        writers = RecentWriters(0, None)
+        await writers.record(1)
+        return await writers.wrote_recently(1)
+
+    assert not asyncio.run(scenario())
@@ -39,9 +39,9 @@ CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
 -- CREATE INDEX idx_knowledge_is_approved ON knowledge_base(is_approved);
 -- CREATE INDEX idx_knowledge_industry ON knowledge_base(industry);
 
--- Full-text search indexes for knowledge base
--- CREATE INDEX idx_knowledge_title_fts ON knowledge_base USING gin(to_tsvector('english', title));
--- CREATE INDEX idx_knowledge_content_fts ON knowledge_base USING gin(to_tsvector('english', content));
+-- Full-text search for knowledge base: the weighted knowledge_base.search_vector
+-- column and its GIN index are created by Alembic revision 0002 (or by
+-- Base.metadata.create_all on a fresh database).
 
 -- Activity indexes
 -- CREATE INDEX idx_activities_proposal_id ON activities(proposal_id);